@@ -507,14 +507,17 @@ def eigenvector(network, projection='scaled', include_sub_paths=True):
 
     v = v.reshape(v.size, )
 
-    higher_order_eigen_vec_cent = dict(zip(network.nodes, map(_np.abs, v)))
+    # node names in matrix order (this does not require the node dictionaries of
+    # networks that have been generated in matrix-only or disk-backed mode)
+    nodes = list(network.node_to_name_map())
+    higher_order_eigen_vec_cent = dict(zip(nodes, map(_np.abs, v)))
 
     # project eigen_vec_cent of higher-order nodes to first-order network
     first_order_eigen_vec_cent = defaultdict(lambda: 0.0)
 
     # sum eigen_vec_cent values based on higher-order nodes
     # and normalize the result
-    for v in network.nodes:
+    for v in nodes:
         # turns node a-b-c in path tuple (a,b,c)
         p = network.higher_order_node_to_path(v)
         if projection == 'all':
@@ -588,7 +591,10 @@ def pagerank(network, alpha=0.85, max_iter=100, tol=1.0e-6, projection='scaled',
 
     higher_order_pr = defaultdict(lambda: 0)
 
-    n_nodes = float(len(network.nodes))
+    # node names in matrix order (this does not require the node dictionaries of
+    # networks that have been generated in matrix-only or disk-backed mode)
+    nodes = list(network.node_to_name_map())
+    n_nodes = float(len(nodes))
 
     assert n_nodes > 0, "Number of nodes is zero"
 
@@ -627,7 +633,7 @@ def pagerank(network, alpha=0.85, max_iter=100, tol=1.0e-6, projection='scaled',
                   (1 - alpha) * inv_n_nodes)
 
         if sp.absolute(p_rank - last).sum() < n_nodes * tol:
-            higher_order_pr = dict(zip(network.nodes, map(float, p_rank)))
+            higher_order_pr = dict(zip(nodes, map(float, p_rank)))
             break
 
     if network.order == 1:
@@ -638,7 +644,7 @@ def pagerank(network, alpha=0.85, max_iter=100, tol=1.0e-6, projection='scaled',
 
     # sum PageRank values based on higher-order nodes
     # and normalize the result
-    for v in network.nodes:
+    for v in nodes:
         # turns node a-b-c in path tuple (a,b,c)
         inv_n_nodes = network.higher_order_node_to_path(v)
         if projection == 'all':
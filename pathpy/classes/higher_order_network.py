@@ -23,7 +23,10 @@
 #    E-mail: scholtes@ifi.uzh.ch
 #    Web:    http://www.ingoscholtes.net
 
+import json
+import os
 from collections import defaultdict
+from functools import lru_cache
 import numpy as _np
 import scipy.sparse as _sparse
 
@@ -31,6 +34,158 @@ from pathpy.utils.exceptions import PathsTooShort
 from pathpy.classes.network import Network
 
 
+
+# memory-mapped files of a disk-backed network and the corresponding attributes
+_STORAGE_ARRAYS = {'sources': '_edge_sources', 'targets': '_edge_targets',
+                   'weights': '_edge_weights', 'indptr': '_indptr',
+                   'transitions': '_transition_data'}
+
+
+class _LinkWriter:
+    """Collects the links of a higher-order network either in memory or, if a
+    directory is given, out-of-core in memory-mapped numpy files. In the latter case,
+    links are written to disk in chunks and finally arranged in CSR order, i.e.
+    sorted by source and target index.
+    """
+
+    def __init__(self, directory=None, chunk_size=100000):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.count = 0
+        self.sources = []
+        self.targets = []
+        self.weights = []
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._chunk_files = {name: open(self._path(name + '.tmp'), 'wb')
+                                 for name in ('sources', 'targets', 'weights')}
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def add(self, source, target, weight):
+        """Adds a link with the given source and target index and weight vector"""
+        self.sources.append(source)
+        self.targets.append(target)
+        self.weights.append(weight)
+        if self.directory is not None and len(self.sources) >= self.chunk_size:
+            self._flush()
+
+    def _flush(self):
+        _np.array(self.sources, dtype=_np.int64).tofile(self._chunk_files['sources'])
+        _np.array(self.targets, dtype=_np.int64).tofile(self._chunk_files['targets'])
+        _np.array(self.weights, dtype=float).tofile(self._chunk_files['weights'])
+        self.count += len(self.sources)
+        self.sources, self.targets, self.weights = [], [], []
+
+    def _chunks(self, m):
+        return ((start, min(start + self.chunk_size, m))
+                for start in range(0, m, self.chunk_size))
+
+    def finish(self, n):
+        """Returns the source indices, target indices and weight vectors of all
+        links as well as the CSR index pointer of the n nodes (or None for links
+        kept in memory).
+        """
+        if self.directory is None:
+            weights = _np.array(self.weights, dtype=float).reshape(len(self.weights), 2)
+            return (_np.array(self.sources, dtype=int), _np.array(self.targets, dtype=int),
+                    weights, None)
+
+        self._flush()
+        for f in self._chunk_files.values():
+            f.close()
+        m = self.count
+
+        # read the chunks of unsorted links
+        chunks = {}
+        for name, shape, dtype in (('sources', (m,), _np.int64),
+                                   ('targets', (m,), _np.int64),
+                                   ('weights', (m, 2), float)):
+            if m > 0:
+                chunks[name] = _np.memmap(self._path(name + '.tmp'), dtype=dtype,
+                                          mode='r', shape=shape)
+            else:
+                chunks[name] = _np.empty(shape, dtype=dtype)
+
+        # 32 bit indices can be used by scipy without copying the index arrays
+        index_dtype = _np.int32 if max(n, m) < _np.iinfo(_np.int32).max else _np.int64
+
+        outdegrees = _np.zeros(n, dtype=_np.int64)
+        for start, end in self._chunks(m):
+            outdegrees += _np.bincount(chunks['sources'][start:end], minlength=n)
+        indptr = self._create('indptr', (n + 1,), index_dtype)
+        indptr[0] = 0
+        indptr[1:] = _np.cumsum(outdegrees)
+
+        sources = self._create('sources', (m,), index_dtype)
+        targets = self._create('targets', (m,), index_dtype)
+        weights = self._create('weights', (m, 2), float)
+
+        # move the links of each chunk to the rows of their source nodes
+        position = indptr[:-1].astype(_np.int64)
+        for start, end in self._chunks(m):
+            chunk_sources = chunks['sources'][start:end]
+            order = _np.argsort(chunk_sources, kind='stable')
+            sorted_sources = chunk_sources[order]
+            rank = _np.arange(len(order)) - _np.searchsorted(sorted_sources, sorted_sources)
+            pos = position[sorted_sources] + rank
+            sources[pos] = sorted_sources
+            targets[pos] = chunks['targets'][start:end][order]
+            weights[pos] = chunks['weights'][start:end][order]
+            position += _np.bincount(chunk_sources, minlength=n)
+
+        # sort the links within each row by target, processing blocks of rows with
+        # (roughly) chunk_size links
+        row = 0
+        while row < n:
+            end_row = _np.searchsorted(indptr, indptr[row] + self.chunk_size, side='right') - 1
+            end_row = min(max(end_row, row + 1), n)
+            start, end = indptr[row], indptr[end_row]
+            order = _np.lexsort((targets[start:end], sources[start:end]))
+            targets[start:end] = targets[start:end][order]
+            weights[start:end] = weights[start:end][order]
+            row = end_row
+
+        del chunks
+        for name in ('sources', 'targets', 'weights'):
+            os.remove(self._path(name + '.tmp'))
+
+        return (self._open('sources', sources), self._open('targets', targets),
+                self._open('weights', weights), self._open('indptr', indptr))
+
+    def write_nodes(self, node_index):
+        """Writes the names of all nodes (in index order) to a text file"""
+        with open(self._path('nodes.txt'), 'w') as f:
+            for v in node_index:
+                f.write(v + '\n')
+
+    def write_transitions(self, sources, weights, outweights):
+        """Writes the transition probabilities (including subpaths) of all links"""
+        m = len(sources)
+        D = outweights.sum(axis=1)
+        data = self._create('transitions', (m,), float)
+        for start, end in self._chunks(m):
+            d = D[sources[start:end]]
+            counts = weights[start:end].sum(axis=1)
+            data[start:end] = _np.divide(counts, d, out=_np.zeros(len(d)), where=d > 0)
+        return self._open('transitions', data)
+
+    def _create(self, name, shape, dtype):
+        # existing files are removed rather than overwritten, since they may still be
+        # mapped to the memory of other networks
+        if os.path.exists(self._path(name + '.npy')):
+            os.remove(self._path(name + '.npy'))
+        return _np.lib.format.open_memmap(self._path(name + '.npy'), mode='w+',
+                                          dtype=dtype, shape=shape)
+
+    def _open(self, name, array):
+        """Flushes a created array and reopens the file as read-only memory map"""
+        array.flush()
+        del array
+        return _np.load(self._path(name + '.npy'), mmap_mode='r')
+
+
 class HigherOrderNetwork(Network):
     """
     A higher-order graphical model of path statistics with order k.
@@ -51,7 +206,9 @@ class HigherOrderNetwork(Network):
         node and edge attributes)
     """
 
-    def __init__(self, paths, k=1, null_model=False, separator=None):
+    def __init__(self, paths, k=1, null_model=False, separator=None, matrix_only=False,
+                 min_support=None, top_n=None, min_deviation=None, mmap_dir=None,
+                 chunk_size=100000):
         """Generates a k-th-order representation based on the given path statistics.
 
         Parameters
@@ -75,14 +232,69 @@ class HigherOrderNetwork(Network):
             The separator character to be used in higher-order node names. If this parameter 
             is not specified, the separator character of the underlying paths object will be 
             used.
+        matrix_only: bool
+            If True, only the index of higher-order nodes, the (sparse) link weights and
+            the degrees of freedom are generated. Adjacency and transition matrices are
+            computed directly from these arrays, while the node and link dictionaries
+            (with attributes, successors and predecessors) are only created once they
+            are accessed for the first time. This considerably reduces the memory
+            footprint of models that are only used for model selection. Default is False.
+        min_support: float
+            If set, a pruned layer is generated that only contains k-th order links
+            that have been observed (as subpath or longest path) at least min_support
+            times. Default is None.
+        top_n: int
+            If set, a pruned layer is generated that only contains the top_n most
+            frequent links leaving each k-th order node. Default is None.
+        min_deviation: float
+            If set, a pruned layer is generated that only contains links leaving
+            k-th order nodes whose transition probabilities deviate from the
+            first-order transition probabilities by a total variation distance of at
+            least min_deviation. Default is None.
+        mmap_dir: str
+            If set, the network is constructed out-of-core in the given directory.
+            Links are streamed to disk in chunks of chunk_size links and finally stored
+            in CSR order, i.e. sorted by source and target node, in memory-mapped numpy
+            files (together with the node index and the transition probabilities).
+            Adjacency and transition matrices are created directly from these files
+            and the network is generated in matrix-only mode. Default is None.
+        chunk_size: int
+            The number of links that are kept in memory during the out-of-core
+            construction of a network. Default is 100000.
+
+        Notes
+        -----
+        Setting any of min_support, top_n or min_deviation generates a pruned layer of
+        order k>1. Different from unpruned layers, pruned layers only contain nodes
+        that occur on the retained links, rather than all possible paths of length
+        k-1 in the first-order network. Transition probabilities of retained links are
+        their (unpruned) maximum likelihood estimates. The probability mass of
+        pruned links is assigned to all other transitions proportionally to the
+        first-order transition probabilities, so that every k-th order node (whether
+        retained or not) has a proper transition distribution. Accordingly, the
+        degrees of freedom only count the transition parameters of k-th order nodes
+        with retained links.
         """
         assert not null_model or (null_model and k > 1)
 
+        # whether or not this is a pruned layer
+        self.is_pruned = min_support is not None or top_n is not None or \
+            min_deviation is not None
+        assert not self.is_pruned or (k > 1 and not null_model), \
+            'Pruning is only supported for layers with order k>1 that are not null models'
+        assert not self.is_pruned or mmap_dir is None, \
+            'Pruning is not supported for disk-backed layers'
+
         if not (paths.paths.keys() and max(paths.paths.keys()) >= k):
             msg = ('Constructing a model of order %d requires paths of at least length %d, '
                    'found paths of max length %d ' % (k, k, max(paths.paths.keys())))
             raise PathsTooShort(msg)
 
+        # Whether the node and edge dictionaries still need to be generated from the
+        # index arrays below. This must be set before the attributes of the base class
+        # are initialized.
+        self._pending_view = False
+
         super().__init__(directed=True)
 
         # The order of this HigherOrderNetwork
@@ -93,6 +305,17 @@ class HigherOrderNetwork(Network):
 
         self.is_null_model = null_model
 
+        # The maximum number of queries whose predictions are cached by predict_next
+        self.prediction_cache_size = 100000
+
+        # successors of all nodes sorted by transition probability as well as the LRU
+        # cache of predict_next, which are both generated on the first prediction
+        self._successor_ranking = None
+        self._prediction_cache = None
+
+        # The directory that contains the memory-mapped files of a disk-backed network
+        self._mmap_dir = None if mmap_dir is None else os.path.abspath(mmap_dir)
+
         # The separator character used to label higher-order nodes.
         # For separator '-', the name of a second-order node will be 'a-b'.
         if separator is None:
@@ -100,6 +323,19 @@ class HigherOrderNetwork(Network):
         else:
             self.separator = separator
 
+        # A dictionary that maps higher-order nodes to matrix indices. The insertion order
+        # of this dictionary corresponds to the order of nodes in the network.
+        node_index = {}
+
+        def index(v):
+            idx = node_index.get(v)
+            if idx is None:
+                idx = node_index[v] = len(node_index)
+            return idx
+
+        # source and target indices and weight vectors of all higher-order links
+        links = _LinkWriter(mmap_dir, chunk_size)
+
         if k > 1:
             # For k>1 we need the first-order network to generate the null model
             # and calculate the degrees of freedom
@@ -119,34 +355,21 @@ class HigherOrderNetwork(Network):
 
             if k == 0:
                 # For a 0-order model, we generate a "dummy" start node
-                self.add_node('start', inweight=_np.array([0.0, 0.0]), outweight=_np.array([0.0, 0.0]))
+                index('start')
                 for key, val in iterator:
-                    w = key[0]
                     # add weight val to edge ('start', w)
-                    self.add_node(w, inweight=_np.array([0.0, 0.0]), outweight=_np.array([0.0, 0.0]))
-                    self.add_edge('start', w, weight=val)
+                    links.add(0, index(key[0]), val)
             else:
                 for key, val in iterator:
-                    # Generate names of k-order nodes v and w
-                    v = self.separator.join(key[0:-1])
-                    w = self.separator.join(key[1:])
-                    self.add_node(v, inweight=_np.array([0.0, 0.0]), outweight=_np.array([0.0, 0.0]))
-                    self.add_node(w, inweight=_np.array([0.0, 0.0]), outweight=_np.array([0.0, 0.0]))
+                    # Generate names of k-order nodes v and w and
                     # add weight val to directed edge (v,w)
-                    self.add_edge(v, w, weight=val)
-            
+                    links.add(index(self.separator.join(key[0:-1])),
+                              index(self.separator.join(key[1:])), val)
+
                 # create all possible higher-order nodes
-                if k > 1:
-
-                    nodes = HigherOrderNetwork.generate_possible_paths(g1, k-1)
-                    for p in nodes:
-                        v = p[0]                
-                        for l in range(1, k):
-                            v = v + self.separator + p[l]
-                        
-                        # create nodes and make sure that in- and out-weights are numpy arrays
-                        if v not in self.nodes:
-                            self.add_node(v, inweight=_np.array([0.0, 0.0]), outweight=_np.array([0.0, 0.0]))
+                if k > 1 and not self.is_pruned:
+                    for p in HigherOrderNetwork.generate_possible_paths(g1, k-1):
+                        index(self.separator.join(p))
 
             # Note: For all sequences of length k which (i) have never been observed, but
             #       (ii) do actually represent paths of length k in the first-order
@@ -168,19 +391,6 @@ class HigherOrderNetwork(Network):
 
             # create nodes and links in k-th-order null model
             for p in possible_paths:
-                # create higher-order nodes (a,b,c,...) and (b,c,d,...)
-                v = p[0]
-                for l in range(1, k):
-                    v = v + self.separator + p[l]
-
-                w = p[1]
-                for l in range(2, k + 1):
-                    w = w + self.separator + p[l]                    
-
-                # create nodes and make sure that in- and out-weights are numpy arrays
-                self.add_node(v, inweight=_np.array([0.0, 0.0]), outweight=_np.array([0.0, 0.0]))
-                self.add_node(w, inweight=_np.array([0.0, 0.0]), outweight=_np.array([0.0, 0.0]))
-
                 # In the null model, we encode a first-order Markov process in a k-th-order
                 # model. For the transition probabilities e.g. (a,b) -> (b,c) in a second-order
                 # null model, we simply use the first-order transition probabilities, i.e. P(b->c).             
@@ -194,7 +404,33 @@ class HigherOrderNetwork(Network):
                 # transition probabilities of (b,*)
                 expected_vw = paths.paths[k-1][p[:k]].sum() * p_vw
 
-                self.add_edge(v, w, weight = _np.array([0, expected_vw]))
+                # create higher-order nodes (a,b,c,...) and (b,c,d,...)
+                links.add(index(self.separator.join(p[:-1])),
+                          index(self.separator.join(p[1:])), (0, expected_vw))
+
+        self._node_index = node_index
+        self._edge_sources, self._edge_targets, self._edge_weights, self._indptr = \
+            links.finish(len(node_index))
+
+        # in- and out-weights of nodes. For pruned layers, these include the
+        # weights of pruned links.
+        self._node_inweights = _np.zeros((len(node_index), 2))
+        self._node_outweights = _np.zeros((len(node_index), 2))
+        _np.add.at(self._node_inweights, self._edge_targets, self._edge_weights)
+        _np.add.at(self._node_outweights, self._edge_sources, self._edge_weights)
+
+        if self.is_pruned:
+            self._prune(paths, g1, min_support, top_n, min_deviation)
+
+        # for a disk-backed network, we additionally store the node index and the
+        # transition probabilities (including subpaths) of all links
+        self._transition_data = None
+        if self._indptr is not None:
+            links.write_nodes(node_index)
+            self._transition_data = links.write_transitions(
+                self._edge_sources, self._edge_weights, self._node_outweights)
+
+        self._pending_view = True
 
         # Compute degrees of freedom of models
         if k == 0:
@@ -205,6 +441,17 @@ class HigherOrderNetwork(Network):
             # This holds for both the paths and the ngrams model
             self.dof_paths = self.ncount() - 2
             self.dof_ngrams = self.ncount() - 2
+        elif self.is_pruned:
+            # In a pruned layer, only k-th order nodes with retained links have
+            # transition parameters of their own, while the transitions of all other
+            # nodes are given by the first-order model. Each node with retained links
+            # contributes the number of its possible transitions minus one.
+            retained = _np.unique(self._edge_sources)
+
+            # A is transposed, i.e. column sums are first-order out-degrees
+            outdegrees = _np.asarray(A.sum(axis=0)).ravel()
+            self.dof_paths = int((outdegrees[self._last_nodes[retained]] - 1).sum())
+            self.dof_ngrams = len(retained) * (g1.ncount() - 1)
         else:
             # for a first-order model, self is the first-order network
             if k == 1:
@@ -245,6 +492,180 @@ class HigherOrderNetwork(Network):
             # assumption
             self.dof_paths = paths_k - non_zero
 
+        if not (matrix_only or mmap_dir is not None):
+            self._create_network_view()
+
+
+    def _prune(self, paths, g1, min_support, top_n, min_deviation):
+        """Removes all links from the index arrays that do not pass the given pruning
+        criteria, as well as all nodes that do not occur on any of the remaining links.
+        Also computes the residual probability mass of all nodes that is assigned
+        to non-retained transitions based on the first-order model.
+        """
+        g1_node_mapping = g1.node_to_name_map()
+        T1 = g1.transition_matrix(include_subpaths=True)
+
+        # index of the last first-order node of every k-th order node
+        last_nodes = _np.array([g1_node_mapping[v.split(self.separator)[-1]]
+                                for v in self._node_index], dtype=int)
+
+        sources = self._edge_sources
+        targets = self._edge_targets
+        counts = self._edge_weights.sum(axis=1)
+        D = self._node_outweights.sum(axis=1)
+
+        # (unpruned) transition probabilities of all links as well as the
+        # corresponding first-order transition probabilities
+        probs = _np.zeros(len(sources))
+        probs[counts > 0] = counts[counts > 0] / D[sources[counts > 0]]
+        probs_1 = _np.asarray(T1[last_nodes[targets], last_nodes[sources]]).ravel()
+
+        keep = counts > 0
+        if min_support is not None:
+            keep &= counts >= min_support
+        if top_n is not None:
+            # rank links leaving the same node by decreasing count, considering
+            # only those that have not been pruned yet
+            order = _np.lexsort((_np.arange(len(sources)), -counts, ~keep, sources))
+            group_start = _np.searchsorted(sources[order], sources[order])
+            rank = _np.empty(len(sources), dtype=int)
+            rank[order] = _np.arange(len(sources)) - group_start
+            keep &= rank < top_n
+        if min_deviation is not None:
+            # total variation distance between the transition probabilities of each
+            # node and the first-order transition probabilities, where first-order
+            # transitions that have not been observed contribute their full probability
+            n = len(self._node_index)
+            abs_diff = _np.bincount(sources, weights=_np.abs(probs - probs_1), minlength=n)
+            missing = 1.0 - _np.bincount(sources, weights=probs_1, minlength=n)
+            deviation = 0.5 * (abs_diff + missing)
+            keep &= deviation[sources] >= min_deviation
+
+        # the mass of pruned transitions of a node, and the first-order mass of
+        # all transitions that have not been retained
+        n = len(self._node_index)
+        residual = 1.0 - _np.bincount(sources[keep], weights=probs[keep], minlength=n)
+        backoff_norm = 1.0 - _np.bincount(sources[keep], weights=probs_1[keep], minlength=n)
+
+        # only retain nodes that occur on retained links
+        retained = _np.zeros(n, dtype=bool)
+        retained[sources[keep]] = True
+        retained[targets[keep]] = True
+        new_index = _np.cumsum(retained) - 1
+
+        names = [v for v, r in zip(self._node_index, retained) if r]
+        self._node_index = {v: idx for idx, v in enumerate(names)}
+        self._edge_sources = new_index[sources[keep]]
+        self._edge_targets = new_index[targets[keep]]
+        self._edge_weights = self._edge_weights[keep]
+        self._node_inweights = self._node_inweights[retained]
+        self._node_outweights = self._node_outweights[retained]
+        self._last_nodes = last_nodes[retained]
+        self._residual = _np.clip(residual[retained], 0.0, 1.0)
+        self._backoff_norm = _np.clip(backoff_norm[retained], 0.0, 1.0)
+        self._backoff_node_mapping = g1_node_mapping
+        self._backoff_matrix = T1
+
+    @property
+    def nodes(self):
+        """A dictionary containing higher-order nodes as well as node properties"""
+        if self._pending_view:
+            self._create_network_view()
+        return self._nodes
+
+    @nodes.setter
+    def nodes(self, nodes):
+        self._nodes = nodes
+
+    @property
+    def edges(self):
+        """A dictionary containing higher-order links as well as link properties"""
+        if self._pending_view:
+            self._create_network_view()
+        return self._edges
+
+    @edges.setter
+    def edges(self, edges):
+        self._edges = edges
+
+    @property
+    def successors(self):
+        """A dictionary containing the sets of successors of all higher-order nodes"""
+        if self._pending_view:
+            self._create_network_view()
+        return self._successors
+
+    @successors.setter
+    def successors(self, successors):
+        self._successors = successors
+
+    @property
+    def predecessors(self):
+        """A dictionary containing the sets of predecessors of all higher-order nodes"""
+        if self._pending_view:
+            self._create_network_view()
+        return self._predecessors
+
+    @predecessors.setter
+    def predecessors(self, predecessors):
+        self._predecessors = predecessors
+
+    def _create_network_view(self):
+        """Generates the node and edge dictionaries (including node and edge attributes
+        as well as successors and predecessors) from the index arrays generated in the
+        constructor. Once the network view has been created, it is the only
+        representation of the network, i.e. the index arrays are discarded.
+        """
+        self._pending_view = False
+
+        names = list(self._node_index)
+        sources = self._edge_sources
+        targets = self._edge_targets
+        weights = self._edge_weights
+        n = len(names)
+
+        inweight = self._node_inweights
+        outweight = self._node_outweights
+        indegree = _np.bincount(targets, minlength=n)
+        outdegree = _np.bincount(sources, minlength=n)
+
+        for i, v in enumerate(names):
+            self._nodes[v] = {'inweight': inweight[i], 'outweight': outweight[i],
+                              'indegree': int(indegree[i]), 'outdegree': int(outdegree[i])}
+
+        for s, t, w in zip(sources, targets, weights):
+            v, w_ = names[s], names[t]
+            self._edges[(v, w_)] = {'weight': w}
+            self._successors[v].add(w_)
+            self._predecessors[w_].add(v)
+
+        self._node_index = None
+        self._edge_sources = None
+        self._edge_targets = None
+        self._edge_weights = None
+        self._node_inweights = None
+        self._node_outweights = None
+        self._indptr = None
+        self._transition_data = None
+
+    def _node_names(self):
+        """Returns an iterable over the names of higher-order nodes which, unlike
+        the nodes dictionary, does not require the network view to be created."""
+        if self._pending_view:
+            return self._node_index.keys()
+        return self.nodes.keys()
+
+    def ncount(self):
+        """ Returns the number of nodes """
+        if self._pending_view:
+            return len(self._node_index)
+        return super().ncount()
+
+    def ecount(self):
+        """ Returns the number of links """
+        if self._pending_view:
+            return len(self._edge_sources)
+        return super().ecount()
 
     @staticmethod
     def generate_possible_paths(network, k):
@@ -270,6 +691,8 @@ class HigherOrderNetwork(Network):
 
     def total_edge_weight(self):
         """ Returns the sum of all edge weights """
+        if self._pending_view:
+            return self._edge_weights.sum(axis=0)
         if self.edges:
             return sum(e['weight'] for e in self.edges.values())
         return _np.array([0, 0])
@@ -286,7 +709,7 @@ class HigherOrderNetwork(Network):
         Returns a set of nodes projected to a first-order network
         """
         nodes = set()
-        for v in self.nodes:
+        for v in self._node_names():
             for w in self.higher_order_node_to_path(v):
                 nodes.add(w)
         return nodes
@@ -354,7 +777,7 @@ class HigherOrderNetwork(Network):
 
     def node_to_name_map(self):
         """Returns a dictionary that can be used to map node names to matrix/vector indices"""
-        return {v: idx for idx, v in enumerate(self.nodes)}
+        return {v: idx for idx, v in enumerate(self._node_names())}
 
     def degrees_of_freedom(self, assumption="paths"):
         """Calculates the degrees of freedom (i.e. number of parameters) of
@@ -423,39 +846,316 @@ class HigherOrderNetwork(Network):
         )
         return summary
 
-    def likelihood(self, paths, log=True):
+    def likelihood(self, paths, log=True, per_path=False):
         """
-        Calculates the likelihood of this higher-order model under the observed path 
+        Calculates the likelihood of this higher-order model under the observed path
         statistics given in paths.
+
+        All longest paths are first encoded as pairs of higher-order node indices, so
+        that the transition probabilities of all paths can be gathered from the
+        transition matrix in a single vectorized lookup. For a pruned layer, the
+        probabilities of transitions that have not been retained are backed off to
+        the first-order model.
+
+        Parameters
+        ----------
+        paths: Paths
+            the path statistics for which to calculate the likelihood. Only paths
+            observed as longest paths with at least length k are considered.
+        log: bool
+            whether or not to return the log-likelihood (default: True)
+        per_path: bool
+            if True, a dictionary that maps each longest path to the (log-)likelihood
+            of a single observation of that path is returned as second value.
+            Default is False.
+
+        Returns
+        -------
+        float, or tuple (float, dict) if per_path is True
         """
-        if log:
-            L = 0.0
-        else: 
-            L = 1.0
-        T = self.transition_matrix()
-        node_map = self.node_to_name_map()
+        path_list = []
+        freqs = []
         for l in paths.paths:
-            if l>=self.order:
-                for p in paths.paths[l]:
-                    if paths.paths[l][p][1]>0:
-                        if log:
-                            path_L = 0.0
-                        else:
-                            path_L = 1.0
-                        node_sequence = self.path_to_higher_order_nodes(p)
-                        prev = node_sequence[0]
-                        for n in node_sequence[1:]:
-                            if log:
-                                path_L += _np.log(T[node_map[n], node_map[prev]])
-                            else:
-                                path_L *= T[node_map[n], node_map[prev]]
-                            prev = n
-                        if log:
-                            L += path_L * paths.paths[l][p][1]
-                        else: 
-                            L *= path_L ** paths.paths[l][p][1]
+            if l >= self.order:
+                for p, weight in paths.paths[l].items():
+                    if weight[1] > 0:
+                        path_list.append(p)
+                        freqs.append(weight[1])
+
+        probs, path_ids = self._transition_probabilities(path_list)
+        path_L = _np.bincount(path_ids, weights=_np.log(probs), minlength=len(path_list))
+
+        L = float(_np.dot(path_L, freqs))
+        if not log:
+            L = _np.exp(L)
+            path_L = _np.exp(path_L)
+        if per_path:
+            return L, dict(zip(path_list, path_L))
         return L
 
+    def _transition_probabilities(self, path_list, node_map=None, T=None):
+        """Returns the probabilities of all k-th order transitions along the given
+        paths. For a pruned layer, the probabilities of transitions that have not been
+        retained (including transitions from or to nodes that are not in the network)
+        are backed off to the first-order model.
+
+        Parameters
+        ----------
+        path_list: list
+            a list of path tuples with at least length k
+        node_map: dict
+            a precomputed mapping of node names to matrix indices (default: None)
+        T: scipy.sparse matrix
+            a precomputed transition matrix of this network (default: None)
+
+        Returns
+        -------
+        tuple
+            a tuple (probs, path_ids) where probs[i] is the probability of the i-th
+            transition, which belongs to the path with index path_ids[i]
+
+        Raises
+        ------
+        KeyError
+            if a node of an unpruned layer (or a first-order node of a pruned layer)
+            does not exist
+        """
+        if node_map is None:
+            node_map = self.node_to_name_map()
+        if T is None:
+            T = self.transition_matrix()
+
+        if self.is_pruned:
+            index = lambda v: node_map.get(v, -1)
+        else:
+            index = node_map.__getitem__
+
+        idx = [[index(v) for v in self.path_to_higher_order_nodes(p)] for p in path_list]
+        path_ids = _np.fromiter((i for i, nodes in enumerate(idx) for _ in nodes[1:]),
+                                dtype=int)
+        sources = _np.fromiter((v for nodes in idx for v in nodes[:-1]), dtype=int)
+        targets = _np.fromiter((v for nodes in idx for v in nodes[1:]), dtype=int)
+
+        def last_nodes():
+            g1_map = self._backoff_node_mapping
+            k = self.order
+            last_sources = _np.fromiter((g1_map[p[i + k - 1]] for p in path_list
+                                         for i in range(len(p) - k)), dtype=int)
+            last_targets = _np.fromiter((g1_map[p[i + k]] for p in path_list
+                                         for i in range(len(p) - k)), dtype=int)
+            return last_sources, last_targets
+
+        return self._gather_probabilities(sources, targets, T, last_nodes), path_ids
+
+    def _gather_probabilities(self, sources, targets, T, last_nodes):
+        """Returns the probabilities of the transitions between the given arrays of
+        source and target indices, where an index of -1 refers to a node that does not
+        exist in a pruned layer.
+
+        Parameters
+        ----------
+        sources: numpy.ndarray
+            the indices of the source nodes of all transitions
+        targets: numpy.ndarray
+            the indices of the target nodes of all transitions
+        T: scipy.sparse matrix
+            the transition matrix of this network
+        last_nodes: callable
+            a function that returns two arrays with the indices of the last
+            first-order nodes of all sources and targets in the first-order model
+            used for back-off. This is only called for pruned layers.
+
+        Returns
+        -------
+        numpy.ndarray
+        """
+        if not self.is_pruned:
+            # transition matrices are transposed, i.e. T[target, source]
+            return _np.asarray(T[targets, sources]).ravel()
+
+        known = (sources >= 0) & (targets >= 0)
+        probs = _np.zeros(len(sources))
+        probs[known] = _np.asarray(T[targets[known], sources[known]]).ravel()
+
+        # back off to the first-order model for all transitions that have not been
+        # retained, using the last first-order nodes of source and target
+        backoff = probs <= 0
+        if backoff.any():
+            last_sources, last_targets = last_nodes()
+            residual = _np.ones(len(sources))
+            norm = _np.ones(len(sources))
+            residual[sources >= 0] = self._residual[sources[sources >= 0]]
+            norm[sources >= 0] = self._backoff_norm[sources[sources >= 0]]
+            probs_1 = _np.asarray(self._backoff_matrix[last_targets[backoff],
+                                                       last_sources[backoff]]).ravel()
+            with _np.errstate(divide='ignore', invalid='ignore'):
+                probs[backoff] = _np.where(norm[backoff] > 0,
+                                           residual[backoff] * probs_1 / norm[backoff], 0.0)
+        return probs
+
+    def _add_path_counts(self, counts):
+        """Adds the weights of paths of length k to the weights of the corresponding
+        links and nodes. All nodes must already exist in the network, which must neither
+        be pruned nor disk-backed.
+
+        Parameters
+        ----------
+        counts: dict
+            a dictionary that maps path tuples of length k to weight vectors
+
+        Returns
+        -------
+        numpy.ndarray
+            the indices of all nodes whose outgoing links have changed
+        """
+        assert not self.is_pruned and not self._is_disk_backed(), \
+            'Error: Cannot add path counts to pruned or disk-backed networks'
+        node_map = self.node_to_name_map()
+        if self.order == 0:
+            links = [('start', p[0]) for p in counts]
+        else:
+            links = [(self.separator.join(p[:-1]), self.separator.join(p[1:]))
+                     for p in counts]
+        sources = _np.array([node_map[v] for v, _ in links], dtype=int)
+        targets = _np.array([node_map[w] for _, w in links], dtype=int)
+        weights = _np.array(list(counts.values()), dtype=float).reshape(len(links), 2)
+
+        if self._pending_view:
+            # find the positions of existing links, and append all other links
+            n = self.ncount()
+            order = _np.argsort(self._edge_sources * n + self._edge_targets)
+            keys = (self._edge_sources * n + self._edge_targets)[order]
+            new_keys = sources * n + targets
+            pos = _np.searchsorted(keys, new_keys)
+            exists = pos < len(keys)
+            exists[exists] = keys[pos[exists]] == new_keys[exists]
+
+            self._edge_weights[order[pos[exists]]] += weights[exists]
+            self._edge_sources = _np.concatenate([self._edge_sources, sources[~exists]])
+            self._edge_targets = _np.concatenate([self._edge_targets, targets[~exists]])
+            self._edge_weights = _np.concatenate([self._edge_weights, weights[~exists]])
+            _np.add.at(self._node_inweights, targets, weights)
+            _np.add.at(self._node_outweights, sources, weights)
+        else:
+            for (v, w), weight in zip(links, weights):
+                if (v, w) not in self.edges:
+                    self.edges[(v, w)] = {'weight': _np.zeros(2)}
+                    self.successors[v].add(w)
+                    self.predecessors[w].add(v)
+                    self.nodes[v]['outdegree'] += 1
+                    self.nodes[w]['indegree'] += 1
+                self.edges[(v, w)]['weight'] += weight
+                self.nodes[v]['outweight'] += weight
+                self.nodes[w]['inweight'] += weight
+
+        self._successor_ranking = None
+        self._prediction_cache = None
+        return _np.unique(sources)
+
+    def _update_transition_matrix(self, T, nodes):
+        """Returns the given (transposed) transition matrix of this network, where the
+        transition probabilities of the nodes with the given indices are recomputed.
+        """
+        keep = _np.ones(self.ncount())
+        keep[nodes] = 0
+        T_nodes = self._transition_matrix(self._edge_arrays(nodes), include_subpaths=True)
+        return (T @ _sparse.diags(keep) + T_nodes).tocsr()
+
+    def predict_next(self, prefix, top_k=1):
+        """Predicts the most likely next nodes following a sequence of first-order
+        nodes, based on the transition probabilities (including subpaths) of the
+        k-th order node given by the last k nodes of the prefix.
+
+        On the first call, the successors of all nodes are sorted by their transition
+        probabilities, so that each prediction only requires a lookup. Predictions
+        are additionally kept in an LRU cache of size prediction_cache_size.
+
+        Parameters
+        ----------
+        prefix: tuple
+            the sequence of (at least k) first-order nodes that precede the prediction
+        top_k: int
+            the (maximum) number of predicted nodes (default 1)
+
+        Returns
+        -------
+        list
+            a list of at most top_k tuples (node, probability) of first-order nodes
+            sorted by decreasing probability. The list is empty if the k-th order node
+            given by the prefix does not exist or has no successors.
+
+        Examples
+        --------
+        >>> from pathpy import Paths
+        >>> paths = Paths()
+        >>> paths.add_path('a,b,c', frequency=3)
+        >>> paths.add_path('a,b,d', frequency=1)
+        >>> hon = HigherOrderNetwork(paths, k=2)
+        >>> hon.predict_next(('a', 'b'), top_k=2)
+        [('c', 0.75), ('d', 0.25)]
+        """
+        assert len(prefix) >= self.order, 'Error: Prefix length must be at least k'
+        if self._prediction_cache is None:
+            self._prediction_cache = lru_cache(maxsize=self.prediction_cache_size)(
+                self._predict_next)
+        return self._prediction_cache(tuple(prefix[len(prefix) - self.order:]), top_k)
+
+    def predict_next_batch(self, prefixes, top_k=1):
+        """Predicts the most likely next nodes for multiple prefixes.
+
+        Parameters
+        ----------
+        prefixes: iterable
+            the sequences of first-order nodes for which to predict the next nodes
+        top_k: int
+            the (maximum) number of predicted nodes per prefix (default 1)
+
+        Returns
+        -------
+        list
+            a list that contains the result of predict_next for each prefix
+        """
+        return [self.predict_next(prefix, top_k) for prefix in prefixes]
+
+    def _predict_next(self, prefix, top_k):
+        node_map, ranking, names = self._ranked_successors()
+        idx = node_map.get(self.separator.join(prefix) if prefix else 'start')
+        if idx is None:
+            return []
+        indptr, successors, probs = ranking
+        start = indptr[idx]
+        end = min(indptr[idx + 1], start + top_k)
+        return [(names[v], float(p)) for v, p in zip(successors[start:end], probs[start:end])]
+
+    def _ranked_successors(self):
+        """Returns the node name map, the successors of all nodes in CSR format
+        (index pointer, successor indices and transition probabilities) sorted by
+        decreasing transition probability, and the first-order node names
+        corresponding to the last element of all nodes.
+        """
+        if self._successor_ranking is None:
+            # columns of the (transposed) transition matrix contain the transition
+            # probabilities of a node to its successors
+            T = self.transition_matrix(include_subpaths=True).tocsc()
+            n = self.ncount()
+            sources = _np.repeat(_np.arange(n), _np.diff(T.indptr))
+            targets, probs = _np.asarray(T.indices), _np.asarray(T.data)
+            is_successor = probs > 0
+            sources, targets, probs = \
+                sources[is_successor], targets[is_successor], probs[is_successor]
+
+            order = _np.lexsort((targets, -probs, sources))
+            indptr = _np.zeros(n + 1, dtype=int)
+            indptr[1:] = _np.cumsum(_np.bincount(sources, minlength=n))
+
+            node_map = self.node_to_name_map()
+            if self.order == 0:
+                names = list(node_map)
+            else:
+                names = [v.split(self.separator)[-1] for v in node_map]
+            self._successor_ranking = (node_map, (indptr, targets[order], probs[order]),
+                                       names)
+        return self._successor_ranking
 
     def adjacency_matrix(self, include_subpaths=True, weighted=True, transposed=False):
         """Returns a sparse adjacency matrix of the higher-order network. By default,
@@ -477,31 +1177,29 @@ class HigherOrderNetwork(Network):
         -------
         numpy cooc matrix
         """
-        row = []
-        col = []
-        data = []
-
-        node_to_coord = self.node_to_name_map()
+        sources, targets, weights, _ = self._edge_arrays()
 
         if transposed:
-            for s, t in self.edges:
-                row.append(node_to_coord[t])
-                col.append(node_to_coord[s])
+            row, col = targets, sources
         else:
-            for s, t in self.edges:
-                row.append(node_to_coord[s])
-                col.append(node_to_coord[t])
+            row, col = sources, targets
 
         # create array with non-zero entries
         if not weighted:
-            data = _np.ones(len(self.edges.keys()))
+            data = _np.ones(len(sources))
         else:
             if include_subpaths:
-                data = _np.array([float(self.edges[e]['weight'].sum()) for e in self.edges])
+                data = weights.sum(axis=1)
             else:
-                data = _np.array([float(self.edges[e]['weight'][1]) for e in self.edges])
+                data = weights[:, 1].copy()
 
         shape = (self.ncount(), self.ncount())
+        if self._is_disk_backed():
+            # links are stored in CSR order, so the (memory-mapped) index arrays can
+            # be used directly. The transpose of a CSR matrix is a CSC matrix that
+            # shares the same arrays.
+            A = _sparse.csr_matrix((data, self._edge_targets, self._indptr), shape=shape)
+            return A.T if transposed else A
         return _sparse.coo_matrix((data, (row, col)), shape=shape).tocsr()
 
 
@@ -519,47 +1217,241 @@ class HigherOrderNetwork(Network):
         -------
 
         """
-        row = []
-        col = []
-        data = []
+        if self._is_disk_backed() and include_subpaths:
+            # the transposed transition matrix is the transpose of a CSR matrix with
+            # the stored transition probabilities, i.e. a CSC matrix
+            shape = self.ncount(), self.ncount()
+            return _sparse.csr_matrix((self._transition_data, self._edge_targets,
+                                       self._indptr), shape=shape).T
+
+        return self._transition_matrix(self._edge_arrays(), include_subpaths)
+
+    def _transition_matrix(self, edge_arrays, include_subpaths):
+        """Returns the (transposed) transition matrix of the links given by a tuple of
+        arrays as returned by _edge_arrays.
+        """
+        sources, targets, weights, outweights = edge_arrays
+
         # calculate weighted out-degrees (with or without subpaths)
         if include_subpaths:
-            D = {n: self.nodes[n]['outweight'].sum() for n in self.nodes}
+            D = outweights.sum(axis=1)
+            counts = weights.sum(axis=1)
         else:
-            D = {n: self.nodes[n]['outweight'][1] for n in self.nodes}
+            D = outweights[:, 1]
+            counts = weights[:, 1]
 
-        node_to_coord = self.node_to_name_map()
+        # either s->t has been observed as a longest path, or we are interested in
+        # subpaths as well
 
-        for (s, t) in self.edges:
-            # either s->t has been observed as a longest path, or we are interested in
-            # subpaths as well
-
-            # the following makes sure that we do not accidentally consider zero-weight
-            # edges (automatically added by default_dic)
-            unique_weight = self.edges[(s, t)]['weight'][1]
-            subpath_weight = self.edges[(s, t)]['weight'][0]
-            is_valid = (unique_weight > 0 or (include_subpaths and subpath_weight > 0))
-            if is_valid:
-                row.append(node_to_coord[t])
-                col.append(node_to_coord[s])
-                if include_subpaths:
-                    count = self.edges[(s, t)]['weight'].sum()
-                else:
-                    count = self.edges[(s, t)]['weight'][1]
-                assert D[s] > 0, \
-                    'Encountered zero out-degree for node "{s}" ' \
-                    'while weight of link ({s}, {t}) is non-zero.'.format(s=s, t=t)
-                prob = count / D[s]
-                if prob < 0 or prob > 1:  # pragma: no cover
-                    raise ValueError('Encountered transition probability {p} outside '
-                                     '[0,1] range.'.format(p=prob))
-                data.append(prob)
-
-        data = _np.array(data)
-        data = data.reshape(data.size, )
+        # the following makes sure that we do not accidentally consider zero-weight
+        # edges (automatically added by default_dic)
+        is_valid = weights[:, 1] > 0
+        if include_subpaths:
+            is_valid |= weights[:, 0] > 0
+        sources, targets, counts = sources[is_valid], targets[is_valid], counts[is_valid]
+
+        zero_degree = D[sources] <= 0
+        if zero_degree.any():
+            names = list(self._node_names())
+            s = names[sources[zero_degree][0]]
+            t = names[targets[zero_degree][0]]
+            raise AssertionError('Encountered zero out-degree for node "{s}" '
+                                 'while weight of link ({s}, {t}) is non-zero.'.format(s=s, t=t))
+        data = counts / D[sources]
+        if ((data < 0) | (data > 1)).any():  # pragma: no cover
+            prob = data[(data < 0) | (data > 1)][0]
+            raise ValueError('Encountered transition probability {p} outside '
+                             '[0,1] range.'.format(p=prob))
 
         shape = self.ncount(), self.ncount()
-        return _sparse.coo_matrix((data, (row, col)), shape=shape).tocsr()
+        return _sparse.coo_matrix((data, (targets, sources)), shape=shape).tocsr()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_prediction_cache'] = None
+        if self._is_disk_backed():
+            # memory-mapped arrays are opened again when unpickling, rather than
+            # copying their contents
+            for name in _STORAGE_ARRAYS.values():
+                state[name] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self._pending_view and self._mmap_dir is not None:
+            self._open_storage(self._mmap_dir)
+
+    def _open_storage(self, directory):
+        """Opens the memory-mapped link arrays of a disk-backed network in the given
+        directory.
+        """
+        for file_name, name in _STORAGE_ARRAYS.items():
+            setattr(self, name, _np.load(os.path.join(directory, file_name + '.npy'),
+                                         mmap_mode='r'))
+
+    def save(self, directory):
+        """Saves the network in a binary format in the given directory, from which it
+        can be loaded with HigherOrderNetwork.load. Links are stored in CSR order
+        (together with their transition probabilities) in numpy files, i.e. in the
+        same format as the memory-mapped files of a disk-backed network.
+
+        Parameters
+        ----------
+        directory: str
+            the directory in which the network is saved
+        """
+        os.makedirs(directory, exist_ok=True)
+
+        def path(name):
+            # existing files are removed rather than overwritten, since they may still
+            # be mapped to the memory of other networks
+            file_name = os.path.join(directory, name)
+            if os.path.exists(file_name):
+                os.remove(file_name)
+            return file_name
+
+        names = list(self._node_names())
+        n = len(names)
+        if self._pending_view:
+            inweights = self._node_inweights
+        else:
+            inweights = _np.array([self.nodes[v]['inweight'] for v in names], dtype=float)
+            inweights = inweights.reshape(n, 2)
+
+        stored = os.path.abspath(directory) == self._mmap_dir and self._is_disk_backed()
+        sources, targets, weights, outweights = self._edge_arrays()
+        if not stored:
+            order = _np.lexsort((targets, sources))
+            sources, targets, weights = sources[order], targets[order], weights[order]
+            m = len(sources)
+            index_dtype = _np.int32 if max(n, m) < _np.iinfo(_np.int32).max else _np.int64
+            indptr = _np.zeros(n + 1, dtype=index_dtype)
+            indptr[1:] = _np.cumsum(_np.bincount(sources, minlength=n))
+            D = outweights.sum(axis=1)[sources]
+            transitions = _np.divide(weights.sum(axis=1), D, out=_np.zeros(m), where=D > 0)
+            arrays = {'sources': sources.astype(index_dtype),
+                      'targets': targets.astype(index_dtype),
+                      'weights': weights, 'indptr': indptr, 'transitions': transitions}
+            for name, array in arrays.items():
+                _np.save(path(name + '.npy'), array)
+            with open(path('nodes.txt'), 'w') as f:
+                for v in names:
+                    f.write(v + '\n')
+
+        _np.save(path('inweights.npy'), inweights)
+        _np.save(path('outweights.npy'), outweights)
+        if self.is_pruned:
+            _np.save(path('last_nodes.npy'), self._last_nodes)
+            _np.save(path('residual.npy'), self._residual)
+            _np.save(path('backoff_norm.npy'), self._backoff_norm)
+            _sparse.save_npz(path('backoff_matrix.npz'), self._backoff_matrix.tocsr())
+            with open(path('backoff_nodes.txt'), 'w') as f:
+                for v in self._backoff_node_mapping:
+                    f.write(v + '\n')
+
+        attributes = {'order': self.order, 'separator': self.separator,
+                      'null_model': self.is_null_model, 'pruned': self.is_pruned,
+                      'dof_paths': int(self.dof_paths), 'dof_ngrams': int(self.dof_ngrams)}
+        with open(path('network.json'), 'w') as f:
+            json.dump(attributes, f)
+
+    @classmethod
+    def load(cls, directory):
+        """Loads a network that has been saved with HigherOrderNetwork.save. The links
+        of the network are memory-mapped (read-only) from the files in the given
+        directory, i.e. the loaded network is disk-backed (see HigherOrderNetwork) and
+        the files can be shared by multiple processes.
+
+        Parameters
+        ----------
+        directory: str
+            the directory in which the network has been saved
+
+        Returns
+        -------
+        HigherOrderNetwork
+        """
+        def path(name):
+            return os.path.join(directory, name)
+
+        with open(path('network.json')) as f:
+            attributes = json.load(f)
+
+        network = cls.__new__(cls)
+        network._pending_view = False
+        Network.__init__(network, directed=True)
+        network.order = attributes['order']
+        network.paths = None
+        network.is_null_model = attributes['null_model']
+        network.is_pruned = attributes['pruned']
+        network.separator = attributes['separator']
+        network.dof_paths = attributes['dof_paths']
+        network.dof_ngrams = attributes['dof_ngrams']
+        network.prediction_cache_size = 100000
+        network._successor_ranking = None
+        network._prediction_cache = None
+        network._mmap_dir = os.path.abspath(directory)
+
+        with open(path('nodes.txt')) as f:
+            network._node_index = {v[:-1]: idx for idx, v in enumerate(f)}
+        network._open_storage(directory)
+        network._node_inweights = _np.load(path('inweights.npy'))
+        network._node_outweights = _np.load(path('outweights.npy'))
+
+        if network.is_pruned:
+            network._last_nodes = _np.load(path('last_nodes.npy'))
+            network._residual = _np.load(path('residual.npy'))
+            network._backoff_norm = _np.load(path('backoff_norm.npy'))
+            network._backoff_matrix = _sparse.load_npz(path('backoff_matrix.npz'))
+            with open(path('backoff_nodes.txt')) as f:
+                network._backoff_node_mapping = {v[:-1]: idx for idx, v in enumerate(f)}
+
+        network._pending_view = True
+        return network
+
+    def _is_disk_backed(self):
+        """Returns whether the links of this network are stored in memory-mapped
+        files that can be used to create adjacency and transition matrices.
+        """
+        return self._pending_view and self._indptr is not None
+
+    def _edge_arrays(self, nodes=None):
+        """Returns the source and target indices as well as the weight vectors of all
+        links, and the weighted out-degrees of all nodes as numpy arrays.
+
+        Parameters
+        ----------
+        nodes: numpy.ndarray
+            if given, only the links leaving the nodes with these indices are returned
+
+        Returns
+        -------
+        tuple
+            a tuple (sources, targets, weights, outweights) where weights is an array
+            with shape (ecount, 2) and outweights is an array with shape (ncount, 2)
+        """
+        if self._pending_view:
+            if nodes is None:
+                return (self._edge_sources, self._edge_targets, self._edge_weights,
+                        self._node_outweights)
+            selected = _np.isin(self._edge_sources, nodes)
+            return (self._edge_sources[selected], self._edge_targets[selected],
+                    self._edge_weights[selected], self._node_outweights)
+
+        node_to_coord = self.node_to_name_map()
+        if nodes is None:
+            edges = list(self.edges)
+        else:
+            names = list(node_to_coord)
+            edges = [(names[v], w) for v in nodes for w in self.successors[names[v]]]
+        m = len(edges)
+        sources = _np.fromiter((node_to_coord[s] for s, _ in edges), dtype=int, count=m)
+        targets = _np.fromiter((node_to_coord[t] for _, t in edges), dtype=int, count=m)
+        weights = _np.array([self.edges[e]['weight'] for e in edges], dtype=float)
+        weights = weights.reshape(m, 2)
+        outweights = _np.array([self.nodes[v]['outweight'] for v in self.nodes], dtype=float)
+        outweights = outweights.reshape(self.ncount(), 2)
+        return sources, targets, weights, outweights
 
 
     def laplacian_matrix(self, include_subpaths=True):
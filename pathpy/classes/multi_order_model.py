@@ -22,11 +22,21 @@
 #
 #    E-mail: scholtes@ifi.uzh.ch
 #    Web:    http://www.ingoscholtes.net
+import copy
+import json
+import os
+import tempfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+
 import numpy as np
 from scipy.stats import chi2
 
-from pathpy.utils import Log, Severity
+from pathpy.utils import Log, Severity, open_file
 from pathpy.utils.exceptions import PathpyError, PathsTooShort, PathpyNotImplemented
+from pathpy.utils.parallel import mp_context
 from pathpy.classes.higher_order_network import HigherOrderNetwork
 from pathpy.classes.paths import Paths
 
@@ -34,6 +44,273 @@ from pathpy.classes.paths import Paths
 np.seterr(all='warn')
 
 
+# the path statistics shared with worker processes that generate layers in parallel
+_shared_paths = None
+
+
+def _write_shared_paths(paths, orders, directory):
+    """Writes the node ids and weights of all paths needed to generate layers with the
+    given orders to numpy files in the given directory.
+
+    Returns
+    -------
+    tuple
+        the arguments for _init_layer_worker
+    """
+    node_ids = {}
+    lengths = [l for l in sorted(set(orders) | {1}) if l in paths.paths]
+    for l in lengths:
+        ids = [node_ids.setdefault(v, len(node_ids)) for p in paths.paths[l] for v in p]
+        np.save(os.path.join(directory, 'paths_%d.npy' % l),
+                np.array(ids, dtype=np.int64).reshape(len(paths.paths[l]), l + 1))
+        np.save(os.path.join(directory, 'weights_%d.npy' % l),
+                np.array(list(paths.paths[l].values()), dtype=float).reshape(-1, 2))
+    return directory, lengths, list(node_ids), paths.separator, max(paths.paths)
+
+
+def _init_layer_worker(directory, lengths, names, separator, max_length):
+    global _shared_paths
+    _shared_paths = directory, lengths, names, separator, max_length
+
+
+def _generate_layer(k, options):
+    """Generates the layer with order k in a worker process, based on the paths of
+    length k (and one) in the memory-mapped files written by _write_shared_paths.
+
+    Note that only the transfer of path statistics to the worker is compact: the
+    worker rebuilds a Paths instance (with tuples of node names) for the paths of
+    length zero, one and k, so its memory grows with the number of these paths.
+    """
+    directory, lengths, names, separator, max_length = _shared_paths
+
+    paths = Paths(separator=separator)
+    for l in set(lengths) & {0, 1, k}:
+        ids = np.load(os.path.join(directory, 'paths_%d.npy' % l), mmap_mode='r')
+        weights = np.load(os.path.join(directory, 'weights_%d.npy' % l), mmap_mode='r')
+        paths_l = paths.paths[l]
+        for p, weight in zip(ids, weights):
+            paths_l[tuple(names[v] for v in p)] = np.array(weight)
+    # make sure that the maximum path length is the same as in the original paths
+    paths.paths[max_length]
+
+    Log.add('Generating %d-th order layer ...' % k)
+    layer = HigherOrderNetwork(paths, k, null_model=False, **options)
+    layer.paths = None
+    return k, layer
+
+
+# multipliers used to shard paths by a hash of their node ids
+_SHARD_HASH = np.random.RandomState(0).randint(1, 2**31, size=1024)
+
+
+# the (stripped) model used by worker processes that compute likelihoods in parallel
+_shared_model = None
+
+
+def _init_likelihood_worker(model, names, index_maps):
+    global _shared_model
+    _shared_model = model, names, index_maps
+
+
+def _shard_log_likelihoods(X, orders):
+    """Computes the log-likelihoods of the paths in a shard in a worker process"""
+    model, names, index_maps = _shared_model
+    return {l: model._path_log_likelihoods(X, names, l, index_maps) for l in orders}
+
+
+# the partitioned path statistics used by worker processes that fit and evaluate the
+# models of different folds in parallel
+_shared_folds = None
+
+
+def _init_fold_worker(*folds):
+    global _shared_folds
+    _shared_folds = folds
+
+
+def _fit_fold(i):
+    """Returns the held-out log-likelihoods of the i-th fold of the partitioned paths
+    shared by _init_fold_worker (in a worker process)."""
+    return _evaluate_fold(_shared_folds, i)
+
+
+def _evaluate_fold(folds, i):
+    """Fits a multi-order model to all but the i-th partition of the partitioned paths
+    folds (paths, counts, separator, max_order, options, smoothing, num_nodes) and
+    returns the smoothed log-likelihoods of the paths in the i-th partition for all
+    orders. The log-likelihoods of orders which exceed the length of the longest
+    training path are nan.
+    """
+    paths, counts, separator, max_order, options, smoothing, num_nodes = folds
+
+    train = Paths(separator=separator)
+    train.max_subpath_length = max_order
+    test = Paths(separator=separator)
+    train_counts = counts.sum(axis=1) - counts[:, i]
+    for p, train_count, test_count in zip(paths, train_counts, counts[:, i]):
+        if train_count > 0:
+            train.add_path(p, frequency=(0, train_count))
+        if test_count > 0:
+            test.add_path(p, frequency=(0, test_count), expand_subpaths=False)
+
+    likelihoods = np.full(max_order + 1, np.nan)
+    if not train.paths or not test.paths:
+        return likelihoods
+    # the training paths of a fold can be shorter than max_order
+    k = min(max_order, max(train.paths))
+    model = MultiOrderModel(train, k, matrix_only=True, max_workers=1, **options)
+    likelihoods[:k + 1] = model._smoothed_likelihoods(test, smoothing, num_nodes)
+    return likelihoods
+
+
+class _PathSampler:
+    """Generates random samples of the observed (longest) paths of a multi-order model,
+    which preserve the statistics of the model with a given null order k0 but not
+    correlations of higher orders. For the method 'bootstrap', paths with the
+    observed lengths are generated by the layers of the model with order up to k0.
+    For the method 'permutation', the observed paths are shuffled by randomly
+    exchanging the continuations of paths with the same length after the same k0
+    nodes, which preserves the frequencies of all paths of length k0.
+    """
+
+    def __init__(self, model, max_order_null, method):
+        assert method in ('bootstrap', 'permutation'), \
+            'Error: method must be bootstrap or permutation'
+        self.max_order_null = max_order_null
+        self.method = method
+        self.separator = model.paths.separator
+
+        encoded, self.names = model._encode_paths(model.paths, 0, max(model.paths.paths))
+        self.observations = {}
+        for L, (X, freqs) in encoded.items():
+            if (freqs != np.round(freqs)).any():
+                raise PathpyError('Resampling tests require integer path frequencies')
+            self.observations[L] = np.repeat(X, freqs.astype(np.int64), axis=0)
+
+        if method == 'bootstrap':
+            node_ids = {v: i for i, v in enumerate(self.names)}
+            self.layers = [self._layer_table(model, l, node_ids)
+                           for l in range(max_order_null + 1)]
+            self.names = list(node_ids)
+
+    @staticmethod
+    def _layer_table(model, l, node_ids):
+        """Returns the sampling table of the layer with order l of the given model, i.e.
+        the cumulative transition probabilities of all nodes (in CSR format), the ids
+        of the last first-order nodes of all layer nodes and a dictionary that maps
+        sequences of l first-order node ids to layer nodes.
+        """
+        layer = model.layers[l]
+        if layer.is_pruned:
+            raise PathpyNotImplemented('Resampling tests with a pruned null model '
+                                       'are not supported')
+        P = model.transition_matrices[l].T.tocsr()
+        P.sort_indices()
+        cumulative = np.concatenate([[0.0], np.cumsum(P.data)])
+        base = cumulative[P.indptr[:-1]]
+        total = cumulative[P.indptr[1:]] - base
+
+        names = list(layer.node_to_name_map())
+        paths = [(v,) if l == 0 else tuple(v.split(layer.separator)) for v in names]
+        node_paths = {}
+        last_nodes = np.full(len(names), -1, dtype=np.int64)
+        for i, p in enumerate(paths):
+            if l == 0 and p == ('start',):
+                continue
+            ids = tuple(node_ids.setdefault(v, len(node_ids)) for v in p)
+            node_paths[ids] = i
+            last_nodes[i] = ids[-1]
+        if l == 0:
+            node_paths = {(): names.index('start')}
+        return P, cumulative[1:], base, total, last_nodes, node_paths
+
+    def sample(self, rng, max_subpath_length):
+        """Returns a random sample of the observed paths as Paths instance, which
+        contains sub path statistics up to the given length.
+        """
+        paths = Paths(separator=self.separator)
+        paths.max_subpath_length = max_subpath_length
+        for L, X in self.observations.items():
+            if self.method == 'bootstrap':
+                X = self._generate(L, len(X), rng)
+            else:
+                X = self._permute(X, rng)
+            unique, counts = np.unique(X, axis=0, return_counts=True)
+            for p, count in zip(unique, counts):
+                paths.add_path(tuple(self.names[v] for v in p), frequency=(0, count))
+        return paths
+
+    def _generate(self, L, n, rng):
+        # generate the j-th node of all paths based on the preceding l nodes in the
+        # layer with order l = min(j, k0), backing off to lower orders for sequences
+        # of nodes without transitions
+        X = np.zeros((n, L + 1), dtype=np.int64)
+        for j in range(L + 1):
+            missing = np.ones(n, dtype=bool)
+            for l in range(min(j, self.max_order_null), -1, -1):
+                rows = np.flatnonzero(missing)
+                P, cumulative, base, total, last_nodes, node_paths = self.layers[l]
+                if l == 0:
+                    sources = np.full(len(rows), node_paths[()])
+                else:
+                    unique, inverse = np.unique(X[rows, j - l:j], axis=0, return_inverse=True)
+                    ids = np.array([node_paths.get(tuple(p), -1) for p in unique])
+                    sources = ids[inverse.ravel()]
+                valid = sources >= 0
+                valid[valid] = total[sources[valid]] > 0
+                rows, sources = rows[valid], sources[valid]
+                u = base[sources] + rng.random(len(rows)) * total[sources]
+                pos = np.minimum(np.searchsorted(cumulative, u, side='right'),
+                                 P.indptr[sources + 1] - 1)
+                X[rows, j] = last_nodes[P.indices[pos]]
+                missing[rows] = False
+                if not missing.any():
+                    break
+        return X
+
+    def _permute(self, X, rng):
+        # exchange the continuations of all paths after position i between paths
+        # with the same k0 nodes up to position i
+        X = X.copy()
+        n, k0 = X.shape[0], self.max_order_null
+        for i in range(max(k0 - 1, 0), X.shape[1] - 1):
+            if k0 > 0:
+                _, groups = np.unique(X[:, i - k0 + 1:i + 1], axis=0, return_inverse=True)
+                groups = groups.ravel()
+            else:
+                groups = np.zeros(n, dtype=np.int64)
+            rows = np.argsort(groups, kind='stable')
+            permuted = np.lexsort((rng.random(n), groups))
+            X[rows, i + 1:] = X[permuted, i + 1:]
+        return X
+
+
+# the path sampler used by worker processes that perform a resampling test
+_shared_sampler = None
+
+
+def _init_resampling_worker(*sampler):
+    global _shared_sampler
+    _shared_sampler = sampler
+
+
+def _resampled_statistic(seed):
+    """Returns the likelihood ratio test statistic of a random path sample generated
+    by the sampler shared by _init_resampling_worker (in a worker process)."""
+    return _sample_and_evaluate(_shared_sampler, seed)
+
+
+def _sample_and_evaluate(resampling, seed):
+    """Fits a multi-order model to a random path sample generated by a resampling test
+    (sampler, max_order, pruning) with the given seed and returns its likelihood ratio
+    test statistic.
+    """
+    sampler, max_order, pruning = resampling
+    paths = sampler.sample(np.random.default_rng(seed), max_order)
+    model = MultiOrderModel(paths, max_order, matrix_only=True, max_workers=1, **pruning)
+    return model._likelihood_ratio_statistic(paths, sampler.max_order_null, max_order)
+
+
 class MultiOrderModel:
     """
     A hierarchy of higher-order networks which jointly represent
@@ -47,7 +324,8 @@ class MultiOrderModel:
         A dictionary where layers[k] contains the higher-order model with order k
     """
 
-    def __init__(self, paths, max_order=1):
+    def __init__(self, paths, max_order=1, matrix_only=False, min_support=None,
+                 top_n=None, min_deviation=None, mmap_dir=None, max_workers=None):
         """Generates a hierarchy of higher-order models for the given path statistics
         up to a given maximum order
 
@@ -57,6 +335,33 @@ class MultiOrderModel:
             the paths instance for which the model should be created
         max_order: int
             the maximum order of the multi-order model
+        matrix_only: bool
+            whether to generate the layers of the model in the memory-efficient
+            matrix-only mode of HigherOrderNetwork, where the node and link dictionaries
+            of a layer are only created when they are accessed. This is sufficient for
+            likelihood calculations and model selection. Default is False.
+        min_support: float
+            if set, layers with order k>1 are pruned to links that have been observed
+            at least min_support times (see HigherOrderNetwork). Default is None.
+        top_n: int
+            if set, layers with order k>1 are pruned to the top_n most frequent
+            links leaving each node (see HigherOrderNetwork). Default is None.
+        min_deviation: float
+            if set, layers with order k>1 are pruned to links leaving nodes whose
+            transition probabilities deviate from the first-order model by a total
+            variation distance of at least min_deviation (see HigherOrderNetwork).
+            Default is None.
+        mmap_dir: str
+            if set, all layers are constructed out-of-core and stored as memory-mapped
+            files in the subdirectories layer_0, layer_1, ... of the given directory
+            (see HigherOrderNetwork). The transition matrices of the model are then
+            backed by these files. Default is None.
+        max_workers: int
+            the number of worker processes used to generate multiple layers and to
+            compute likelihoods in parallel. For the default value None, layers are
+            generated sequentially unless pathpy.ENABLE_MULTICORE_SUPPORT is set, in
+            which case one worker per CPU is used, and likelihoods are computed
+            sequentially.
         """
         assert paths.max_subpath_length >= max_order, \
             'Error: Construction of multi-order model with maximum order M ' \
@@ -65,6 +370,19 @@ class MultiOrderModel:
         # the paths object from which this multi-order model was created
         self.paths = paths
 
+        # whether layers are generated in the matrix-only mode of HigherOrderNetwork
+        self.matrix_only = matrix_only
+
+        # the pruning parameters used to generate layers with order k>1
+        self.pruning = {'min_support': min_support, 'top_n': top_n,
+                        'min_deviation': min_deviation}
+
+        # the directory in which disk-backed layers are stored
+        self.mmap_dir = mmap_dir
+
+        # the number of worker processes used to generate layers
+        self.max_workers = max_workers
+
         """A dictionary containing the layers of HigherOrderNetworks, where
         # layers[k] contains the network of order k"""
         self.layers = {}
@@ -72,6 +390,16 @@ class MultiOrderModel:
         # a dictionary of transition matrices for all layers of the model
         self.transition_matrices = {}
 
+        # The maximum number of queries whose predictions are cached by predict_next
+        self.prediction_cache_size = 100000
+
+        # the LRU cache of predict_next, which is reset whenever layers are added
+        self._prediction_cache = None
+
+        # a cache of layer likelihoods and degrees of freedom, which is only active
+        # during order selection (see _cached_layer_terms)
+        self._layer_terms = None
+
         self.add_layers(max_order)
 
     @property
@@ -83,41 +411,41 @@ class MultiOrderModel:
         else:
             return max(orders)
 
-    def __add_layers_parallel(self, orders):
-        paths = self.paths
-        try:
-            import pathos as _pa
-        except ImportError:  # pragma: no cover
-            raise ImportError('Error while importing module "pathos",'
-                              'to use the parallel feature "pathos" '
-                              'needs to be installed')
+    def __add_layers_parallel(self, orders, max_workers):
+        with tempfile.TemporaryDirectory() as directory:
+            # the path statistics needed for the layers are written once to
+            # memory-mapped files that are shared by all worker processes
+            shared_paths = _write_shared_paths(self.paths, orders, directory)
 
-        def parallel(order_k):  # pragma: no cover
-            Log.add('Generating ' + str(order_k) + '-th order network layer ...')
-            p_layer = HigherOrderNetwork(paths, k=order_k, null_model=False)
+            tasks = [(k, {'matrix_only': True, 'mmap_dir': self._layer_dir(k),
+                          **(self.pruning if k > 1 else {})}) for k in orders]
+            with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context(),
+                                     initializer=_init_layer_worker,
+                                     initargs=shared_paths) as pool:
+                results = list(pool.map(_generate_layer, *zip(*tasks)))
+
+        # save results
+        for k, layer in results:
+            layer.paths = self.paths
+            if not self.matrix_only and self.mmap_dir is None:
+                layer._create_network_view()
+            self.layers[k] = layer
 
             # compute transition matrices for all layers. In order to use the
             # maximally available statistics, we always use sub paths in the
             # calculation
-            trans_mat = p_layer.transition_matrix(include_subpaths=True)
-
-            Log.add('... finished')
-            return [order_k, p_layer, trans_mat]
-
-        pool = _pa.multiprocessing.ProcessPool()
-        results = pool.map(parallel, orders)
-
-        # save results
-        for k, layer, transition_mat in results:
-            self.layers[k] = layer
-            self.transition_matrices[k] = transition_mat
+            self.transition_matrices[k] = layer.transition_matrix(include_subpaths=True)
+        Log.add('finished.')
 
     def __add_layers_sequential(self, orders):
         paths = self.paths
 
         for k in sorted(orders):
             Log.add('Generating %d-th order layer ...' % k)
-            self.layers[k] = HigherOrderNetwork(paths, k, null_model=False)
+            self.layers[k] = HigherOrderNetwork(paths, k, null_model=False,
+                                                matrix_only=self.matrix_only,
+                                                mmap_dir=self._layer_dir(k),
+                                                **(self.pruning if k > 1 else {}))
 
             # compute transition matrices for all layers. In order to use the
             # maximally available statistics, we always use sub paths in the
@@ -126,6 +454,92 @@ class MultiOrderModel:
 
         Log.add('finished.')
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_prediction_cache'] = None
+        return state
+
+    def save(self, directory):
+        """Saves the multi-order model in a binary format in the given directory, from
+        which it can be loaded with MultiOrderModel.load. The layer with order k is
+        saved in the subdirectory layer_k (see HigherOrderNetwork.save), which
+        includes its node index, link weights, transition probabilities and degrees
+        of freedom.
+
+        Parameters
+        ----------
+        directory: str
+            the directory in which the model is saved
+        """
+        os.makedirs(directory, exist_ok=True)
+        for k, layer in self.layers.items():
+            layer.save(os.path.join(directory, 'layer_%d' % k))
+
+        attributes = {'max_order': self.max_order, 'matrix_only': self.matrix_only,
+                      'pruning': self.pruning}
+        with open(os.path.join(directory, 'model.json'), 'w') as f:
+            json.dump(attributes, f)
+
+    @classmethod
+    def load(cls, directory, paths=None):
+        """Loads a multi-order model that has been saved with MultiOrderModel.save.
+        The layers and transition matrices of the model are memory-mapped (read-only)
+        from the files in the given directory, so that a model can be loaded quickly
+        and shared by multiple processes.
+
+        Parameters
+        ----------
+        directory: str
+            the directory in which the model has been saved
+        paths: Paths
+            the path statistics the model has been created from, which are used for
+            likelihood calculations and to add layers. Since path statistics are not
+            saved, the paths must otherwise be passed to these methods explicitly.
+            Default is None.
+
+        Returns
+        -------
+        MultiOrderModel
+
+        Examples
+        --------
+        >>> import tempfile
+        >>> p = Paths()
+        >>> p.add_path('a,b,c', frequency=3)
+        >>> mom = MultiOrderModel(p, max_order=2)
+        >>> with tempfile.TemporaryDirectory() as directory:
+        ...     mom.save(directory)
+        ...     loaded = MultiOrderModel.load(directory, paths=p)
+        ...     loaded.max_order, loaded.degrees_of_freedom() == mom.degrees_of_freedom()
+        (2, True)
+        """
+        with open(os.path.join(directory, 'model.json')) as f:
+            attributes = json.load(f)
+
+        model = cls.__new__(cls)
+        model.paths = paths
+        model.matrix_only = attributes['matrix_only']
+        model.pruning = attributes['pruning']
+        model.mmap_dir = None
+        model.max_workers = None
+        model.layers = {}
+        model.transition_matrices = {}
+        model.prediction_cache_size = 100000
+        model._prediction_cache = None
+        model._layer_terms = None
+        for k in range(attributes['max_order'] + 1):
+            layer = HigherOrderNetwork.load(os.path.join(directory, 'layer_%d' % k))
+            layer.paths = paths
+            model.layers[k] = layer
+            model.transition_matrices[k] = layer.transition_matrix(include_subpaths=True)
+        return model
+
+    def _layer_dir(self, k):
+        """Returns the directory of a disk-backed layer with order k, or None"""
+        if self.mmap_dir is None:
+            return None
+        return os.path.join(self.mmap_dir, 'layer_%d' % k)
+
     def add_layers(self, max_order):
         """Add higher-order layers up to the given maximum order.
 
@@ -138,6 +552,10 @@ class MultiOrderModel:
         """
         from pathpy import ENABLE_MULTICORE_SUPPORT
 
+        max_workers = self.max_workers
+        if max_workers is None and ENABLE_MULTICORE_SUPPORT:
+            max_workers = os.cpu_count()
+
         current_max_order = self.max_order if self.max_order else -1
         if max_order < 0:
             raise PathpyError("max_order must be a positive integer not %d" % max_order)
@@ -147,10 +565,148 @@ class MultiOrderModel:
 #             Log.add("Layers up to order %d already added. Nothing changed." % self.max_order)
 
         orders_to_add = list(range(current_max_order+1, max_order+1))
-        if len(orders_to_add) > 1 and ENABLE_MULTICORE_SUPPORT:
-            self.__add_layers_parallel(orders_to_add)
+        if len(orders_to_add) > 1 and max_workers is not None and max_workers > 1:
+            self.__add_layers_parallel(orders_to_add, max_workers)
         else:
             self.__add_layers_sequential(orders_to_add)
+        self._prediction_cache = None
+
+    def update(self, new_paths):
+        """Updates the model with additional path statistics, e.g. with paths that have
+        been observed after the model has been created.
+
+        The path and subpath counts of new_paths are added to the path statistics of
+        the model (i.e. to the Paths instance the model has been created from) as well
+        as to the links of all layers. If the first-order topology does not change,
+        only the transition probabilities of nodes with new observations are
+        recomputed, while the degrees of freedom remain the same. Otherwise, all layers
+        are generated again. Pruned and disk-backed layers are always generated again.
+
+        Parameters
+        ----------
+        new_paths: Paths
+            the additional path statistics, which must contain subpath statistics up
+            to the maximum order of the model
+
+        Examples
+        --------
+        >>> p = Paths()
+        >>> p.add_path('a,b,c', frequency=3)
+        >>> p.add_path('b,c,a', frequency=1)
+        >>> mom = MultiOrderModel(p, max_order=2)
+        >>> new_paths = Paths()
+        >>> new_paths.add_path('a,b,c', frequency=2)
+        >>> mom.update(new_paths)
+        >>> mom.paths.paths[2][('a', 'b', 'c')]
+        array([0., 5.])
+        """
+        assert new_paths.max_subpath_length >= self.max_order, \
+            'Error: Updating a multi-order model with maximum order M ' \
+            'requires sub path statistics up to length M'
+
+        max_order = self.max_order
+        topology_changed = self._changes_topology(new_paths)
+        self.paths += new_paths
+        self._prediction_cache = None
+
+        if topology_changed:
+            Log.add('First-order topology has changed, generating all layers ...')
+            self.layers = {}
+            self.transition_matrices = {}
+            self.add_layers(max_order)
+            return
+
+        for k in range(max_order + 1):
+            layer = self.layers[k]
+            if layer.is_pruned or layer._is_disk_backed():
+                self.__add_layers_sequential([k])
+            elif new_paths.paths.get(k):
+                nodes = layer._add_path_counts(new_paths.paths[k])
+                self.transition_matrices[k] = layer._update_transition_matrix(
+                    self.transition_matrices[k], nodes)
+
+    def _changes_topology(self, paths):
+        """Returns whether the given paths contain first-order nodes or links that do
+        not exist in the model.
+        """
+        node_map = self.layers[0].node_to_name_map()
+        if any(p[0] not in node_map for p in paths.paths.get(0, {})):
+            return True
+        if self.max_order == 0 or not paths.paths.get(1):
+            return False
+
+        g1 = self.layers[1]
+        node_map = g1.node_to_name_map()
+        if any(v not in node_map for p in paths.paths[1] for v in p):
+            return True
+        A = g1.adjacency_matrix(include_subpaths=True, weighted=False)
+        sources = [node_map[v] for v, _ in paths.paths[1]]
+        targets = [node_map[w] for _, w in paths.paths[1]]
+        return not (np.asarray(A[sources, targets]).ravel() > 0).all()
+
+    def predict_next(self, prefix, top_k=1):
+        """Predicts the most likely next nodes following a sequence of first-order
+        nodes. The prediction is based on the layer with the highest order that
+        (i) does not exceed the length of the prefix and (ii) contains the
+        higher-order node given by the end of the prefix with at least one successor.
+        If no such layer exists, the prediction backs off to lower orders down to the
+        zero-order layer.
+
+        Predictions are kept in an LRU cache of size prediction_cache_size.
+
+        Parameters
+        ----------
+        prefix: tuple
+            the sequence of first-order nodes that precede the prediction
+        top_k: int
+            the (maximum) number of predicted nodes (default 1)
+
+        Returns
+        -------
+        list
+            a list of at most top_k tuples (node, probability) of first-order nodes
+            sorted by decreasing probability
+
+        Examples
+        --------
+        >>> p = Paths()
+        >>> p.add_path('a,b,c', frequency=3)
+        >>> p.add_path('x,b,d', frequency=1)
+        >>> mom = MultiOrderModel(p, max_order=2)
+        >>> mom.predict_next(('a', 'b'))
+        [('c', 1.0)]
+        >>> mom.predict_next(('b',), top_k=2)
+        [('c', 0.75), ('d', 0.25)]
+        """
+        if self._prediction_cache is None:
+            self._prediction_cache = lru_cache(maxsize=self.prediction_cache_size)(
+                self._predict_next)
+        prefix = tuple(prefix[max(len(prefix) - self.max_order, 0):])
+        return self._prediction_cache(prefix, top_k)
+
+    def predict_next_batch(self, prefixes, top_k=1):
+        """Predicts the most likely next nodes for multiple prefixes.
+
+        Parameters
+        ----------
+        prefixes: iterable
+            the sequences of first-order nodes for which to predict the next nodes
+        top_k: int
+            the (maximum) number of predicted nodes per prefix (default 1)
+
+        Returns
+        -------
+        list
+            a list that contains the result of predict_next for each prefix
+        """
+        return [self.predict_next(prefix, top_k) for prefix in prefixes]
+
+    def _predict_next(self, prefix, top_k):
+        for k in range(len(prefix), -1, -1):
+            prediction = self.layers[k].predict_next(prefix, top_k)
+            if prediction:
+                return prediction
+        return []
 
     def summary(self):
         """
@@ -187,96 +743,92 @@ class MultiOrderModel:
         """Saves the multi-order model in state file format suitable to be used with
          InfoMap
 
+        The vertices, states and links of a layer are written in bulk from the node
+        indices and the (sparse) transition matrix of the layer. If the filename ends
+        with .gz, .bz2 or .xz, the state file is compressed accordingly.
+
         Parameters
         ----------
         filename
         layer: int
-            if none, all layers will be export. If set to k, only the k-th layer of the
-            model will be exported.
+            if none, all layers with order k>0 will be exported, where the state ids
+            of each layer follow those of the previous layer. If set to k, only the
+            k-th layer of the model will be exported.
         infomap_indexing: dict
             if none, standard pathpy indices will be used in the export of state files.
             This can be set to a custom index dictionary in which infomap_indexing[k]
             contains a dictionary that maps k-th order nodes to a custom node index.
             This is useful to create state files with consistent indices from multiple
-            MultiOrderModels
+            MultiOrderModels. If all layers are exported, the indices of all layers
+            must be distinct.
 
         Returns
         -------
 
         """
-        assert layer, 'Export of all layers is currently not supported'
+        if layer is None:
+            layers = list(range(1, self.max_order + 1))
+        else:
+            layers = [layer]
+        assert layers and min(layers) > 0, \
+            'Error: the zero-order layer cannot be exported as a state network'
 
-        name_map = self.layers[layer].node_to_name_map()
         first_layer_map = self.layers[1].node_to_name_map()
-
-        trans_mat = self.layers[layer].transition_matrix()
-
-        file = open(filename, 'w')
-
-        file.write('# this file was generated by pathpy\n')
-
-        # Note: InfoMap requires consecutive indexing of nodes!
         if infomap_indexing:
-            file.write('*Vertices {0}\n'.format(len(infomap_indexing[1])))
-            # sort indices
-            reverse_index = {}
-            for name, node_idx in infomap_indexing[1].items():
-                reverse_index[node_idx] = name
-            sorted_indices = list(reverse_index.keys())
-            for node_idx in sorted_indices:
-                file.write('{0} "{1}"\n'.format(node_idx, reverse_index[node_idx]))
+            vertices = sorted((idx, v) for v, idx in infomap_indexing[1].items())
         else:
-            file.write('*Vertices {0}\n'.format(self.layers[1].ncount()))
-            for i in self.layers[1].nodes:
-                idx = first_layer_map[i]
-
-                file.write('{0} "{1}"\n'.format(idx, i))
-
-        # Write higher-order nodes to states section
-        file.write('*States {0}\n'.format(self.layers[layer].ncount()))
-        for v in self.layers[layer].nodes:
-            if infomap_indexing:
-                v_ix = infomap_indexing[layer][v]
-            else:
-                v_ix = name_map[v]
-            v_path = self.layers[layer].higher_order_node_to_path(v)
-
-            # each line contains uniqueID physicalID [name]
+            vertices = sorted((idx, v) for v, idx in first_layer_map.items())
+
+        states = []
+        links = []
+        offset = 0
+        for k in layers:
+            name_map = self.layers[k].node_to_name_map()
+            names = [None] * len(name_map)
+            for v, idx in name_map.items():
+                names[idx] = v
+
+            # each state is mapped to the physical node at the end of its path
+            separator = self.layers[k].separator
+            physical = [v.rsplit(separator, 1)[-1] for v in names]
             if infomap_indexing:
-                file.write(
-                    '{0} {1} "{2}"\n'.format(v_ix, infomap_indexing[1][v_path[-1]], v))
+                state_ids = np.array([infomap_indexing[k][v] for v in names], dtype=np.int64)
+                physical_ids = [infomap_indexing[1][v] for v in physical]
             else:
-                file.write(
-                    '{0} {1} "{2}"\n'.format(v_ix, first_layer_map[v_path[-1]], v))
-
-        file.write('*Links {0}\n'.format(self.layers[layer].ecount()))
-        for e in self.layers[layer].edges:
-            source = e[0]
-            target = e[1]
-
-            # Get source and target paths
-            # source_p = self.layers[layer].higher_order_node_to_path(source)
-            # source_t = self.layers[layer].higher_order_node_to_path(target)
+                state_ids = np.arange(offset, offset + len(names), dtype=np.int64)
+                physical_ids = [first_layer_map[v] for v in physical]
+                offset += len(names)
+            states.append((state_ids.tolist(), physical_ids, names))
+
+            # the links of the layer are the non-zero entries of the (transposed)
+            # transition matrix, sorted by source and target
+            T = self.transition_matrices[k].tocoo()
+            order = np.lexsort((T.row, T.col))
+            links.append((state_ids[T.col[order]], state_ids[T.row[order]],
+                          T.data[order]))
+
+        with open_file(filename, 'w') as file:
+            file.write('# this file was generated by pathpy\n')
+
+            # Note: InfoMap requires consecutive indexing of nodes!
+            file.write('*Vertices {0}\n'.format(len(vertices)))
+            file.writelines('{0} "{1}"\n'.format(idx, v) for idx, v in vertices)
+
+            # Write higher-order nodes to states section, where each line contains
+            # uniqueID physicalID [name]
+            file.write('*States {0}\n'.format(sum(len(names) for _, _, names in states)))
+            for state_ids, physical_ids, names in states:
+                file.writelines('{0} {1} "{2}"\n'.format(*state)
+                                for state in zip(state_ids, physical_ids, names))
 
-            source_ix = name_map[source]
-            target_ix = name_map[target]
-
-            # Get edge weight
-            # w_st = self.layers[layer].edges[e][1]
-
-            # Get transition probability
-            trans_prop = trans_mat[target_ix, source_ix]
-
-            # Write entry to file
             # each line contains from to [weight]
-            if infomap_indexing:
-                idx_s = infomap_indexing[layer][source]
-                idx_t = infomap_indexing[layer][target]
-                file.write('{} {} {}\n'.format(idx_s, idx_t, trans_prop))
-            else:
-                file.write('{} {} {}\n'.format(source_ix, target_ix, trans_prop))
-
-        file.close()
+            file.write('*Links {0}\n'.format(sum(len(data) for _, _, data in links)))
+            for sources, targets, data in links:
+                for i in range(0, len(data), 100000):
+                    chunk = slice(i, i + 100000)
+                    file.writelines('{} {} {}\n'.format(*link) for link in zip(
+                        sources[chunk].tolist(), targets[chunk].tolist(),
+                        data[chunk].tolist()))
 
     def __str__(self):
         """
@@ -290,6 +842,10 @@ class MultiOrderModel:
         network model up to a maximum order max_order based on all
         path statistics.
 
+        If the model has been created with max_workers > 1, the paths are sharded
+        across max_workers worker processes. The result is identical to the
+        sequential computation.
+
         Parameters
         ----------
         paths:
@@ -313,14 +869,27 @@ class MultiOrderModel:
         # assuming that paths are independent
         likelihood = np.float64(0)
 
-        for k in range(0, max_order + 1):
-            if k < max_order:
-                p = self.layer_likelihood(paths, k, consider_longer_paths=False, log=True)[0]
-            else:
-                p = self.layer_likelihood(paths, k, consider_longer_paths=True, log=True)[0]
-            # print('Log L(k=' + str(k) + ') = ' + str(p))
-            assert p <= 0, 'Layer Log-Likelihood out of bounds'
-            likelihood += p
+        with self._cached_layer_terms():
+            if self.max_workers is not None and self.max_workers > 1:
+                # compute the likelihoods of all layers for the paths of all lengths in
+                # parallel, so that the layer likelihoods below are taken from the cache
+                if paths is None:
+                    paths = self.paths
+                max_len = max(paths.paths)
+                terms = [(k, k) for k in range(max_order)]
+                terms += [(max_order, l) for l in range(max_order, max_len + 1)]
+                self._parallel_layer_terms(paths, terms)
+
+            for k in range(0, max_order + 1):
+                if k < max_order:
+                    p = self.layer_likelihood(paths, k, consider_longer_paths=False,
+                                              log=True)[0]
+                else:
+                    p = self.layer_likelihood(paths, k, consider_longer_paths=True,
+                                              log=True)[0]
+                # print('Log L(k=' + str(k) + ') = ' + str(p))
+                assert p <= 0, 'Layer Log-Likelihood out of bounds'
+                likelihood += p
         assert likelihood <= 0, 'Log-Likelihood out of bounds'
 
         return likelihood if log else np.exp(likelihood)
@@ -414,23 +983,39 @@ class MultiOrderModel:
         # the probability of observing all paths in S_k based on the probabilities of
         # individual paths (which are calculated using the underlying Markov model(s))
 
+        # encode all longest paths up to the maximum path length maxL as arrays of
+        # integer node ids, with one array per path length. During order selection, all
+        # paths are encoded once and the likelihood of each layer is cached for each
+        # path length (see _cached_layer_terms).
+        cache = self._layer_terms
+        if cache is None:
+            encoded, names = self._encode_paths(paths, min_path_length, maxL)
+        else:
+            if ('paths', id(paths)) not in cache:
+                cache['paths', id(paths)] = self._encode_paths(paths, 0, max_len_obs)
+            encoded, names = cache['paths', id(paths)]
+
         # n is the total number of path observations
         n = 0
 
         # Initialize likelihood
         likelihood = 0
 
-        # compute likelihood for all longest paths
-        # up to the maximum path length maxL
         for k in range(min_path_length, maxL + 1):
-            for p in paths.paths[k]:
-                # Only consider observations as *longest* path
-                freq = paths.paths[k][p][1]
-                if freq > 0:
-                    n += freq  # Add m_i observations of path p to total number of observations n
-                    likelihood += self.path_likelihood(p, freq, l, log=True, index_maps=indexmaps)
-            if n == 0:
-                likelihood = 0
+            if k not in encoded:
+                continue
+            X, freqs = encoded[k]
+            n += freqs.sum()
+            key = ('likelihood', id(paths), l, k)
+            if cache is not None and key in cache:
+                log_L = cache[key]
+            else:
+                log_L = np.dot(self._path_log_likelihoods(X, names, l, indexmaps), freqs)
+                if cache is not None:
+                    cache[key] = log_L
+            likelihood += log_L
+        if n == 0:
+            likelihood = 0
         if log:
             assert likelihood <= 0, 'Log-Likelihood out of bounds'
             return likelihood, n
@@ -438,6 +1023,138 @@ class MultiOrderModel:
             assert 0 <= likelihood <= 1, 'Likelihood out of bounds'
             return np.exp(likelihood), n
 
+    @staticmethod
+    def _encode_paths(paths, min_length, max_length):
+        """Encodes all paths that have been observed as longest paths with a length
+        between min_length and max_length as integer arrays.
+
+        Returns
+        -------
+        tuple
+            a tuple (encoded, names), where encoded maps each path length L to a tuple
+            (X, freqs) such that the rows of the array X with shape (n, L+1) contain
+            the ids of the nodes on n paths, which have been observed freqs times.
+            names[i] is the name of the node with id i.
+        """
+        node_ids = {}
+        encoded = {}
+        for L in range(min_length, max_length + 1):
+            ids = []
+            freqs = []
+            for p, weight in paths.paths[L].items():
+                if weight[1] > 0:
+                    ids.extend(node_ids.setdefault(v, len(node_ids)) for v in p)
+                    freqs.append(weight[1])
+            if freqs:
+                X = np.array(ids, dtype=np.int64).reshape(len(freqs), L + 1)
+                encoded[L] = X, np.array(freqs, dtype=float)
+        return encoded, list(node_ids)
+
+    def _path_log_likelihoods(self, X, names, layer, index_maps, smoothing=0.0,
+                              num_nodes=None, prefix=None):
+        """Computes the log-likelihoods of single observations of the paths encoded in
+        the rows of X (see _encode_paths) based on the layers up to the given layer.
+        If smoothing > 0, the transition probabilities are interpolated with a uniform
+        distribution over num_nodes nodes (see _log_probabilities). If given, prefix
+        contains the log-likelihoods of the first layer nodes of all paths based on
+        the layers with lower order, i.e. the result for X[:, :layer] and layer-1, so
+        that only the given layer is needed.
+
+        Returns
+        -------
+        numpy.ndarray
+        """
+        L = X.shape[1] - 1
+        try:
+            # transitions of all paths in the model of order layer, where a zero-order
+            # model generates all nodes of the path
+            if layer == 0:
+                log_L = self._log_probabilities(X, names, 0, L + 1, index_maps,
+                                                smoothing, num_nodes).sum(axis=1)
+            else:
+                log_L = self._log_probabilities(X, names, layer, L + 1 - layer, index_maps,
+                                                smoothing, num_nodes).sum(axis=1)
+
+                # transitions for the prefix of all paths in models of orders k_<layer
+                if prefix is not None:
+                    log_L += prefix
+                else:
+                    for k_ in range(layer):
+                        log_L += self._log_probabilities(X, names, k_, 1, index_maps,
+                                                         smoothing, num_nodes)[:, 0]
+        except KeyError as e:
+            msg = ("The path segment '({})' has not been observed and therefore the "
+                   "likelihood cannot be computed.").format(e.args[0])
+            raise PathpyNotImplemented(msg)
+        return log_L
+
+    def _log_probabilities(self, X, names, k, m, index_maps, smoothing=0.0,
+                           num_nodes=None):
+        """Returns an array with shape (n, m) which contains the log-probabilities of
+        the first m transitions of the n paths encoded in X in the k-th order layer.
+        For k>0, the i-th transition leads from the k-th order node given by the
+        nodes X[:, i:i+k] to the one given by X[:, i+1:i+k+1]. For k=0, the i-th
+        transition leads from the 'start' node to node X[:, i].
+
+        If smoothing > 0, each probability p is replaced by
+        (1 - smoothing) * p + smoothing / num_nodes, where transitions from or to
+        nodes that do not exist in the model have probability p = 0. Otherwise, such
+        transitions raise a KeyError.
+        """
+        layer = self.layers[k]
+        node_map = index_maps[k]
+        n = X.shape[0]
+
+        def node_indices(windows):
+            # look up the layer index of all unique sequences of k nodes
+            unique, inverse = np.unique(windows, axis=0, return_inverse=True)
+            unique_names = (layer.separator.join(names[v] for v in row) for row in unique)
+            if layer.is_pruned or smoothing:
+                idx = [node_map.get(v, -1) for v in unique_names]
+            else:
+                idx = [node_map[v] for v in unique_names]
+            return np.array(idx, dtype=int)[inverse.ravel()]
+
+        if k == 0:
+            sources = np.full(n * m, node_map['start'])
+            targets = node_indices(X[:, :m].reshape(-1, 1))
+        else:
+            windows = np.lib.stride_tricks.sliding_window_view(X[:, :m + k], k, axis=1)
+            idx = node_indices(windows.reshape(-1, k)).reshape(n, m + 1)
+            sources, targets = idx[:, :-1].ravel(), idx[:, 1:].ravel()
+
+        def last_nodes():
+            g1_map = layer._backoff_node_mapping
+            g1_ids = np.array([g1_map.get(v, -1) for v in names])
+            last_sources = g1_ids[X[:, k - 1:m + k - 1]].ravel()
+            last_targets = g1_ids[X[:, k:m + k]].ravel()
+            if not smoothing:
+                missing = np.concatenate([X[:, k - 1:m + k - 1].ravel()[last_sources < 0],
+                                          X[:, k:m + k].ravel()[last_targets < 0]])
+                if len(missing) > 0:
+                    raise KeyError(names[missing[0]])
+            return last_sources, last_targets
+
+        T = self.transition_matrices[k]
+        if not smoothing:
+            probs = layer._gather_probabilities(sources, targets, T, last_nodes)
+            return np.log(probs).reshape(n, m)
+
+        # only transitions between nodes that exist in the layer (or, for pruned
+        # layers, in the first-order model used for back-off) have a probability > 0
+        if layer.is_pruned:
+            last_sources, last_targets = last_nodes()
+            known = (last_sources >= 0) & (last_targets >= 0)
+        else:
+            known = (sources >= 0) & (targets >= 0)
+        probs = np.zeros(len(sources))
+        if known.any():
+            probs[known] = layer._gather_probabilities(
+                sources[known], targets[known], T,
+                lambda: (last_sources[known], last_targets[known]))
+        probs = (1.0 - smoothing) * probs + smoothing / num_nodes
+        return np.log(probs).reshape(n, m)
+
     def path_likelihood(self, path, freq=1, layer=1, log=True, index_maps=None):
         """Computes the model likelihood given a single path.
 
@@ -490,45 +1207,15 @@ observed and therefore the likelihood cannot be computed.
         if index_maps is None:
             index_maps = {k: self.layers[k].node_to_name_map() for k in range(0, layer+1)}
 
-        likelihood = 0
         # special case: to calculate the likelihood of the path based on a
         # zero-order model we use the 'start' -> v transitions in the
         # respective model instance
         if layer == 0:
-            try:
-                for s in range(len(path)):
-                    source = index_maps[0]['start']
-                    target = index_maps[0][path[s]]
-                    likelihood += np.log(self.transition_matrices[0][target, source]) * freq
-            except KeyError as e:
-                msg = ("The path segment '({})' has not been observed and therefore the "
-                       "likelihood cannot be computed.").format(e.args[0])
-                raise PathpyNotImplemented(msg)
+            segments = {0: [(v,) for v in path]}
 
         # general case: compute likelihood of path based on hierarchy of higher-order models
         else:
-            # 1.) transform the path into a sequence of (two or more) l-th-order nodes
-            nodes = self.layers[layer].path_to_higher_order_nodes(path)
-            # print('l-th order path = ', str(nodes))
-
-            # 2.) nodes[0] is the prefix of the k-th order transitions,  which we can transform
-            # into multiple transitions in lower order models. Example: for a path a-b-c-d of
-            # length three, the node sequence at order l=3 is ['a-b-c', 'b-c-d'] and thus the
-            # prefix is 'a-b-c'.
-            prefix = nodes[0]
-
-            # 3.) We extract the transitions for the prefix based on models of orders k_<l. In
-            # our example, we have the transitions ... (a-b, b-c) for k_=2 (a, b) for k_=1,
-            # and (start, a) for k_=0
-            transitions = {}
-
-            # for all k_<l in descending order
-            for k_ in range(layer - 1, -1, -1):
-                x = prefix.split(self.layers[k_].separator)
-                transitions[k_] = self.layers[k_].path_to_higher_order_nodes(x)
-                prefix = transitions[k_][0]
-
-            # 4.) Using Bayes theorem, we calculate the likelihood of a path a-b-c-d-e of length
+            # Using Bayes theorem, we calculate the likelihood of a path a-b-c-d-e of length
             # four for l=4 as a single transition in a fourth-order model, and four additional
             # transitions in the k_=0, 1, 2 and 3-order models, i.e. we have ... P(a-b-c-d-e) =
             # P(e|a-b-c-d) * [ P(d|a-b-c) * P(c|a-b) * P(b|a) * P(a) ] If we were to model the
@@ -537,24 +1224,23 @@ observed and therefore the likelihood cannot be computed.
             # k_=0 and k_=1 order models for the prefix 'a-b' ... P(a-b-c-d-e) = P(e|c-d) * P(
             # d|b-c) * P(c|a-b) * [ P(b|a) * P(a) ]
 
-            # First multiply the transitions in the l-th order model ...
-            transition_matrix = self.transition_matrices[layer]
-            try:
-                for s in range(len(nodes)-1):
-                    idx_s1 = index_maps[layer][nodes[s + 1]]
-                    idx_s0 = index_maps[layer][nodes[s]]
-                    trans_mat = transition_matrix[idx_s1, idx_s0]
-                    likelihood += np.log(trans_mat) * freq
-                # ... then multiply additional transition probabilities for the prefix ...
-                for k_ in range(layer):
-                    trans_idx0 = index_maps[k_][transitions[k_][0]]
-                    trans_idx1 = index_maps[k_][transitions[k_][1]]
-                    trans_mat = self.transition_matrices[k_]
-                    likelihood += np.log(trans_mat[trans_idx1, trans_idx0]) * freq
-            except KeyError as e:
-                msg = ("The path segment '({})' has not been observed and therefore the "
-                       "likelihood cannot be computed.").format(e.args[0])
-                raise PathpyNotImplemented(msg)
+            # The transitions of the path in the l-th order model, and the transitions of
+            # the prefix in models of orders k_<l. In our example, the prefix of a-b-c-d at
+            # order l=3 is a-b-c, which we transform into the transitions (a-b, b-c) for
+            # k_=2, (a, b) for k_=1 and (start, a) for k_=0.
+            segments = {k_: [path[:k_ + 1]] for k_ in range(layer)}
+            segments[layer] = [path]
+
+        likelihood = 0
+        try:
+            for k_, segment in segments.items():
+                probs, _ = self.layers[k_]._transition_probabilities(
+                    segment, node_map=index_maps[k_], T=self.transition_matrices[k_])
+                likelihood += np.log(probs).sum() * freq
+        except KeyError as e:
+            msg = ("The path segment '({})' has not been observed and therefore the "
+                   "likelihood cannot be computed.").format(e.args[0])
+            raise PathpyNotImplemented(msg)
 
         if log:
             return likelihood
@@ -593,7 +1279,13 @@ observed and therefore the likelihood cannot be computed.
 
         # Sum degrees of freedom of all model layers up to max_order
         for i in range(0, max_order + 1):
-            dof += self.layers[i].degrees_of_freedom(assumption)
+            key = ('dof', i, assumption)
+            if self._layer_terms is None:
+                dof += self.layers[i].degrees_of_freedom(assumption)
+            else:
+                if key not in self._layer_terms:
+                    self._layer_terms[key] = self.layers[i].degrees_of_freedom(assumption)
+                dof += self._layer_terms[key]
 
         return int(dof)
 
@@ -612,6 +1304,209 @@ observed and therefore the likelihood cannot be computed.
             size += self.layers[i].model_size()
         return int(size)
 
+    def _parallel_layer_terms(self, paths, terms):
+        """Computes the likelihoods of the given terms (l, L), i.e. of the paths with
+        length L based on the layers up to order l, in parallel and stores them in the
+        cache of layer terms. The paths of each length are sharded by a hash of their
+        nodes, and each worker process computes the log-likelihoods of all paths in a
+        shard, which are combined exactly as in the sequential computation.
+        """
+        cache = self._layer_terms
+        if ('paths', id(paths)) not in cache:
+            cache['paths', id(paths)] = self._encode_paths(paths, 0, max(paths.paths))
+        encoded, names = cache['paths', id(paths)]
+
+        layers = defaultdict(list)
+        for l, L in terms:
+            if L in encoded and ('likelihood', id(paths), l, L) not in cache:
+                layers[L].append(l)
+        if not layers:
+            return
+
+        n_shards = self.max_workers
+        shards = []
+        for L, orders in layers.items():
+            X = encoded[L][0]
+            multipliers = _SHARD_HASH[np.arange(X.shape[1]) % len(_SHARD_HASH)]
+            shard = (X * multipliers).sum(axis=1) % n_shards
+            for i in range(n_shards):
+                rows = np.flatnonzero(shard == i)
+                if len(rows) > 0:
+                    shards.append((L, rows, orders))
+
+        # the transition matrices and node indices of all layers are shared with the
+        # worker processes, which are forked (if possible) so that they do not need to
+        # be copied
+        model = MultiOrderModel.__new__(MultiOrderModel)
+        model.layers = {}
+        for k, layer in self.layers.items():
+            model.layers[k] = copy.copy(layer)
+            model.layers[k].paths = None
+        model.transition_matrices = self.transition_matrices
+        index_maps = {k: layer.node_to_name_map() for k, layer in self.layers.items()}
+
+        with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=mp_context(),
+                                 initializer=_init_likelihood_worker,
+                                 initargs=(model, names, index_maps)) as pool:
+            results = pool.map(_shard_log_likelihoods,
+                               [encoded[L][0][rows] for L, rows, _ in shards],
+                               [orders for _, _, orders in shards])
+
+            log_L = {(l, L): np.empty(len(encoded[L][1]))
+                     for L, orders in layers.items() for l in orders}
+            for (L, rows, _), shard_log_L in zip(shards, results):
+                for l, values in shard_log_L.items():
+                    log_L[l, L][rows] = values
+
+        for (l, L), values in log_L.items():
+            cache['likelihood', id(paths), l, L] = np.dot(values, encoded[L][1])
+
+    def _smoothed_likelihoods(self, paths, smoothing, num_nodes):
+        """Returns an array with the log-likelihoods of the given paths in the models
+        with maximum order 0, 1, ..., max_order, where transition probabilities are
+        smoothed (see _log_probabilities), so that paths with transitions that have not
+        been observed in the path statistics of the model have a likelihood > 0.
+        """
+        encoded, names = self._encode_paths(paths, 0, max(paths.paths))
+        index_maps = {k: layer.node_to_name_map() for k, layer in self.layers.items()}
+
+        terms = {}
+
+        def layer_term(l, L):
+            # log-likelihood of the paths of length L based on the layers up to order l
+            if (l, L) not in terms:
+                X, freqs = encoded[L]
+                terms[l, L] = np.dot(self._path_log_likelihoods(
+                    X, names, l, index_maps, smoothing, num_nodes), freqs)
+            return terms[l, L]
+
+        likelihoods = np.zeros(self.max_order + 1)
+        for k in range(self.max_order + 1):
+            likelihoods[k] = sum(layer_term(l, l) for l in range(k) if l in encoded)
+            likelihoods[k] += sum(layer_term(k, L) for L in encoded if L >= k)
+        return likelihoods
+
+    def cross_validate(self, folds=5, test_size=None, smoothing=0.01, seed=None,
+                       max_workers=None):
+        """Evaluates the models with maximum order 0, 1, ..., max_order based on the
+        likelihood of held-out paths.
+
+        The longest paths the model has been created from are randomly partitioned into
+        the given number of folds, where the observations of paths with frequency > 1
+        are split between folds. For each fold, a multi-order model is fitted to all
+        other folds and the log-likelihood of the paths in the held-out fold is
+        computed for all orders. To assign a non-zero probability to transitions that
+        have not been observed in the training data, transition probabilities p are
+        smoothed as (1 - smoothing) * p + smoothing / n, where n is the number of
+        nodes. The models of all folds are fitted in parallel worker processes.
+
+        If the random partitioning leaves no path of length k in the training data of
+        a fold, models with maximum order >= k cannot be fitted, and their held-out
+        log-likelihood in this fold is nan.
+
+        Parameters
+        ----------
+        folds: int
+            the number of folds of the k-fold cross-validation. Default is 5.
+        test_size: float
+            if set, a single model is fitted to a random train set and evaluated on a
+            test set that contains the given fraction of all path observations, instead
+            of a k-fold cross-validation. Default is None.
+        smoothing: float
+            the weight of the uniform distribution with which transition probabilities
+            are smoothed, which must be in (0, 1). Default is 0.01.
+        seed: int
+            the seed of the random partitioning. Default is None.
+        max_workers: int
+            the number of worker processes, which defaults to the max_workers of the
+            model (see MultiOrderModel). If no workers are configured, folds are
+            evaluated sequentially.
+
+        Returns
+        -------
+        dict
+            a dictionary that maps each order k to an array with the held-out
+            log-likelihoods of the model with maximum order k in all folds (which are
+            nan for folds whose training paths are shorter than k)
+
+        Examples
+        --------
+        >>> p = Paths()
+        >>> p.add_path('a,c,d', frequency=10)
+        >>> p.add_path('b,c,e', frequency=10)
+        >>> mom = MultiOrderModel(p, max_order=2)
+        >>> results = mom.cross_validate(folds=2, seed=0)
+        >>> max(results, key=lambda k: results[k].mean())
+        2
+        """
+        from pathpy import ENABLE_MULTICORE_SUPPORT
+
+        assert 0 < smoothing < 1, 'Error: smoothing must be in (0, 1)'
+        if test_size is None:
+            assert folds > 1, 'Error: cross-validation requires at least two folds'
+            probabilities = np.full(folds, 1.0 / folds)
+            test_folds = range(folds)
+        else:
+            assert 0 < test_size < 1, 'Error: test_size must be in (0, 1)'
+            probabilities = np.array([1.0 - test_size, test_size])
+            test_folds = [1]
+
+        if max_workers is None:
+            max_workers = self.max_workers
+        if max_workers is None and ENABLE_MULTICORE_SUPPORT:
+            max_workers = os.cpu_count()
+
+        # split the observations of all longest paths between folds, where the
+        # fractional part of non-integer frequencies is assigned to a single fold
+        paths = []
+        frequencies = []
+        for l in self.paths.paths:
+            for p, weight in self.paths.paths[l].items():
+                if weight[1] > 0:
+                    paths.append(p)
+                    frequencies.append(weight[1])
+        frequencies = np.array(frequencies, dtype=float)
+        rng = np.random.default_rng(seed)
+        integral = np.floor(frequencies)
+        counts = rng.multinomial(integral.astype(np.int64), probabilities).astype(float)
+        fraction = rng.choice(len(probabilities), size=len(paths), p=probabilities)
+        counts[np.arange(len(paths)), fraction] += frequencies - integral
+
+        # the number of nodes of the uniform distribution used for smoothing
+        num_nodes = len(self.layers[0].node_to_name_map()) - 1
+        shared_folds = (paths, counts, self.paths.separator, self.max_order,
+                        self.pruning, smoothing, num_nodes)
+
+        if max_workers is not None and max_workers > 1:
+            with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context(),
+                                     initializer=_init_fold_worker,
+                                     initargs=shared_folds) as pool:
+                results = list(pool.map(_fit_fold, test_folds))
+        else:
+            results = [_evaluate_fold(shared_folds, i) for i in test_folds]
+
+        results = np.array(results)
+        for k in range(self.max_order + 1):
+            Log.add('Held-out log-likelihood (k=%d) = %f' % (k, np.nanmean(results[:, k])),
+                    Severity.INFO)
+        return {k: results[:, k] for k in range(self.max_order + 1)}
+
+    @contextmanager
+    def _cached_layer_terms(self):
+        """Context manager that caches the encoded paths as well as the likelihoods and
+        degrees of freedom of layers per paths instance, layer and path length. The cache
+        is dropped when leaving the outermost context, so that later changes of path
+        statistics are taken into account.
+        """
+        if self._layer_terms is not None:
+            yield
+            return
+        self._layer_terms = {}
+        try:
+            yield
+        finally:
+            self._layer_terms = None
+
     def likelihood_ratio_test(self, paths=None, max_order_null=0, max_order=1,
                               assumption='paths', significance_threshold=0.01):
         """
@@ -656,16 +1551,106 @@ observed and therefore the likelihood cannot be computed.
         # let L0 be the likelihood for the null model and L1 be the likelihood for the
         # alternative model
 
-        # we first compute a test statistic x = -2 * log (L0/L1) = -2 * (log L0 - log L1)
-        x = -2 * (self.likelihood(paths, max_order=max_order_null, log=True) -
-                  self.likelihood(paths, max_order=max_order, log=True))
+        with self._cached_layer_terms():
+            # we first compute a test statistic x = -2 * log (L0/L1) = -2 * (log L0 - log L1)
+            x = -2 * (self.likelihood(paths, max_order=max_order_null, log=True) -
+                      self.likelihood(paths, max_order=max_order, log=True))
 
-        # we calculate the additional degrees of freedom in the alternative model
-        dof_diff = (
-            self.degrees_of_freedom(max_order=max_order, assumption=assumption) -
-            self.degrees_of_freedom(max_order=max_order_null, assumption=assumption)
-        )
+            # we calculate the additional degrees of freedom in the alternative model
+            dof_diff = (
+                self.degrees_of_freedom(max_order=max_order, assumption=assumption) -
+                self.degrees_of_freedom(max_order=max_order_null, assumption=assumption)
+            )
+
+        return self._chi2_test(x, dof_diff, max_order, significance_threshold)
+
+    def _likelihood_ratio_statistic(self, paths, max_order_null, max_order):
+        """Returns the test statistic -2 * (log L0 - log L1) of a likelihood ratio
+        test between the models with the given maximum orders.
+        """
+        with self._cached_layer_terms():
+            return -2 * (self.likelihood(paths, max_order=max_order_null, log=True) -
+                         self.likelihood(paths, max_order=max_order, log=True))
+
+    def resampling_test(self, max_order_null=1, max_order=2, method='bootstrap',
+                        samples=100, significance_threshold=0.01, seed=None,
+                        max_workers=None):
+        """Performs a resampling-based likelihood ratio test between two multi-order
+        models with given maximum orders, which does not rely on the asymptotic
+        chi-squared distribution of the test statistic used in likelihood_ratio_test.
+
+        The test statistic of the observed paths the model has been created from is
+        compared to the statistics of random path samples that are consistent with
+        the null hypothesis. For each sample, a multi-order model is fitted and its
+        test statistic is computed in a worker process, where each sample has its own
+        random stream spawned from the given seed, so that results are reproducible
+        independently of the number of workers.
+
+        Parameters
+        ----------
+        max_order_null: int
+            maximum order of the multi-order model to be used as a null hypothesis
+        max_order: int
+            maximum order of the multi-order model to be used as alternative hypothesis
+        method: str
+            'bootstrap' to generate samples with the observed path lengths based on the
+            layers of the null model, or 'permutation' to shuffle the observed paths by
+            exchanging path continuations after identical sequences of max_order_null
+            nodes. Default is 'bootstrap'.
+        samples: int
+            the number of random path samples. Default is 100.
+        significance_threshold: float
+            the threshold for the p-value below which to accept the alternative hypothesis
+        seed: int
+            the seed of the random path samples. Default is None.
+        max_workers: int
+            the number of worker processes, which defaults to the max_workers of the
+            model (see MultiOrderModel). If no workers are configured, samples are
+            evaluated sequentially.
+
+        Returns
+        -------
+        tuple
+            a tuple of the format (reject, p) which captures whether or not the null
+            hypothesis is rejected in favor of the alternative hypothesis, as well as
+            the empirical p-value, i.e. the fraction of samples (counting the observed
+            paths) whose test statistic is at least as large as the observed one
+        """
+        from pathpy import ENABLE_MULTICORE_SUPPORT
+
+        assert max_order_null < max_order, \
+            'Error: order of null hypothesis must be smaller than order of ' \
+            'alternative hypothesis'
+        if max_workers is None:
+            max_workers = self.max_workers
+        if max_workers is None and ENABLE_MULTICORE_SUPPORT:
+            max_workers = os.cpu_count()
+
+        self.add_layers(max_order)
+        x = self._likelihood_ratio_statistic(None, max_order_null, max_order)
+
+        sampler = (_PathSampler(self, max_order_null, method), max_order, self.pruning)
+        seeds = np.random.SeedSequence(seed).spawn(samples)
+        if max_workers is not None and max_workers > 1:
+            with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context(),
+                                     initializer=_init_resampling_worker,
+                                     initargs=sampler) as pool:
+                statistics = np.array(list(pool.map(_resampled_statistic, seeds)))
+        else:
+            statistics = np.array([_sample_and_evaluate(sampler, s) for s in seeds])
+
+        p = (1 + np.sum(statistics >= x)) / (samples + 1)
+        Log.add('Resampling test for K_opt = ' + str(max_order) + ', x = ' + str(x))
+        Log.add('Resampling test, mean x of %d samples = %f' % (samples, statistics.mean()))
+        Log.add('Resampling test, p = ' + str(p))
+        return (p < significance_threshold), p
 
+    @staticmethod
+    def _chi2_test(x, dof_diff, max_order, significance_threshold):
+        """Returns whether the null hypothesis of a likelihood ratio test with test
+        statistic x and dof_diff additional degrees of freedom is rejected, as well as
+        the p-value of the test.
+        """
         Log.add('Likelihood ratio test for K_opt = ' + str(max_order) + ', x = ' + str(x))
         Log.add('Likelihood ratio test, d_1-d_0 = ' + str(dof_diff))
 
@@ -676,7 +1661,8 @@ observed and therefore the likelihood cannot be computed.
         Log.add('Likelihood ratio test, p = ' + str(p))
         return (p < significance_threshold), p
 
-    def estimate_order(self, paths=None, stop_at_order=None, significance_threshold=0.01):
+    def estimate_order(self, paths=None, stop_at_order=None, significance_threshold=0.01,
+                       lazy=False, release_layers=False):
         """Selects the optimal maximum order of a multi-order network model for the
         observed paths, based on a likelihood ratio test with p-value threshold of p
 
@@ -697,6 +1683,15 @@ observed and therefore the likelihood cannot be computed.
             Default is None.            
         significance_threshold: float
             the threshold for the p-value below which to accept the alternative hypothesis
+        lazy: bool
+            if True, layers with orders larger than the max_order of the model are
+            not added to the model. Instead, each of these layers is generated just in
+            time and released as soon as its likelihoods and degrees of freedom have
+            been computed, so that at most one such layer is kept in memory at a time.
+            Default is False.
+        release_layers: bool
+            if True, all layers of the model with orders larger than the optimal order
+            are removed from the model after the order selection. Default is False.
 
         Returns
         -------
@@ -708,25 +1703,40 @@ observed and therefore the likelihood cannot be computed.
         else:
             assert stop_at_order > 1, 'Order to be tested must be larger than one'
 
-        # Test for highest order that passes, likelihood ratio test against null model
+        # Test for highest order that passes, likelihood ratio test against null model.
+        # Since the likelihoods and degrees of freedom of all layers are cached during
+        # the tests, each layer term is only computed once.
         max_accepted_order = 1
-        for k in range(2, stop_at_order + 1):
-
-            if k >= self.max_order:
-                try:
-                    self.add_layers(k)
-                except PathsTooShort:
-                    msg = ("Optimal order is at least %d, but could be higher. Paths too short"
-                           "to create higher orders layers." % max_accepted_order)
-                    Log.add(msg, Severity.WARNING)
-                    break
+        if lazy:
+            max_accepted_order = self.__estimate_order_lazily(paths, stop_at_order,
+                                                              significance_threshold)
+        else:
+            with self._cached_layer_terms():
+                for k in range(2, stop_at_order + 1):
+
+                    if k >= self.max_order:
+                        try:
+                            self.add_layers(k)
+                        except PathsTooShort:
+                            msg = ("Optimal order is at least %d, but could be higher. "
+                                   "Paths too short to create higher orders layers."
+                                   % max_accepted_order)
+                            Log.add(msg, Severity.WARNING)
+                            break
+
+                    accept, p_value = self.likelihood_ratio_test(
+                        paths, max_order_null=k - 1, max_order=k,
+                        significance_threshold=significance_threshold
+                    )
+                    if accept:
+                        max_accepted_order = k
+
+        if release_layers:
+            for k in range(max_accepted_order + 1, self.max_order + 1):
+                del self.layers[k]
+                del self.transition_matrices[k]
+            self._prediction_cache = None
 
-            accept, p_value = self.likelihood_ratio_test(
-                paths, max_order_null=k - 1, max_order=k,
-                significance_threshold=significance_threshold
-            )
-            if accept:
-                max_accepted_order = k
         if paths is None:
             max_len = max(self.paths.paths)
         else:
@@ -738,6 +1748,71 @@ observed and therefore the likelihood cannot be computed.
         return max_accepted_order
 
 
+    def __estimate_order_lazily(self, paths, stop_at_order, significance_threshold):
+        """Performs the likelihood ratio tests of estimate_order based on the
+        likelihoods and degrees of freedom of one layer at a time, where layers with
+        orders larger than the max_order of the model are generated just in time.
+        """
+        if paths is None:
+            paths = self.paths
+        encoded, names = self._encode_paths(paths, 0, max(paths.paths))
+
+        # prefixes[L] contains the log-likelihoods of the first k nodes of all paths of
+        # length L based on the layers with order < k
+        prefixes = {L: np.zeros(len(freqs)) for L, (_, freqs) in encoded.items()}
+
+        # the log-likelihoods and degrees of freedom of the models with maximum order k
+        likelihoods = []
+        dofs = []
+        prefix_likelihood = 0
+        dof = 0
+
+        max_accepted_order = 1
+        max_order = self.max_order
+        for k in range(stop_at_order + 1):
+            if k > max_order:
+                Log.add('Generating %d-th order layer ...' % k)
+                try:
+                    layer = HigherOrderNetwork(self.paths, k, null_model=False,
+                                               matrix_only=True, mmap_dir=self._layer_dir(k),
+                                               **(self.pruning if k > 1 else {}))
+                except PathsTooShort:
+                    msg = ("Optimal order is at least %d, but could be higher. Paths too "
+                           "short to create higher orders layers." % max_accepted_order)
+                    Log.add(msg, Severity.WARNING)
+                    break
+                self.layers[k] = layer
+                self.transition_matrices[k] = layer.transition_matrix(include_subpaths=True)
+            try:
+                index_maps = {k: self.layers[k].node_to_name_map()}
+                likelihood = prefix_likelihood
+                for L, (X, freqs) in encoded.items():
+                    if L < k:
+                        continue
+                    log_L = self._path_log_likelihoods(X, names, k, index_maps,
+                                                       prefix=prefixes[L])
+                    likelihood += np.dot(log_L, freqs)
+                    if L == k:
+                        prefix_likelihood += np.dot(log_L, freqs)
+                    else:
+                        prefixes[L] = self._path_log_likelihoods(
+                            X[:, :k + 1], names, k, index_maps, prefix=prefixes[L])
+                dof += int(self.layers[k].degrees_of_freedom('paths'))
+            finally:
+                if k > max_order:
+                    del self.layers[k]
+                    del self.transition_matrices[k]
+            likelihoods.append(likelihood)
+            dofs.append(dof)
+
+            if k > 1:
+                accept, _ = self._chi2_test(-2 * (likelihoods[k - 1] - likelihoods[k]),
+                                            dofs[k] - dofs[k - 1], k,
+                                            significance_threshold)
+                if accept:
+                    max_accepted_order = k
+        return max_accepted_order
+
     def test_network_hypothesis(self, paths, method='AIC'):
         """
         Tests whether the assumption that paths are constrained
@@ -223,16 +223,17 @@ class Network:
         r"""Returns a time-aggregated directed network representation
         of a temporal network. The number of occurrences of
         the same edge at different time stamps is captured
-        by edge weights.
+        by edge weights. If min_time or max_time are given, only
+        time-stamped edges with min_time <= t < max_time are
+        aggregated.
         """
         network = cls(directed=directed)
 
-        for (v, w, t) in tempnet.tedges:
-            if (min_time is None or t >= min_time) and (max_time is None or t < max_time):
-                if (v, w) in network.edges:
-                    network.add_edge(v, w, weight=network.edges[(v, w)]['weight']+1.0)
-                else:
-                    network.add_edge(v, w)
+        for (v, w, t) in tempnet.slice(min_time, max_time).tedges:
+            if (v, w) in network.edges:
+                network.add_edge(v, w, weight=network.edges[(v, w)]['weight']+1.0)
+            else:
+                network.add_edge(v, w)
 
         return network
 
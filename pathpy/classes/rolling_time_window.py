@@ -22,16 +22,50 @@
 #
 #    E-mail: scholtes@ifi.uzh.ch
 #    Web:    http://www.ingoscholtes.net
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
 from pathpy.utils import Log, Severity
+from pathpy.utils.parallel import bounded_map, mp_context
 from pathpy.classes import Network
 
+
+# the temporal network, directedness and function used by worker processes that
+# evaluate time-slice networks in parallel
+_shared_window = None
+
+
+def _init_window_worker(*window):
+    global _shared_window
+    _shared_window = window
+
+
+def _map_window(time_window):
+    """Applies the shared function to the time-slice network of the given time window
+    (in a worker process)."""
+    return _apply_to_window(_shared_window, time_window)
+
+
+def _apply_to_window(window, time_window):
+    """Applies the function of a tuple (temporal_network, directed, func) to the
+    time-slice network of the given time window, which is generated from a (zero-copy)
+    time slice of the temporal network.
+    """
+    temporal_network, directed, func = window
+    n = Network.from_temporal_network(temporal_network, min_time=time_window[0],
+                                      max_time=time_window[1], directed=directed)
+    return func(n)
+
+
 class RollingTimeWindow:
     r"""
     An iterable rolling time window that can be used to perform time slice
     analysis of time-stamped network data.
     """
 
-    def __init__(self, temporal_net, window_size, step_size=1, directed=True, return_window=False):
+    def __init__(self, temporal_net, window_size, step_size=1, directed=True, return_window=False,
+                 incremental=False):
         r"""
         Initialises a RollingTimeWindow instance that can be used to
         iterate through a sequence of time-slice networks for a given
@@ -54,6 +88,13 @@ class RollingTimeWindow:
         return_window: bool
             Whether or not the iterator shall return the current time window
             as a second return value. Default is False.
+        incremental:    bool
+            Whether or not a single time-slice network shall be updated in place
+            by adding the time-stamped edges that enter the rolling window and
+            removing those that leave it. This is much faster than generating
+            each time-slice network from scratch if windows overlap, but the
+            returned network is only valid until the next iteration (and must
+            not be modified). Default is False.
 
         Returns
         -------
@@ -78,6 +119,12 @@ class RollingTimeWindow:
         self.max_time = max(temporal_net.ordered_times)
         self.directed = directed
         self.return_window = return_window
+        self.incremental = incremental
+
+        # the time-slice network and time window of the previous iteration, which
+        # are updated in incremental mode
+        self._network = Network(directed=directed)
+        self._window = None
 
     def __iter__(self):
         return self
@@ -86,9 +133,13 @@ class RollingTimeWindow:
     def __next__(self):
         if self.current_time+self.window_size <= self.max_time:
             time_window = [self.current_time, self.current_time+self.window_size]
-            n = Network.from_temporal_network(self.temporal_network, min_time=self.current_time,
-                                              max_time=self.current_time+self.window_size,
-                                              directed=self.directed)
+            if self.incremental:
+                n = self._update_network(*time_window)
+            else:
+                n = Network.from_temporal_network(self.temporal_network,
+                                                  min_time=self.current_time,
+                                                  max_time=self.current_time+self.window_size,
+                                                  directed=self.directed)
             self.current_time += self.step_size
             if self.return_window:
                 return n, time_window
@@ -96,3 +147,115 @@ class RollingTimeWindow:
                 return n
         else:
             raise StopIteration()
+
+    def _update_network(self, start, end):
+        r"""
+        Updates the time-slice network of the previous time window to the time
+        window [start, end), by changing the weights of edges that occur in the
+        time-stamped edges entering and leaving the window.
+        """
+        tempnet = self.temporal_network
+        if self._window is None:
+            entering = tempnet.slice(start, end)
+            leaving = tempnet.slice(start, start)
+        else:
+            prev_start, prev_end = self._window
+            entering = tempnet.slice(max(prev_end, start), end)
+            leaving = tempnet.slice(prev_start, min(start, prev_end))
+        self._window = (start, end)
+
+        # net change of the weight of each edge
+        delta = defaultdict(int)
+        for (v, w, _) in entering.tedges:
+            delta[v, w] += 1
+        for (v, w, _) in leaving.tedges:
+            delta[v, w] -= 1
+        if not self.directed:
+            # edges (v, w) and (w, v) are the same in undirected networks
+            undirected = defaultdict(int)
+            for (v, w), d in delta.items():
+                undirected[tuple(sorted((v, w)))] += d
+            delta = undirected
+
+        network = self._network
+        for (v, w), d in delta.items():
+            if d == 0:
+                continue
+            weight = network.edges[(v, w)]['weight'] + d if (v, w) in network.edges else d
+            if weight > 0:
+                network.add_edge(v, w, weight=float(weight))
+            else:
+                network.remove_edge(v, w)
+                # remove nodes without edges
+                for x in (v, w):
+                    if x in network.nodes and not network.successors[x] \
+                            and not network.predecessors[x]:
+                        network.remove_node(x)
+        return network
+
+    def map(self, func, max_workers=None):
+        r"""
+        Applies a function to the time-slice networks of all time windows, starting
+        at the current time of the rolling window, and returns an iterator over the
+        results in the order of time windows.
+
+        Time windows are distributed across max_workers worker processes, where each
+        worker generates its time-slice networks from a time slice of the temporal
+        network. Results are returned as soon as the results of all previous time
+        windows are available, where at most 2 * max_workers time windows are
+        evaluated (or buffered) at any time.
+
+        Parameters:
+        -----------
+        func:   callable
+            a function that is applied to each time-slice network (e.g. to
+            compute centralities), and which returns a (picklable) result.
+        max_workers:    int
+            the number of worker processes. For the default value None, time windows
+            are evaluated sequentially unless pathpy.ENABLE_MULTICORE_SUPPORT is set, in
+            which case one process per CPU is used.
+
+        Returns
+        -------
+        iterator
+            An iterator over the results of all time windows, or over tuples of results
+            and time windows [window_start, window_end] if return_window is True.
+
+        Examples
+        --------
+            >>> r = pathpy.RollingTimeWindow(t, window_size=100, step_size=10)
+            >>> for c in r.map(pathpy.algorithms.centralities.betweenness, max_workers=4):
+            >>>     print(c)
+        """
+        from pathpy import ENABLE_MULTICORE_SUPPORT
+
+        if max_workers is None and ENABLE_MULTICORE_SUPPORT:
+            max_workers = os.cpu_count()
+
+        windows = []
+        start = self.current_time
+        while start + self.window_size <= self.max_time:
+            windows.append([start, start + self.window_size])
+            start += self.step_size
+
+        for time_window, result in zip(windows, self._map_windows(func, windows,
+                                                                  max_workers)):
+            if self.return_window:
+                yield result, time_window
+            else:
+                yield result
+
+    def _map_windows(self, func, windows, max_workers):
+        r"""
+        Yields the results of func for the given time windows in order.
+        """
+        window = (self.temporal_network, self.directed, func)
+        if max_workers is None or max_workers <= 1:
+            for w in windows:
+                yield _apply_to_window(window, w)
+            return
+
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context(),
+                                 initializer=_init_window_worker,
+                                 initargs=window) as pool:
+            yield from bounded_map(pool, _map_window, windows, 2 * max_workers)
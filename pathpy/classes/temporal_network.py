@@ -22,15 +22,441 @@
 #
 #    E-mail: scholtes@ifi.uzh.ch
 #    Web:    http://www.ingoscholtes.net
+import os
+import sqlite3
 import sys
 from collections import defaultdict
-import bisect
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import closing
 import datetime
+from functools import reduce
+from itertools import islice
+from operator import itemgetter
+import time
 from time import mktime
 
 import numpy as _np
 
-from pathpy.utils import Log, Severity
+from pathpy.utils import Log, Severity, PathpyError, open_file
+from pathpy.utils.parallel import bounded_map, mp_context
+
+
+def _parse_timestamps(timestamps, timestamp_format, cache):
+    """Converts a sequence of timestamp strings to an array of UNIX timestamps,
+    where digit strings are directly converted to integers, and all other strings
+    are parsed with the given timestamp format. Since each distinct timestamp is
+    parsed only once, parsed values are stored in (and read from) the dictionary
+    cache.
+
+    Returns a tuple (times, valid), where valid is a boolean array that is False
+    for timestamps which cannot be parsed.
+    """
+    unique, inverse = _np.unique(_np.asarray(timestamps, dtype=str), return_inverse=True)
+    values = _np.zeros(len(unique), dtype=_np.int64)
+    valid = _np.ones(len(unique), dtype=bool)
+
+    digits = _np.char.isdigit(unique)
+    values[digits] = unique[digits].astype(_np.int64)
+    for i in _np.flatnonzero(~digits).tolist():
+        timestamp = str(unique[i])
+        if timestamp not in cache:
+            try:
+                x = datetime.datetime.strptime(timestamp, timestamp_format)
+                cache[timestamp] = int(mktime(x.timetuple()))
+            except ValueError:
+                cache[timestamp] = None
+        if cache[timestamp] is None:
+            valid[i] = False
+        else:
+            values[i] = cache[timestamp]
+
+    inverse = inverse.ravel()
+    return values[inverse], valid[inverse]
+
+
+def _intern(names, node_ids):
+    """Returns an array with the ids of the given node names, where new nodes are
+    added to the dictionary node_ids in the order of their first occurrence.
+    """
+    if len(names) == 0:
+        return _np.zeros(0, dtype=_np.int64)
+    array = _np.asarray(names)
+    if array.ndim != 1 or array.dtype == object or len(set(map(type, names))) > 1:
+        # names of mixed types (which numpy would convert to strings) or names that
+        # cannot be sorted by numpy (e.g. tuples) are interned one by one
+        return _np.array([node_ids.setdefault(v, len(node_ids)) for v in names],
+                         dtype=_np.int64)
+    unique, first, inverse = _np.unique(array, return_index=True, return_inverse=True)
+    unique = unique.tolist()
+    for i in _np.argsort(first, kind='stable').tolist():
+        node_ids.setdefault(unique[i], len(node_ids))
+    ids = _np.array([node_ids[v] for v in unique], dtype=_np.int64)
+    return ids[inverse.ravel()]
+
+
+def _parse_chunk(lines, n, separator, source_ix, target_ix, time_ix, timestamp_format,
+                 timestamp_cache, node_ids):
+    """Parses a chunk of lines of a time-stamped edge list, where n is the (one-based)
+    number of the first line after the header. Returns a tuple of arrays with the
+    source and target ids and time stamps of all valid lines.
+    """
+    max_ix = max(source_ix, target_ix, time_ix)
+    rows = [line.rstrip().split(separator) for line in lines]
+    line_numbers = [n + i for i, row in enumerate(rows) if len(row) > max_ix]
+    if len(line_numbers) < len(rows):  # pragma: no cover
+        for i, row in enumerate(rows):
+            if len(row) <= max_ix:
+                msg = 'Malformed line {0}: {1}'.format(n + i + 1, lines[i].strip())
+                Log.add(msg, Severity.WARNING)
+        rows = [row for row in rows if len(row) > max_ix]
+    line_numbers = _np.array(line_numbers, dtype=_np.int64)
+
+    sources = [row[source_ix] for row in rows]
+    targets = [row[target_ix] for row in rows]
+    if time_ix >= 0:
+        times, valid = _parse_timestamps([row[time_ix] for row in rows],
+                                         timestamp_format, timestamp_cache)
+    else:
+        times, valid = line_numbers, _np.ones(len(rows), dtype=bool)
+
+    nonempty = _np.array([v != '' and w != '' for v, w in zip(sources, targets)],
+                         dtype=bool)
+    keep = valid & nonempty & (times >= 0)
+    if not keep.all():  # pragma: no cover
+        for i in _np.flatnonzero(~keep).tolist():
+            s_line = separator.join(rows[i])
+            if not valid[i]:
+                msg = 'Malformed line {0}: {1}'.format(line_numbers[i] + 1, s_line)
+            elif not nonempty[i]:
+                msg = 'Empty node in line {0}: {1}'.format(line_numbers[i] + 1, s_line)
+            else:
+                msg = 'Negative timestamp in line {0}: {1}'.format(line_numbers[i] + 1,
+                                                                    s_line)
+            Log.add(msg, Severity.WARNING)
+        sources = [v for v, k in zip(sources, keep) if k]
+        targets = [w for w, k in zip(targets, keep) if k]
+
+    # intern source and target of each link in the order in which they occur
+    ids = _intern([v for pair in zip(sources, targets) for v in pair], node_ids)
+    return ids[0::2], ids[1::2], times[keep]
+
+
+def _nbytes(index):
+    """Returns the (approximate) memory in bytes used by an index, i.e. an array, a
+    list of python objects, or a tuple of these."""
+    if isinstance(index, _np.ndarray):
+        return index.nbytes
+    if isinstance(index, tuple):
+        return sum(_nbytes(x) for x in index)
+    return sys.getsizeof(index) + sum(sys.getsizeof(x) for x in index)
+
+
+def _fetch_edges(cursor, columns, batch_size, timestamp_format, node_ids):
+    """Fetches rows from an SQLite cursor in batches of batch_size rows, where the
+    function columns returns the source, target and time stamp of a row. Returns a
+    list of tuples of arrays with the source ids, target ids and time stamps of each
+    batch, where node names are converted to strings and interned in node_ids.
+    """
+    chunks = []
+    timestamp_cache = {}
+    rows = cursor.fetchmany(batch_size)
+    while rows:
+        rows = [columns(row) for row in rows]
+        timestamps = [row[2] for row in rows]
+        assert all(isinstance(t, (int, str)) for t in timestamps), \
+            'Error: pathpy only supports integer or string timestamps'
+        if all(isinstance(t, int) for t in timestamps):
+            times = _np.array(timestamps, dtype=_np.int64)
+        else:
+            times, valid = _parse_timestamps([str(t) for t in timestamps],
+                                             timestamp_format, timestamp_cache)
+            assert valid.all(), 'Error: could not parse timestamps with format {}'.format(
+                timestamp_format)
+        ids = _intern([str(v) for row in rows for v in row[:2]], node_ids)
+        chunks.append((ids[0::2], ids[1::2], times))
+        rows = cursor.fetchmany(batch_size)
+    return chunks
+
+
+def _sqlite_query(table, min_time, max_time, filter_nodes):
+    """Returns a query and its parameters which select the source, target and time
+    columns of the rows of an SQLite table with min_time <= time < max_time, where
+    None means no bound. If filter_nodes is True, only rows whose source and target
+    are contained in the temporary table pathpy_nodes are selected.
+    """
+    query = 'SELECT source, target, time FROM "{}"'.format(table.replace('"', '""'))
+    conditions, parameters = [], []
+    if min_time is not None:
+        conditions.append('time >= ?')
+        parameters.append(min_time)
+    if max_time is not None:
+        conditions.append('time < ?')
+        parameters.append(max_time)
+    if filter_nodes:
+        conditions.append('source IN pathpy_nodes AND target IN pathpy_nodes')
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    return query, parameters
+
+
+def _undirected(sources, targets, times):
+    """Returns arrays of time-stamped links in which each link (v,w,t) is followed
+    by the reverse link (w,v,t).
+    """
+    return (_np.column_stack([sources, targets]).ravel(),
+            _np.column_stack([targets, sources]).ravel(),
+            _np.repeat(times, 2))
+
+
+def _duplicate_mask(sources, targets, times):
+    """Returns a boolean array that is True for all time-stamped links (v,w,t) which
+    are identical to a link that occurs earlier in the given arrays.
+    """
+    order = _np.lexsort((_np.arange(len(times)), times, targets, sources))
+    s, w, t = sources[order], targets[order], times[order]
+    duplicate = _np.zeros(len(times), dtype=bool)
+    duplicate[order[1:]] = (s[1:] == s[:-1]) & (w[1:] == w[:-1]) & (t[1:] == t[:-1])
+    return duplicate
+
+
+def _undirected_pairs(sources, targets, times):
+    """Matches time-stamped links (v,w,t) with reverse links (w,v,t), where each
+    link is matched at most once. Returns an array that contains, for each link,
+    the index of the matched reverse link, or -1 if no reverse link is matched.
+    """
+    n = len(times)
+    forward = sources < targets
+    lo = _np.minimum(sources, targets)
+    hi = _np.maximum(sources, targets)
+
+    # group links by (lo, hi, t), with reverse links preceding forward links
+    order = _np.lexsort((_np.arange(n), forward, times, hi, lo))
+    lo, hi, t, forward = lo[order], hi[order], times[order], forward[order]
+    new_group = _np.ones(n, dtype=bool)
+    new_group[1:] = (lo[1:] != lo[:-1]) | (hi[1:] != hi[:-1]) | (t[1:] != t[:-1])
+    new_direction = new_group.copy()
+    new_direction[1:] |= forward[1:] != forward[:-1]
+
+    positions = _np.arange(n)
+    group_start = _np.maximum.accumulate(_np.where(new_group, positions, 0))
+    rank = positions - _np.maximum.accumulate(_np.where(new_direction, positions, 0))
+    group = _np.cumsum(new_group) - 1
+    n_reverse = _np.bincount(group, weights=~forward, minlength=group[-1] + 1
+                             ).astype(_np.int64)[group]
+    n_forward = _np.bincount(group, minlength=group[-1] + 1)[group] - n_reverse
+
+    # the r-th reverse link of a group is matched with the r-th forward link, where
+    # self-loops (which are reverse links without forward links) are never matched
+    partner = _np.full(n, -1, dtype=_np.int64)
+    matched = _np.where(forward, rank < n_reverse, rank < n_forward)
+    partner_position = _np.where(forward, group_start + rank,
+                                 group_start + n_reverse + rank)
+    partner[order[matched]] = order[partner_position[matched]]
+    return partner
+
+
+def _shuffle_window(sources, targets, times, l=0, maintain_undirected=True,
+                    random=_np.random):
+    """Randomly reassigns time stamps to time-stamped links without replacement,
+    such that no time-stamped link occurs more than once. If maintain_undirected is
+    True, pairs of links (v,w,t) and (w,v,t) are reassigned to the same time stamp.
+    Returns arrays of sources, targets and time stamps of l links (or link pairs),
+    where l=0 reassigns all links. Random numbers are drawn from random, which is
+    either numpy.random or a numpy.random.RandomState.
+    """
+    # units of links that are reassigned at once, i.e. single links or link pairs
+    # (where the link with the smaller index represents the pair)
+    if maintain_undirected and len(times) > 0:
+        partner = _undirected_pairs(sources, targets, times)
+    else:
+        partner = _np.full(len(times), -1, dtype=_np.int64)
+    units = _np.flatnonzero((partner < 0) | (partner > _np.arange(len(times))))
+    paired = partner[units] >= 0
+
+    n = l if l > 0 else len(units)
+    assert n <= len(units), \
+        'Error: cannot sample {} of {} edges without replacement'.format(n, len(units))
+
+    # sample n units and a random permutation of the time stamps of all units
+    pool = random.permutation(times[units])
+    selected = random.permutation(len(units))[:n]
+    units, paired = units[selected], paired[selected]
+
+    s = _np.concatenate([sources[units], targets[units][paired]])
+    w = _np.concatenate([targets[units], sources[units][paired]])
+    unit = _np.concatenate([_np.arange(n), _np.flatnonzero(paired)])
+
+    # resolve duplicate time-stamped links by swapping the time stamps of conflicting
+    # units with randomly chosen time stamps until all time-stamped links are unique
+    for _ in range(1000):
+        conflicts = _np.unique(unit[_duplicate_mask(s, w, pool[unit])])
+        if len(conflicts) == 0:
+            return s, w, pool[unit]
+        for i, j in zip(conflicts.tolist(),
+                        random.randint(0, len(pool), size=len(conflicts)).tolist()):
+            pool[i], pool[j] = pool[j], pool[i]
+    raise PathpyError('Could not shuffle edges without creating identical time-stamped '
+                      'edges')
+
+
+# the temporal network, shuffling options and statistic used by worker processes
+# that generate an ensemble of shuffled temporal networks
+_shared_ensemble = None
+
+
+def _init_ensemble_worker(*ensemble):
+    global _shared_ensemble
+    _shared_ensemble = ensemble
+
+
+def _shuffled_statistic(seed):
+    """Returns the statistic of the shared temporal network shuffled with a random
+    stream generated from the given seed (in a worker process)."""
+    return _shuffle_and_evaluate(_shared_ensemble, seed)
+
+
+def _shuffle_and_evaluate(ensemble, seed):
+    """Shuffles the temporal network of an ensemble (network, statistic, options) with
+    a random stream generated from the given seed and returns the statistic of the
+    shuffled network.
+    """
+    network, statistic, options = ensemble
+    random = _np.random.RandomState(_np.random.MT19937(seed))
+    shuffled = network._shuffle_edges(random, **options)
+    if statistic is None:
+        return shuffled
+    return statistic(shuffled)
+
+
+class _TemporalEdges(Sequence):
+    """A read-only sequence of time-stamped edges (v, w, t), which is a view of (slices
+    of) the source, target and time arrays of a temporal network.
+    """
+
+    def __init__(self, network, sources, targets, times):
+        self._network = network
+        self._sources = sources
+        self._targets = targets
+        self._times = times
+
+    def __len__(self):
+        return len(self._times)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return _TemporalEdges(self._network, self._sources[i], self._targets[i],
+                                  self._times[i])
+        names = self._network._node_names
+        return names[self._sources[i]], names[self._targets[i]], int(self._times[i])
+
+    def __iter__(self):
+        names = self._network._node_names
+        for v, w, t in zip(self._sources.tolist(), self._targets.tolist(),
+                           self._times.tolist()):
+            yield names[v], names[w], t
+
+    def __contains__(self, edge):
+        node_ids = self._network._node_ids
+        try:
+            v, w, t = edge
+            if v not in node_ids or w not in node_ids:
+                return False
+            return bool(((self._sources == node_ids[v]) & (self._targets == node_ids[w]) &
+                         (self._times == t)).any())
+        except (TypeError, ValueError):
+            return False
+
+    def __eq__(self, other):
+        if isinstance(other, (Sequence, _TemporalEdges)) and not isinstance(other, str):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class _TimeIndex(Mapping):
+    """A read-only dictionary view of the time-stamped edges of a temporal network,
+    indexed by time stamp. For a time stamp t, index[t] is the sequence of all edges
+    at time t, which is empty if there are no such edges.
+    """
+
+    def __init__(self, network):
+        self._network = network
+
+    def _slice(self, t):
+        times, offsets = self._network._index('time')
+        i = _np.searchsorted(times, t)
+        if i < len(times) and times[i] == t:
+            return offsets[i], offsets[i + 1]
+        return 0, 0
+
+    def __getitem__(self, t):
+        start, end = self._slice(t)
+        return self._network._edges(start, end)
+
+    def __contains__(self, t):
+        start, end = self._slice(t)
+        return end > start
+
+    def __iter__(self):
+        return iter(self._network.ordered_times)
+
+    def __len__(self):
+        return len(self._network._index('time')[0])
+
+
+class _NodeTimeIndex(_TimeIndex):
+    """A read-only dictionary view of the time-stamped edges of a temporal network,
+    indexed by time stamp and source (or target) node. For a time stamp t, index[t] is
+    a dictionary that maps nodes to the sequences of edges at time t which originate
+    from (or lead to) these nodes. The name of the index is sources (or targets).
+    """
+
+    def __init__(self, network, name):
+        super().__init__(network)
+        self._name = name
+
+    def __getitem__(self, t):
+        start, end = self._slice(t)
+        network = self._network
+        order, nodes, offsets = network._index(self._name)
+        first, last = _np.searchsorted(offsets, [start, end])
+        sources, targets, times = network._edge_columns()
+        names = network._node_names
+        index = {}
+        for v, group_start, group_end in zip(nodes[first:last].tolist(),
+                                             offsets[first:last].tolist(),
+                                             offsets[first + 1:last + 1].tolist()):
+            edges = order[group_start:group_end]
+            index[names[v]] = _TemporalEdges(network, sources[edges], targets[edges],
+                                             times[edges])
+        return index
+
+
+class _ActivityIndex(Mapping):
+    """A read-only dictionary view of the (sorted) time stamps at which links (v,*;t)
+    originate from the nodes v of a temporal network. Nodes without outgoing links
+    have no activities.
+    """
+
+    def __init__(self, network, container=list):
+        self._network = network
+        self._container = container
+
+    def __getitem__(self, v):
+        idx = self._network._node_ids.get(v)
+        if idx is None:
+            return self._container()
+        times, indptr = self._network._index('activities')
+        return self._container(times[indptr[idx]:indptr[idx + 1]].tolist())
+
+    def __iter__(self):
+        return iter(self._network._node_names)
+
+    def __len__(self):
+        return len(self._network._node_names)
 
 
 class TemporalNetwork:
@@ -39,6 +465,11 @@ class TemporalNetwork:
        Instances of this class can be used to generate path statistics
        based on the time-respecting paths resulting from a given maximum
        time difference between consecutive time-stamped edges.
+
+       Time-stamped edges are stored in columnar form, i.e. as arrays of (interned)
+       source and target node ids and time stamps, which are sorted by time. The
+       attributes tedges, time, sources, targets, activities and activities_sets are
+       read-only views of these arrays.
     """
 
     def __init__(self, tedges=None):
@@ -47,63 +478,311 @@ class TemporalNetwork:
         Parameters
         ----------
         tedges:
-            an optional list of directed time-stamped edges from which to construct a
-            temporal network instance. For the default value None an empty temporal
-            network will be created.
+            an optional list of directed time-stamped edges (v, w, t) with integer time
+            stamps t from which to construct a temporal network instance. For the
+            default value None an empty temporal network will be created.
         """
-        # A list of time-stamped edges of this temporal network
-        self.tedges = []
+        # A dictionary that maps node names to node ids, and a list of node names
+        # indexed by id. The order of this list is the order of nodes in the network.
+        self._node_ids = {}
+        self._node_names = []
 
-        # A list of nodes of this temporal network
-        self.nodes = []
+        # whether node names are shared with another network, i.e. whether they have
+        # to be copied before adding nodes (see slice)
+        self._shared_nodes = False
 
-        # A dictionary storing all time-stamped links, indexed by time-stamps
-        self.time = defaultdict(lambda: list())
+        # arrays of source and target node ids as well as time stamps of all
+        # time-stamped links, sorted by time stamp
+        empty = _np.zeros(0, dtype=_np.int64)
+        self._columns = (empty, empty, empty)
 
-        # A dictionary storing all time-stamped links, indexed by time and target node
-        self.targets = defaultdict(lambda: dict())
+        # time-stamped links (v, w, t) that have been added via add_edge, but which
+        # have not yet been merged into the arrays above
+        self._pending = []
 
-        # A dictionary storing all time-stamped links, indexed by time and source node
-        self.sources = defaultdict(lambda: dict())
+        # index data structures which are generated from the arrays above when they
+        # are first used
+        self._indexes = {}
 
-        # A dictionary storing time stamps at which links (v,*;t) originate from node v
-        self.activities = defaultdict(lambda: list())
+        if tedges is not None:
+            Log.add('Building edge arrays ...')
+            node_ids = self._node_ids
+            ids = []
+            times = []
+            for v, w, t in tedges:
+                ids.append(node_ids.setdefault(v, len(node_ids)))
+                ids.append(node_ids.setdefault(w, len(node_ids)))
+                times.append(t)
+            self._node_names = list(node_ids)
+            ids = _np.array(ids, dtype=_np.int64).reshape(len(times), 2)
+            times = _np.asarray(times)
+            assert len(times) == 0 or times.dtype.kind in 'iu', \
+                'Timestamps must be integers'
 
-        # A dictionary storing sets of time stamps at which links (v,*;t) originate from
-        # node v
-        # Note that the insertion into a set is much faster than repeatedly checking
-        # whether an element already exists in a list!
-        self.activities_sets = defaultdict(lambda: set())
+            Log.add('Sorting time stamps ...')
+            self._set_edges(ids[:, 0], ids[:, 1], times.astype(_np.int64))
+            Log.add('finished.')
 
-        # An ordered list of time-stamps
-        self.ordered_times = []
+    def _set_edges(self, sources, targets, times):
+        """Sets the arrays of time-stamped links, which are sorted by time stamp
+        (retaining the order of links with the same time stamp).
+        """
+        order = _np.argsort(times, kind='stable')
+        self._columns = (sources[order], targets[order], times[order])
+        self._pending = []
+        self._indexes = {}
+
+    def _merge_edges(self, sources, targets, times):
+        """Merges arrays of time-stamped links into the (sorted) arrays of this
+        network, where new links are inserted after existing links with the same
+        time stamp. Unless new time stamps precede existing ones, links are simply
+        appended.
+        """
+        if len(times) == 0:
+            return
+        order = _np.argsort(times, kind='stable')
+        sources, targets, times = sources[order], targets[order], times[order]
+        old_sources, old_targets, old_times = self._columns
+        if len(old_times) == 0 or times[0] >= old_times[-1]:
+            self._columns = (_np.concatenate([old_sources, sources]),
+                             _np.concatenate([old_targets, targets]),
+                             _np.concatenate([old_times, times]))
+        else:
+            index = _np.searchsorted(old_times, times, side='right')
+            self._columns = (_np.insert(old_sources, index, sources),
+                             _np.insert(old_targets, index, targets),
+                             _np.insert(old_times, index, times))
+        self._indexes = {}
+
+    def _edge_columns(self):
+        """Returns the arrays of source ids, target ids and time stamps of all
+        time-stamped links, after merging links added via add_edge."""
+        if self._pending:
+            pending = _np.array(self._pending, dtype=_np.int64).reshape(-1, 3)
+            self._pending = []
+            self._merge_edges(pending[:, 0], pending[:, 1], pending[:, 2])
+        return self._columns
+
+    @property
+    def _sources(self):
+        return self._edge_columns()[0]
+
+    @property
+    def _targets(self):
+        return self._edge_columns()[1]
+
+    @property
+    def _times(self):
+        return self._edge_columns()[2]
 
-        nodes_seen = defaultdict(lambda: False)
+    @classmethod
+    def _from_arrays(cls, node_names, sources, targets, times):
+        """Returns a temporal network with the time-stamped links given by arrays of
+        source and target ids and time stamps, where ids refer to the given node names.
+        Only nodes with at least one link are included.
+        """
+        times = _np.asarray(times)
+        assert len(times) == 0 or times.dtype.kind in 'iu', 'Timestamps must be integers'
+        network = cls()
+        ids, inverse = _np.unique(_np.concatenate([sources, targets]), return_inverse=True)
+        inverse = inverse.ravel()
+        network._node_names = [node_names[v] for v in ids.tolist()]
+        network._node_ids = {v: i for i, v in enumerate(network._node_names)}
+        m = len(sources)
+        network._set_edges(inverse[:m].astype(_np.int64), inverse[m:].astype(_np.int64),
+                           times.astype(_np.int64))
+        return network
+
+    def _own_nodes(self):
+        """Copies node names that are shared with another network, so that nodes can
+        be added without changing the other network."""
+        if self._shared_nodes:
+            self._node_ids = dict(self._node_ids)
+            self._node_names = list(self._node_names)
+            self._shared_nodes = False
+
+    def slice(self, t_start=None, t_end=None):
+        """Returns a view of the time-stamped edges (v,w,t) of this temporal network
+        with t_start <= t < t_end. The view is a temporal network which shares the
+        storage of edges and nodes with this network, so it is created in time
+        O(log n) for n time-stamped edges. It contains all nodes of this network (in
+        the same order), including those without edges in the time interval.
+
+        Adding edges to the view does not change this network (and vice versa).
 
-        if tedges is not None:
-            Log.add('Building index data structures ...')
-
-            for e in tedges:
-                self.activities_sets[e[0]].add(e[2])
-                self.time[e[2]].append(e)
-                self.targets[e[2]].setdefault(e[1], []).append(e)
-                self.sources[e[2]].setdefault(e[0], []).append(e)
-                if not nodes_seen[e[0]]:
-                    nodes_seen[e[0]] = True
-                if not nodes_seen[e[1]]:
-                    nodes_seen[e[1]] = True
-            self.tedges = tedges
-            self.nodes = list(nodes_seen.keys())
+        Parameters
+        ----------
+        t_start: int
+            the first time stamp of the time slice. For the default value None, the
+            slice starts with the first time stamp.
+        t_end: int
+            the time stamp at which the time slice ends (exclusively). For the default
+            value None, the slice ends after the last time stamp.
 
-            Log.add('Sorting time stamps ...')
+        Returns
+        -------
+        TemporalNetwork
+        """
+        sources, targets, times = self._edge_columns()
+        start = 0 if t_start is None else _np.searchsorted(times, t_start, side='left')
+        end = len(times) if t_end is None else _np.searchsorted(times, t_end, side='left')
+        end = max(start, end)
+
+        view = TemporalNetwork()
+        view._node_ids = self._node_ids
+        view._node_names = self._node_names
+        view._shared_nodes = self._shared_nodes = True
+        view._columns = (sources[start:end], targets[start:end], times[start:end])
+        return view
+
+    def _edges(self, start=None, end=None):
+        """Returns a view of the time-stamped links with indices in [start, end)"""
+        window = slice(start, end)
+        return _TemporalEdges(self, self._sources[window], self._targets[window],
+                              self._times[window])
+
+    def _index(self, name):
+        """Returns the index with the given name, which is built (by the method
+        _build_<name>) when it is first used, and cached until edges or nodes change.
+        """
+        if name not in self._indexes:
+            start = time.perf_counter()
+            index = getattr(self, '_build_' + name)()
+            seconds = time.perf_counter() - start
+            self._indexes[name] = index, seconds, _nbytes(index)
+            Log.add('Built {} index in {:.3f} s'.format(name, seconds), Severity.TIMING)
+        return self._indexes[name][0]
+
+    def _build_time(self):
+        """Returns a tuple (times, offsets) of the sorted unique time stamps and the
+        positions offsets[i]:offsets[i+1] of the links with time stamp times[i].
+        """
+        times = self._times
+        is_new = _np.ones(len(times), dtype=bool)
+        is_new[1:] = times[1:] != times[:-1]
+        offsets = _np.append(_np.flatnonzero(is_new), len(times))
+        return times[is_new], offsets
+
+    def _build_ordered_times(self):
+        """Returns the list of sorted unique time stamps"""
+        return self._index('time')[0].tolist()
+
+    def _build_sources(self):
+        """Returns the index of links grouped by time stamp and source node (see
+        _node_time_groups)."""
+        return self._node_time_groups(self._sources)
+
+    def _build_targets(self):
+        """Returns the index of links grouped by time stamp and target node (see
+        _node_time_groups)."""
+        return self._node_time_groups(self._targets)
+
+    def _node_time_groups(self, nodes):
+        """Returns a tuple (order, nodes, offsets), where order sorts the links by
+        node id within each time stamp (retaining the order of links with the same
+        time stamp and node), and order[offsets[i]:offsets[i+1]] are the positions of
+        the links of the i-th group, which share the node with id nodes[i].
+        """
+        times = self._times
+        order = _np.lexsort((nodes, times))
+        nodes, times = nodes[order], times[order]
+        is_new = _np.ones(len(times), dtype=bool)
+        is_new[1:] = (nodes[1:] != nodes[:-1]) | (times[1:] != times[:-1])
+        offsets = _np.append(_np.flatnonzero(is_new), len(times))
+        return order, nodes[is_new], offsets
+
+    def _build_activities(self):
+        """Returns a tuple (times, indptr), where times[indptr[v]:indptr[v+1]] are the
+        sorted unique time stamps of links originating from the node with id v.
+        """
+        sources, times = self._sources, self._times
+        order = _np.lexsort((times, sources))
+        sources, times = sources[order], times[order]
+        is_new = _np.ones(len(times), dtype=bool)
+        is_new[1:] = (sources[1:] != sources[:-1]) | (times[1:] != times[:-1])
+        sources, times = sources[is_new], times[is_new]
+        indptr = _np.zeros(len(self._node_names) + 1, dtype=_np.int64)
+        indptr[1:] = _np.cumsum(_np.bincount(sources, minlength=len(self._node_names)))
+        return times, indptr
+
+    def index_stats(self):
+        """Returns a dictionary with the construction time (in seconds) and the memory
+        (in bytes) of each index which has been built since the temporal network was
+        last changed. Indexes are built when they are first used, e.g. the time index
+        by time and ordered_times, the sources and targets indexes by sources and
+        targets, and the activity index by activities and inter_path_times.
 
-            self.ordered_times = sorted(list(self.time.keys()))
-            for v in self.nodes:
-                self.activities[v] = sorted(self.activities_sets[v])
-            Log.add('finished.')
+        Returns
+        -------
+        dict
+            a dictionary that maps index names to tuples (seconds, bytes)
+        """
+        return {name: (seconds, nbytes)
+                for name, (_, seconds, nbytes) in self._indexes.items()}
+
+    @property
+    def tedges(self):
+        """A sequence of all time-stamped edges (v, w, t) of this temporal network,
+        ordered by time stamp"""
+        return self._edges()
+
+    @property
+    def nodes(self):
+        """A list of nodes of this temporal network"""
+        return self._node_names
+
+    @nodes.setter
+    def nodes(self, nodes):
+        """Sets the order of nodes, where nodes must contain all nodes of the
+        network (and may contain additional nodes without links)."""
+        nodes = list(nodes)
+        node_ids = {v: i for i, v in enumerate(nodes)}
+        assert len(node_ids) == len(nodes), 'Error: nodes must be unique'
+        mapping = _np.array([node_ids[v] for v in self._node_names], dtype=_np.int64)
+        sources, targets, times = self._edge_columns()
+        self._node_names = nodes
+        self._node_ids = node_ids
+        self._shared_nodes = False
+        self._columns = (mapping[sources], mapping[targets], times)
+        self._indexes = {}
+
+    @property
+    def time(self):
+        """A dictionary storing all time-stamped links, indexed by time-stamps"""
+        return _TimeIndex(self)
+
+    @property
+    def targets(self):
+        """A dictionary storing all time-stamped links, indexed by time and target
+        node"""
+        return _NodeTimeIndex(self, 'targets')
+
+    @property
+    def sources(self):
+        """A dictionary storing all time-stamped links, indexed by time and source
+        node"""
+        return _NodeTimeIndex(self, 'sources')
+
+    @property
+    def activities(self):
+        """A dictionary storing the ordered time stamps at which links (v,*;t)
+        originate from node v"""
+        return _ActivityIndex(self)
+
+    @property
+    def activities_sets(self):
+        """A dictionary storing sets of time stamps at which links (v,*;t) originate
+        from node v"""
+        return _ActivityIndex(self, set)
+
+    @property
+    def ordered_times(self):
+        """An ordered list of time-stamps"""
+        return self._index('ordered_times')
 
     @classmethod
-    def from_sqlite(cls, cursor, directed=True, timestamp_format='%Y-%m-%d %H:%M:%S', time_rescale=1):
+    def from_sqlite(cls, cursor, directed=True, timestamp_format='%Y-%m-%d %H:%M:%S',
+                    time_rescale=1, batch_size=10000):
         """Reads time-stamped links from an SQLite cursor and returns a new instance of
         the class TemporalNetwork. The cursor is assumed to refer to a table that
         minimally has three columns
@@ -120,6 +799,9 @@ class TemporalNetwork:
 
                 connection.row_factory = sqlite3.Row
 
+        To filter links by time or nodes in the database, or to read multiple tables,
+        see read_sqlite.
+
         Parameters
         ----------
         cursor:
@@ -132,13 +814,13 @@ class TemporalNetwork:
             can be used to rescale integer timestamps by diving each time stamp by 
             time_rescale. This is useful for high-resolution data with a sampling 
             interval larger than one second. Default is 1.
+        batch_size: int
+            the number of rows which are fetched (and parsed) at once (default 10000)
 
         Returns
         -------
 
         """
-        tedges = []
-
         assert cursor.connection.row_factory, \
             'Cannot access columns by name. Please set ' \
             'connection.row_factory = sqlite3.Row before creating DB cursor.'
@@ -148,28 +830,108 @@ class TemporalNetwork:
         else:
             Log.add('Retrieving directed time-stamped links ...')
 
-        for row in cursor:
-            # r = sqlite3.Row(row)
-            timestamp = row['time']
-            assert isinstance(timestamp, int) or isinstance(timestamp, str), \
-                'Error: pathpy only supports integer or string timestamps'
-            # if the timestamp is a number, we use this
-            if isinstance(timestamp, int):
-                t = timestamp
-            else:
-                # if it is a string, we use the timestamp format to convert it to
-                # a UNIX timestamp
-                x = datetime.datetime.strptime(timestamp, timestamp_format)
-                t = int(mktime(x.timetuple()))
-            tedges.append((str(row['source']), str(row['target']), int(t/time_rescale)))
-            if not directed:
-                tedges.append((str(row['target']), str(row['source']), int(t/time_rescale)))
+        node_ids = {}
+        columns = itemgetter('source', 'target', 'time')
+        chunks = _fetch_edges(cursor, columns, batch_size, timestamp_format, node_ids)
+        return cls._from_chunks(chunks, node_ids, directed, time_rescale)
+
+    @classmethod
+    def read_sqlite(cls, filename, tables, directed=True, min_time=None, max_time=None,
+                    nodes=None, timestamp_format='%Y-%m-%d %H:%M:%S', time_rescale=1,
+                    batch_size=10000, max_workers=None):
+        """Reads time-stamped links from one or more tables of an SQLite database and
+        returns a new instance of the class TemporalNetwork. Each table (or view) is
+        assumed to have (at least) the three columns
+
+                source target time
+
+        where each row refers to a directed link. Filters on time stamps and nodes are
+        applied in the SQL query, so that only matching links are retrieved from the
+        database. Multiple tables (e.g. partitions of a large data set) can be read
+        concurrently by a pool of threads, each of which uses its own connection, and
+        the links of all tables are merged into a single temporal network.
+
+        Parameters
+        ----------
+        filename: str
+            path of the SQLite database file
+        tables: str or list
+            the name of a table, or a list of table names
+        directed: bool
+        min_time:
+            if given, only links with time >= min_time are read. Since the filter is
+            applied in the database, min_time must have the type of the time column,
+            i.e. it is an int for integer time stamps or a string for string time stamps
+            (which are compared lexicographically). Default is None.
+        max_time:
+            if given, only links with time < max_time are read (see min_time). Default
+            is None.
+        nodes: iterable
+            if given, only links between these nodes are read. The nodes are compared
+            with the source and target columns in the database, so they should have the
+            type of these columns (e.g. ints for an integer column). Strings of digits
+            also match integer columns. Default is None.
+        timestamp_format: str
+            used to convert string timestamps to UNIX timestamps. This parameter is
+            ignored, if the timestamps are digit types (like a simple int).
+        time_rescale: int
+            can be used to rescale integer timestamps by diving each time stamp by
+            time_rescale. Default is 1.
+        batch_size: int
+            the number of rows which are fetched (and parsed) at once (default 10000)
+        max_workers: int
+            the number of threads used to read multiple tables. For the default value
+            None, one thread per table is used.
 
-        return cls(tedges=tedges)
+        Returns
+        -------
+        TemporalNetwork
+        """
+        if isinstance(tables, str):
+            tables = [tables]
+        assert len(tables) > 0, 'Error: no tables given to read from'
+        if nodes is not None:
+            # keep each node in its original type so that the filter compares raw
+            # column values (and can use an index), but also match the string form
+            node_values = set()
+            for v in nodes:
+                node_values.add(v)
+                node_values.add(str(v))
+                if isinstance(v, str) and v.lstrip('-').isdigit():
+                    node_values.add(int(v))
+            nodes = list(node_values)
+
+        def read_table(table):
+            node_ids = {}
+            with closing(sqlite3.connect(filename)) as connection:
+                if nodes is not None:
+                    connection.execute('CREATE TEMP TABLE pathpy_nodes '
+                                       '(node PRIMARY KEY)')
+                    connection.executemany('INSERT OR IGNORE INTO pathpy_nodes '
+                                           'VALUES (?)', ((v,) for v in nodes))
+                query, parameters = _sqlite_query(table, min_time, max_time,
+                                                  nodes is not None)
+                Log.add('Reading time-stamped links from table {} ...'.format(table))
+                cursor = connection.execute(query, parameters)
+                chunks = _fetch_edges(cursor, tuple, batch_size, timestamp_format,
+                                      node_ids)
+            return node_ids, chunks
+
+        with ThreadPoolExecutor(max_workers=max_workers or len(tables)) as pool:
+            results = list(pool.map(read_table, tables))
+
+        # merge the node ids of all tables (in the order of tables)
+        node_ids = {}
+        chunks = []
+        for table_ids, table_chunks in results:
+            mapping = _intern(list(table_ids), node_ids)
+            chunks += [(mapping[s], mapping[t], times) for s, t, times in table_chunks]
+        return cls._from_chunks(chunks, node_ids, directed, time_rescale)
 
     @classmethod
     def read_file(cls, filename, separator=',', directed=True,
-                  timestamp_format='%Y-%m-%d %H:%M:%S', maxlines=sys.maxsize, time_rescale=1):
+                  timestamp_format='%Y-%m-%d %H:%M:%S', maxlines=sys.maxsize, time_rescale=1,
+                  chunk_size=100000):
         """
         Reads time-stamped links from a file and returns a new instance of the class
         TemporalNetwork. The file is assumed to have a header
@@ -178,7 +940,7 @@ class TemporalNetwork:
 
         where columns can be in arbitrary order and separated by arbitrary characters.
         Each time-stamped link must occur in a separate line and links are assumed to be
-        directed.
+        directed. Files ending with .gz, .bz2 or .xz are transparently decompressed.
 
         The time column can be omitted and in this case all links are assumed to occur
         in consecutive time stamps (that have a distance of one). Time stamps can be
@@ -203,17 +965,22 @@ class TemporalNetwork:
             can be used to rescale integer timestamps by diving each time stamp by 
             time_rescale. This is useful for high-resolution data with a sampling 
             interval larger than one second. Default is 1.
+        chunk_size: int
+            the number of lines which are parsed at once (default 100000)
 
         Returns
         -------
 
         """
         assert (filename != ''), 'Empty filename given'
+        assert chunk_size > 0, 'Error: chunk_size must be positive'
 
-        # Read header
-        with open(filename, 'r') as f:
-            tedges = []
+        node_ids = {}
+        timestamp_cache = {}
+        chunks = []
 
+        # Read header
+        with open_file(filename, 'r') as f:
             header = f.readline()
             header = header.split(separator)
 
@@ -242,47 +1009,47 @@ class TemporalNetwork:
             else:
                 Log.add('Reading directed time-stamped links ...')
 
-            line = f.readline()
             n = 1
-            while line and n <= maxlines:
-                fields = line.rstrip().split(separator)
-                try:
-                    if time_ix >= 0:
-                        timestamp = fields[time_ix]
-                        # if the timestamp is a number, we use this
-                        if timestamp.isdigit():
-                            t = int(timestamp)
-                        else:
-                            # if it is a string, we use the timestamp format to convert
-                            # it to a UNIX timestamp
-                            x = datetime.datetime.strptime(timestamp, timestamp_format)
-                            t = int(mktime(x.timetuple()))
-                    else:
-                        t = n
-                    if t >= 0 and fields[source_ix] != '' and fields[target_ix] != '':
-                        tedge = (fields[source_ix], fields[target_ix], int(t/time_rescale))
-                        tedges.append(tedge)
-                        if not directed:
-                            tedges.append((fields[target_ix], fields[source_ix], int(t/time_rescale)))
-                    else:  # pragma: no cover
-                        s_line = line.strip()
-                        if fields[source_ix] == '' or fields[target_ix] == '':
-                            msg = 'Empty node in line {0}: {1}'.format(n+1, s_line)
-                        else: 
-                            msg = 'Negative timestamp in line {0}: {1}'.format(n+1, s_line)
-                        Log.add(msg, Severity.WARNING)
-                except (IndexError, ValueError):  # pragma: no cover
-                    s_line = line.strip()
-                    msg = 'Malformed line {0}: {1}'.format(n+1, s_line)
-                    Log.add(msg, Severity.WARNING)
-                line = f.readline()
-                n += 1
+            while n <= maxlines:
+                lines = list(islice(f, min(chunk_size, maxlines - n + 1)))
+                if not lines:
+                    break
+                chunks.append(_parse_chunk(lines, n, separator, source_ix, target_ix,
+                                           time_ix, timestamp_format, timestamp_cache,
+                                           node_ids))
+                n += len(lines)
         # end of with open()
 
-        return cls(tedges=tedges)
+        return cls._from_chunks(chunks, node_ids, directed, time_rescale)
+
+    @classmethod
+    def _from_chunks(cls, chunks, node_ids, directed, time_rescale):
+        """Returns a temporal network with the time-stamped links given by chunks of
+        arrays of source ids, target ids and time stamps, where ids refer to the
+        dictionary node_ids.
+        """
+        if chunks:
+            sources, targets, times = (_np.concatenate(c) for c in zip(*chunks))
+        else:
+            sources = targets = times = _np.zeros(0, dtype=_np.int64)
+
+        if time_rescale != 1:
+            times = (times / time_rescale).astype(_np.int64)
+
+        if not directed:
+            sources, targets, times = _undirected(sources, targets, times)
+
+        Log.add('Building edge arrays ...')
+        network = cls()
+        network._node_ids = node_ids
+        network._node_names = list(node_ids)
+        network._set_edges(sources, targets, times)
+        Log.add('finished.')
+        return network
 
     def write_file(self, filename, sep=','):
-        """Writes the time-stamped edge list of this temporal network instance as CSV file
+        """Writes the time-stamped edge list of this temporal network instance as CSV file.
+        If the filename ends with .gz, .bz2 or .xz the file will be compressed.
 
         Parameters
         ----------
@@ -297,12 +1064,10 @@ class TemporalNetwork:
         """
         msg = 'Writing {0} time-stamped edges to file {1}'.format(self.ecount(), filename)
         Log.add(msg, Severity.INFO)
-        with open(filename, 'w+') as f:
+        with open_file(filename, 'w+') as f:
             f.write('source' + sep + 'target' + sep + 'time' + '\n')
-            for time in self.ordered_times:
-                for (v, w, t) in self.time[time]:
-                    f.write(str(v) + sep + str(w) + sep + str(t)+'\n')
-
+            f.writelines(str(v) + sep + str(w) + sep + str(t) + '\n'
+                         for (v, w, t) in self.tedges)
 
     def filter_nodes(self, nodes):
         """Returns a copy of the temporal network where time-stamped edges are filtered 
@@ -316,12 +1081,9 @@ class TemporalNetwork:
         Returns
         -------
         """
-        def edge_filter(v, w, t):
-            if v in nodes and w in nodes: 
-                return True
-            return False
-
-        return self.filter_edges(edge_filter)
+        ids = [self._node_ids[v] for v in nodes if v in self._node_ids]
+        mask = _np.isin(self._sources, ids) & _np.isin(self._targets, ids)
+        return self._filter_mask(mask)
 
     def filter_edges(self, edge_filter):
         """Returns a copy of the temporal network where time-stamped edges are filtered 
@@ -340,18 +1102,20 @@ class TemporalNetwork:
         -------
 
         """
-        Log.add('Starting filtering ...', Severity.INFO)
-        new_t_edges = []
-
-        for (v, w, t) in self.tedges:
-            if edge_filter(v, w, t):
-                new_t_edges.append((v, w, t))
+        mask = _np.fromiter((bool(edge_filter(v, w, t)) for (v, w, t) in self.tedges),
+                            dtype=bool, count=self.ecount())
+        return self._filter_mask(mask)
 
-        n_filtered = self.ecount() - len(new_t_edges)
+    def _filter_mask(self, mask):
+        """Returns a copy of the temporal network that only contains the time-stamped
+        edges selected by a boolean mask."""
+        Log.add('Starting filtering ...', Severity.INFO)
+        network = TemporalNetwork._from_arrays(self._node_names, self._sources[mask],
+                                               self._targets[mask], self._times[mask])
+        n_filtered = self.ecount() - network.ecount()
         msg = 'finished. Filtered out {} time-stamped edges.'.format(n_filtered)
         Log.add(msg,  Severity.INFO)
-
-        return TemporalNetwork(tedges=new_t_edges)
+        return network
 
     def add_edge(self, source, target, ts, directed=True, timestamp_format='%Y-%m-%d %H:%M:%S'):
         """Adds a time-stamped edge (source,target;time) to the temporal network.
@@ -387,39 +1151,74 @@ class TemporalNetwork:
         else:
             t = ts
 
-        e = (source, target, t)
-        self.tedges.append(e)
-        if source not in self.nodes:
-            self.nodes.append(source)
-        if target not in self.nodes:
-            self.nodes.append(target)
+        for v in (source, target):
+            if v not in self._node_ids:
+                self._own_nodes()
+                self._node_ids[v] = len(self._node_names)
+                self._node_names.append(v)
 
-        # Add edge to index structures
-        self.time[t].append(e)
-        self.targets[t].setdefault(target, []).append(e)
-        self.sources[t].setdefault(source, []).append(e)
-
-        if t not in self.activities[source]:
-            self.activities[source].append(t)
-            self.activities[source].sort()
-
-        # Maintain order of time stamps
-        index = bisect.bisect_left(self.ordered_times, t)
-        # add if ts is not already in list
-        if index == len(self.ordered_times) or self.ordered_times[index] != t:
-            self.ordered_times.insert(index, t)
+        # the edge is merged into the sorted arrays when they are next accessed
+        self._pending.append((self._node_ids[source], self._node_ids[target], t))
+        self._indexes = {}
 
         # make edge undirected by adding another directed edge
         if not directed:
             self.add_edge(target, source, t)
 
+    def add_edges(self, sources, targets, times, directed=True,
+                  timestamp_format='%Y-%m-%d %H:%M:%S'):
+        """Adds multiple time-stamped edges (source,target;time) to the temporal network
+        at once, which is much faster than adding edges individually. The result is the
+        same as calling add_edge for each edge in the given order.
+
+        Parameters
+        ----------
+        sources: iterable
+            names of the source nodes of directed, time-stamped links
+        targets: iterable
+            names of the target nodes of directed, time-stamped links
+        times: iterable
+            time-stamps of the time-stamped links, given either as integers or
+            as strings
+        directed: bool
+        timestamp_format: string
+            if timestamps are passed as strings, the following timestamp format is used
+            to parse the timestamps in order to obtain UNIX timestamps (seconds since 1970).
+
+        Returns
+        -------
+
+        """
+        sources, targets, times = list(sources), list(targets), _np.asarray(times)
+        assert len(sources) == len(targets) == len(times), \
+            'Error: sources, targets and times must have the same length'
+
+        if times.dtype.kind in 'USO':
+            times, valid = _parse_timestamps(times, timestamp_format, {})
+            assert valid.all(), 'Error: could not parse timestamps'
+        else:
+            assert len(times) == 0 or times.dtype.kind in 'iu', \
+                'Timestamps must either be strings or integers'
+            times = times.astype(_np.int64)
+
+        # merge edges that have been added individually before
+        self._edge_columns()
+        self._own_nodes()
+
+        ids = _intern([v for pair in zip(sources, targets) for v in pair], self._node_ids)
+        self._node_names.extend(list(self._node_ids)[len(self._node_names):])
+        sources, targets = ids[0::2], ids[1::2]
+        if not directed:
+            sources, targets, times = _undirected(sources, targets, times)
+        self._merge_edges(sources, targets, times)
+
     def vcount(self):
         """Returns the number of vertices in the temporal network.
         This number corresponds to the number of nodes in the (first-order)
         time-aggregated network.
         """
 
-        return len(self.nodes)
+        return len(self._node_names)
 
     def ecount(self):
         """Returns the number of time-stamped edges (u,v;t) in the temporal network.
@@ -427,22 +1226,19 @@ class TemporalNetwork:
         time-aggregated network.
         """
 
-        return len(self.tedges)
+        return len(self._times)
 
     def observation_length(self):
         """Returns the length of the observation time in time units."""
 
-        return max(self.ordered_times)-min(self.ordered_times)
+        return int(self._times[-1] - self._times[0])
 
     def inter_event_times(self):
         """
         Returns an array containing all time differences between any
         two consecutive time-stamped links (involving any node)
         """
-        time_diffs = []
-        for i in range(1, len(self.ordered_times)):
-            time_diffs += [self.ordered_times[i] - self.ordered_times[i-1]]
-        return _np.array(time_diffs)
+        return _np.diff(self._index('time')[0])
 
     def inter_path_times(self):
         """Returns a dictionary which, for each node v, contains all time differences
@@ -450,16 +1246,26 @@ class TemporalNetwork:
         temporal network
         """
         ip_times = defaultdict(list)
-        for e in self.tedges:
-            # Get target v of current edge e=(u,v,t)
-            v = e[1]
-            t = e[2]
-
-            # Get time stamp of link (v,*,t_next)
-            # with smallest t_next such that t_next > t
-            i = bisect.bisect_right(self.activities[v], t)
-            if i != len(self.activities[v]):
-                ip_times[v].append(self.activities[v][i]-t)
+        if self.ecount() == 0:
+            return ip_times
+
+        # sort activities and time-stamped links by composite keys (node, time rank)
+        # and find the next activity of the target of each link via binary search
+        activity_times, indptr = self._index('activities')
+        activity_nodes = _np.repeat(_np.arange(self.vcount()), _np.diff(indptr))
+        unique_times = self._index('time')[0]
+        n_times = len(unique_times)
+        activity_keys = activity_nodes * n_times + _np.searchsorted(unique_times,
+                                                                    activity_times)
+        edge_keys = self._targets * n_times + _np.searchsorted(unique_times, self._times)
+        i = _np.searchsorted(activity_keys, edge_keys, side='right')
+        found = i < len(activity_keys)
+        found[found] = activity_nodes[i[found]] == self._targets[found]
+
+        names = self._node_names
+        diffs = activity_times[i[found]] - self._times[found]
+        for v, d in zip(self._targets[found].tolist(), diffs.tolist()):
+            ip_times[names[v]].append(d)
         return ip_times
 
     def summary(self):
@@ -529,92 +1335,133 @@ class TemporalNetwork:
         -------
 
         """
-        tedges = []
-
-        if window_splits is None:
-            window_splits = [max(self.time)]
-        else:
-            window_splits.append(max(self.time))
-
-        window_min = min(self.time)-1
+        return self._shuffle_edges(_np.random, l, with_replacement, window_splits,
+                                   maintain_undirected)
+
+    def _shuffle_edges(self, random, l=0, with_replacement=False, window_splits=None,
+                       maintain_undirected=True):
+        """Implements shuffle_edges, where random numbers are drawn from random, which is
+        either numpy.random or a numpy.random.RandomState."""
+        sources, targets, times = self._edge_columns()
+        shuffled = []
+
+        window_splits = list(window_splits or []) + [times[-1]]
+        window_min = times[0] - 1
         for window_max in window_splits:
+            start = _np.searchsorted(times, window_min, side='right')
+            end = _np.searchsorted(times, window_max, side='right')
+            window_min = window_max
+            if end <= start:
+                continue
+            window = (sources[start:end], targets[start:end], times[start:end])
 
-            timestamps = []
-            edges = []
-            for e in self.tedges:
-                if window_min < e[2] <= window_max:
-                    timestamps.append(e[2])
-                    edges.append(e)
-
-            if l == 0:
-                l = len(edges)
             if with_replacement:  # sample l edges with replacement
-                for i in range(l):
-                    # Pick random link
-                    edge = edges[_np.random.randint(0, len(edges))]
-                    # Pick random time stamp
-                    time = timestamps[_np.random.randint(0, len(timestamps))]
-                    # Generate new time-stamped link
-                    tedges.append((edge[0], edge[1], time))
+                n = l if l > 0 else end - start
+                edges = random.randint(0, end - start, size=n)
+                new_times = window[2][random.randint(0, end - start, size=n)]
+                shuffled.append((window[0][edges], window[1][edges], new_times))
             else:
-                # shuffle edges while avoiding multiple identical edges at same time stamp
-                i = 0
-                while i < l:
-                    # Pick random link
-                    edge = edges.pop(_np.random.randint(0, len(edges)))
-
-                    # Pick random time stamp
-                    time = timestamps.pop(_np.random.randint(0, len(timestamps)))
-                    rewired = False
-
-                    # for undirected edges, rewire both directed edges at once
-                    if maintain_undirected and (edge[1], edge[0], edge[2]) in edges:
-
-                        # check whether one of the time-stamped edges already exists
-                        if (
-                                (edge[0], edge[1], time) not in tedges and
-                                (edge[1], edge[0], time) not in tedges
-                        ):
-                            tedges.append((edge[0], edge[1], time))
-                            tedges.append((edge[1], edge[0], time))
-                            edges.remove((edge[1], edge[0], edge[2]))
-                            rewired = True
-
-                    # rewire a single directed edge individually
-                    elif (edge[0], edge[1], time) not in tedges:
-                        tedges.append((edge[0], edge[1], time))
-                        rewired = True
-
-                    # edge could not be rewired to the chosen time stamp, so re-append
-                    # both to the list for future sampling
-                    if not rewired:
-                        edges.append(edge)
-                        timestamps.append(time)
-                    else:
-                        i += 1
+                shuffled.append(_shuffle_window(*window, l=l,
+                                                maintain_undirected=maintain_undirected,
+                                                random=random))
 
-            window_min = window_max
+        # Generate temporal network with the node order of the original network
+        t = TemporalNetwork()
+        t._node_names = list(self._node_names)
+        t._node_ids = dict(self._node_ids)
+        if shuffled:
+            t._set_edges(*(_np.concatenate(c) for c in zip(*shuffled)))
+        return t
 
-        # Generate temporal network
-        t = TemporalNetwork(tedges=tedges)
+    def shuffled_ensemble(self, size, statistic=None, reducer=None, initial=None,
+                          seed=None, max_workers=None, **kwargs):
+        """Generates an ensemble of shuffled versions of the temporal network (see
+        shuffle_edges), e.g. to compare path statistics with those of a null model.
 
-        # Fix node order to correspond to original network
-        t.nodes = self.nodes
-        return t
+        Each shuffled network is generated (and evaluated) in a worker process with its
+        own random stream spawned from the given seed, so that results are reproducible
+        independently of the number of workers. Results are streamed in order to the
+        reducer as soon as they are available, such that neither all shuffled networks
+        nor all of their statistics need to be held in memory at once.
+
+            >>> ensemble = tn.shuffled_ensemble(
+            ...     100, statistic=functools.partial(
+            ...         pathpy.path_extraction.paths_from_temporal_network_dag, delta=5),
+            ...     reducer=operator.add)
+
+        Parameters
+        ----------
+        size: int
+            the number of shuffled networks, which must be positive
+        statistic: callable
+            a function that is applied to each shuffled network in the worker process,
+            e.g. to extract path statistics. For the default value None, the shuffled
+            networks themselves are returned.
+        reducer: callable
+            a function reducer(result, x) that combines the result accumulated so far
+            with the statistic x of the next shuffled network and returns the new
+            result. For the default value None, a list of all statistics is returned.
+        initial:
+            the initial value of the result passed to the reducer. For the default value
+            None, the statistic of the first shuffled network is used.
+        seed: int
+            the seed of the random streams. Default is None.
+        max_workers: int
+            the number of worker processes. For the default value None, shuffled networks
+            are generated sequentially unless pathpy.ENABLE_MULTICORE_SUPPORT is set, in
+            which case one process per CPU is used.
+        kwargs:
+            further arguments passed to shuffle_edges, i.e. l, with_replacement,
+            window_splits and maintain_undirected
+
+        Returns
+        -------
+        the reduced result, or a list of the statistics of all shuffled networks
+        """
+        from pathpy import ENABLE_MULTICORE_SUPPORT
+
+        assert size > 0, 'Error: the size of an ensemble must be positive'
+        if max_workers is None and ENABLE_MULTICORE_SUPPORT:
+            max_workers = os.cpu_count()
+
+        ensemble = (self, statistic, kwargs)
+        seeds = _np.random.SeedSequence(seed).spawn(size)
+
+        statistics = self._ensemble_statistics(ensemble, seeds, max_workers)
+        if reducer is None:
+            result = list(statistics)
+        elif initial is None:
+            result = reduce(reducer, statistics)
+        else:
+            result = reduce(reducer, statistics, initial)
+        Log.add('finished generating {} shuffled networks.'.format(size))
+        return result
+
+    @staticmethod
+    def _ensemble_statistics(ensemble, seeds, max_workers):
+        """Yields the statistics of the shuffled networks generated from the given seeds
+        in order, where at most 2 * max_workers results are in progress (or buffered)
+        at any time.
+        """
+        if max_workers is None or max_workers <= 1:
+            for s in seeds:
+                yield _shuffle_and_evaluate(ensemble, s)
+            return
+
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context(),
+                                 initializer=_init_ensemble_worker,
+                                 initargs=ensemble) as pool:
+            yield from bounded_map(pool, _shuffled_statistic, seeds, 2 * max_workers)
 
     def reverse_time(self):
         """
         Returns a copy of the temporal network in which time has been reversed
         """
         t = TemporalNetwork()
-        t_reversed = self.ordered_times.copy()
-        t_reversed.reverse()
-        time_r = 1
-        for i in range(len(t_reversed)):
-            if i > 0:
-                time_r += abs(t_reversed[i] - t_reversed[i-1])
-            for (v, w, x) in self.time[t_reversed[i]]:
-                t.add_edge(v, w, time_r)
+        if self.ecount() > 0:
+            t._node_names = list(self._node_names)
+            t._node_ids = dict(self._node_ids)
+            t._set_edges(self._sources, self._targets, 1 + self._times[-1] - self._times)
         return t
 
     def _repr_html_(self):
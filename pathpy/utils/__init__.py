@@ -8,3 +8,4 @@ from .exceptions import EmptySCCError
 from .exceptions import PathpyNotImplemented
 from .exceptions import PathsTooShort
 from .exceptions import PathpyError
+from .files import open_file
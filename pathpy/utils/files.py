@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+#    pathpy is an OpenSource python package for the analysis of time series data
+#    on networks using higher- and multi order graphical models.
+#
+#    Copyright (C) 2016-2018 Ingo Scholtes, ETH Zürich/Universität Zürich
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#    Contact the developer:
+#
+#    E-mail: scholtes@ifi.uzh.ch
+#    Web:    http://www.ingoscholtes.net
+
+"""
+Helper functions to read and write (compressed) text files.
+"""
+
+import bz2
+import gzip
+import lzma
+
+
+# the functions used to open compressed files with a given extension
+_COMPRESSION = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+
+
+def open_file(filename, mode='r'):
+    """Opens a text file, which is transparently (de)compressed with gzip, bz2 or
+    lzma if the filename ends with .gz, .bz2 or .xz respectively.
+
+    Parameters
+    ----------
+    filename: str
+        the name of the file
+    mode: str
+        the mode in which the file is opened, i.e. 'r', 'w', 'a' or 'w+'.
+        Default is 'r'.
+
+    Returns
+    -------
+    file object
+    """
+    for extension, open_compressed in _COMPRESSION.items():
+        if filename.endswith(extension):
+            return open_compressed(filename, mode.replace('+', '') + 't')
+    return open(filename, mode)
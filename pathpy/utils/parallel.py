@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+#    pathpy is an OpenSource python package for the analysis of time series data
+#    on networks using higher- and multi order graphical models.
+#
+#    Copyright (C) 2016-2018 Ingo Scholtes, ETH Zürich/Universität Zürich
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#    Contact the developer:
+#
+#    E-mail: scholtes@ifi.uzh.ch
+#    Web:    http://www.ingoscholtes.net
+
+"""
+Helper functions for worker processes.
+"""
+
+import multiprocessing
+from collections import deque
+
+
+def mp_context():
+    """Returns the fork context for worker processes if it is available, so that
+    workers share the memory of the parent process, or None otherwise.
+    """
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return None  # pragma: no cover
+
+
+def bounded_map(pool, func, items, max_pending):
+    """Submits func(item) for all items to a pool of workers and yields the results in
+    the order of items, where at most max_pending results are in progress (or buffered)
+    at any time, so that results can be consumed while they are computed.
+
+    Parameters
+    ----------
+    pool: concurrent.futures.Executor
+        the pool of workers
+    func: callable
+        the function to apply to each item
+    items: iterable
+        the items
+    max_pending: int
+        the maximum number of submitted items whose results have not been yielded
+
+    Returns
+    -------
+    generator
+    """
+    pending = deque()
+    for item in items:
+        if len(pending) == max_pending:
+            yield pending.popleft().result()
+        pending.append(pool.submit(func, item))
+    while pending:
+        yield pending.popleft().result()
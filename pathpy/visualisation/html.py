@@ -468,8 +468,11 @@ def _generate_html_tempnet(tempnet, **params):
     if 'max_time' not in params:
         params['max_time'] = None
 
+    nodes = tempnet.nodes
     if params['max_time'] is not None:
-        tempnet = tempnet.filter_edges(lambda u, v, t: t <= params['max_time'])
+        tempnet = tempnet.slice(t_end=params['max_time'] + 1)
+        active = {v for e in tempnet.tedges for v in e[:2]}
+        nodes = [v for v in nodes if v in active]
 
     # auto-adjust simulation speed to temporal characteristics
     if params['ts_per_frame'] == 0:
@@ -499,7 +502,7 @@ def _generate_html_tempnet(tempnet, **params):
 
     network_data = {
         'nodes': [{'id': fix_node_name(v),
-                   'group': 1} for v in tempnet.nodes],
+                   'group': 1} for v in nodes],
         'links': [{'source': fix_node_name(s),
                    'target': fix_node_name(v),
                    'width': 1,
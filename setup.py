@@ -11,7 +11,7 @@ with open('README.rst', encoding='utf-8') as readme_file, open('HISTORY.rst', en
     readme = readme_file.read()
     history = history_file.read()
 
-install_requirements = ['numpy', 'scipy']
+install_requirements = ['numpy>=1.20', 'scipy']
 
 setup_requirements = ['pytest-runner']
 
@@ -25,15 +25,14 @@ setup(
         'Topic :: Scientific/Engineering :: Artificial Intelligence',
         'License :: OSI Approved :: GNU Affero General Public License v3 or later (AGPLv3+)',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.7',
     ],
     description="An OpenSource python package for the analysis and visualisation of time series data on"
                 " complex networks with higher- and multi-order graphical models.",
     install_requires=install_requirements,
     setup_requires=setup_requirements,
     long_description=readme + '\n\n' + history,
-    python_requires='>=3.5',
+    python_requires='>=3.7',
     keywords='network analysis temporal networks pathways sequence modeling graph mining',
     name='pathpy2',
     packages=find_packages(),
@@ -207,3 +207,177 @@ def test_d3_html(random_paths, tmpdir):
     p = random_paths(50, 10, 20)
     hon = pp.HigherOrderNetwork(p, k=3)
     pp.visualisation.export_html(hon, file_path)
+
+
+@pytest.mark.parametrize('k', (1, 2, 3))
+def test_likelihood(random_paths, k):
+    p = random_paths(30, 10, 8)
+    hon = pp.HigherOrderNetwork(p, k=k)
+    T = hon.transition_matrix()
+    node_map = hon.node_to_name_map()
+
+    expected = 0.0
+    for l in p.paths:
+        if l < k:
+            continue
+        for path, weight in p.paths[l].items():
+            if weight[1] > 0:
+                nodes = hon.path_to_higher_order_nodes(path)
+                for v, w in zip(nodes[:-1], nodes[1:]):
+                    expected += np.log(T[node_map[w], node_map[v]]) * weight[1]
+
+    L, path_L = hon.likelihood(p, per_path=True)
+    assert L == pytest.approx(expected)
+    assert sum(path_L[x] * p.paths[len(x) - 1][x][1] for x in path_L) == pytest.approx(L)
+    assert hon.likelihood(p, log=False) == pytest.approx(np.exp(expected))
+
+
+@pytest.mark.parametrize('k', (0, 1, 2, 3))
+def test_matrix_only(random_paths, k):
+    p = random_paths(30, 10, 8)
+    hon = pp.HigherOrderNetwork(p, k=k)
+    hon_m = pp.HigherOrderNetwork(p, k=k, matrix_only=True)
+
+    assert hon_m.node_to_name_map() == hon.node_to_name_map()
+    assert hon_m.ncount() == hon.ncount()
+    assert hon_m.ecount() == hon.ecount()
+    assert hon_m.degrees_of_freedom() == hon.degrees_of_freedom()
+    assert np.allclose(hon_m.total_edge_weight(), hon.total_edge_weight())
+    for sub in (True, False):
+        assert np.allclose(hon_m.transition_matrix(sub).toarray(),
+                           hon.transition_matrix(sub).toarray())
+        assert np.allclose(hon_m.adjacency_matrix(sub).toarray(),
+                           hon.adjacency_matrix(sub).toarray())
+    if k > 0:
+        assert hon_m.likelihood(p) == pytest.approx(hon.likelihood(p))
+    # none of the above requires the network view
+    assert hon_m._pending_view
+
+    # the network view is created on first access
+    assert list(hon_m.nodes) == list(hon.nodes)
+    assert not hon_m._pending_view
+    for v in hon.nodes:
+        assert np.allclose(hon_m.nodes[v]['outweight'], hon.nodes[v]['outweight'])
+        assert np.allclose(hon_m.nodes[v]['inweight'], hon.nodes[v]['inweight'])
+        assert hon_m.successors[v] == hon.successors[v]
+    assert set(hon_m.edges) == set(hon.edges)
+
+
+@pytest.mark.parametrize('k', (2, 3))
+@pytest.mark.parametrize('pruning', (
+        {'min_support': 2}, {'top_n': 1}, {'min_deviation': 0.3}))
+def test_pruning(random_paths, k, pruning):
+    p = random_paths(30, 10, 8)
+    hon = pp.HigherOrderNetwork(p, k=k)
+    hon_p = pp.HigherOrderNetwork(p, k=k, **pruning)
+    g1 = pp.HigherOrderNetwork(p, k=1)
+
+    assert hon_p.is_pruned
+    assert set(hon_p.edges) <= set(hon.edges)
+    assert hon_p.dof_paths <= hon.dof_paths
+    if 'top_n' in pruning:
+        assert all(len(hon_p.successors[v]) <= 1 for v in hon_p.nodes)
+
+    # every k-th order node has a proper transition distribution
+    for v in hon.nodes:
+        prefix = tuple(v.split(hon.separator))
+        successors = [prefix + (w,) for w in g1.successors[prefix[-1]]]
+        if successors:
+            probs, _ = hon_p._transition_probabilities(successors)
+            assert probs.sum() == pytest.approx(1.0)
+
+    # retained transitions keep their maximum likelihood estimates
+    T, T_p = hon.transition_matrix(), hon_p.transition_matrix()
+    node_map, node_map_p = hon.node_to_name_map(), hon_p.node_to_name_map()
+    for v, w in hon_p.edges:
+        assert T_p[node_map_p[w], node_map_p[v]] == pytest.approx(T[node_map[w], node_map[v]])
+
+    assert hon_p.likelihood(p) <= 0
+
+
+@pytest.mark.parametrize('k', (2, 3))
+def test_pruning_permissive(random_paths, k):
+    p = random_paths(30, 10, 8)
+    hon = pp.HigherOrderNetwork(p, k=k)
+    hon_p = pp.HigherOrderNetwork(p, k=k, min_support=0, matrix_only=True)
+
+    assert set(hon_p.edges) == {e for e in hon.edges if hon.edges[e]['weight'].sum() > 0}
+    assert hon_p.likelihood(p) == pytest.approx(hon.likelihood(p))
+
+
+@pytest.mark.parametrize('k,null_model', ((0, False), (1, False), (2, False), (3, False),
+                                          (2, True)))
+def test_mmap_dir(random_paths, tmpdir, k, null_model):
+    p = random_paths(30, 10, 8)
+    hon = pp.HigherOrderNetwork(p, k=k, null_model=null_model)
+    hon_d = pp.HigherOrderNetwork(p, k=k, null_model=null_model, mmap_dir=str(tmpdir),
+                                  chunk_size=7)
+
+    assert hon_d.node_to_name_map() == hon.node_to_name_map()
+    assert hon_d.degrees_of_freedom() == hon.degrees_of_freedom()
+    with open(str(tmpdir.join('nodes.txt'))) as f:
+        assert f.read().splitlines() == list(hon.nodes)
+
+    # matrices are backed by the memory-mapped link arrays
+    T = hon_d.transition_matrix()
+    assert np.shares_memory(T.indices, hon_d._edge_targets)
+    assert np.shares_memory(T.data, hon_d._transition_data)
+    for sub in (True, False):
+        assert np.allclose(T.toarray() if sub else hon_d.transition_matrix(sub).toarray(),
+                           hon.transition_matrix(sub).toarray())
+        for transposed in (True, False):
+            assert np.allclose(hon_d.adjacency_matrix(sub, transposed=transposed).toarray(),
+                               hon.adjacency_matrix(sub, transposed=transposed).toarray())
+    if k > 0 and not null_model:
+        assert hon_d.likelihood(p) == pytest.approx(hon.likelihood(p))
+    if k in (1, 2) and not null_model:
+        ev, ev_d = pp.algorithms.centralities.eigenvector(hon), \
+            pp.algorithms.centralities.eigenvector(hon_d)
+        assert all(ev_d[v] == pytest.approx(ev[v]) for v in ev)
+    assert hon_d._pending_view
+
+
+@pytest.mark.parametrize('k', (0, 1, 2))
+def test_predict_next(random_paths, k):
+    p = random_paths(30, 10, 8)
+    hon = pp.HigherOrderNetwork(p, k=k)
+    T = hon.transition_matrix()
+    node_map = hon.node_to_name_map()
+
+    prefixes = [hon.higher_order_node_to_path(v) for v in hon.nodes] if k > 0 else [()]
+    for prefix in prefixes:
+        v = hon.separator.join(prefix) if k > 0 else 'start'
+        probs = sorted((T[node_map[w], node_map[v]] for w in hon.successors[v]), reverse=True)
+        probs = [x for x in probs if x > 0]
+
+        prediction = hon.predict_next(prefix, top_k=3)
+        assert np.allclose([x for _, x in prediction], probs[:3])
+        for w, x in prediction:
+            w = hon.separator.join(prefix[1:] + (w,)) if k > 0 else w
+            assert T[node_map[w], node_map[v]] == pytest.approx(x)
+
+    if k > 0:
+        assert hon.predict_next(('x',) * k) == []
+    assert hon.predict_next_batch(prefixes, 2) == [hon.predict_next(x, 2) for x in prefixes]
+
+
+@pytest.mark.parametrize('k', (1, 2, 3))
+def test_save_load(random_paths, k, tmpdir):
+    p = random_paths(40, 20, 6)
+    hon = pp.HigherOrderNetwork(p, k=k)
+    hon.save(str(tmpdir))
+    loaded = pp.HigherOrderNetwork.load(str(tmpdir))
+
+    assert loaded.order == k
+    assert loaded.degrees_of_freedom() == hon.degrees_of_freedom()
+    assert loaded.degrees_of_freedom('ngrams') == hon.degrees_of_freedom('ngrams')
+    T = loaded.transition_matrix()
+    assert (T != hon.transition_matrix()).nnz == 0
+    assert (loaded.adjacency_matrix() != hon.adjacency_matrix()).nnz == 0
+
+    # the network view is created from the memory-mapped arrays
+    assert loaded.nodes.keys() == hon.nodes.keys()
+    for e in hon.edges:
+        assert np.all(loaded.edges[e]['weight'] == hon.edges[e]['weight'])
+    for v in hon.nodes:
+        assert np.all(loaded.nodes[v]['outweight'] == hon.nodes[v]['outweight'])
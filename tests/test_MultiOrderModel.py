@@ -17,22 +17,31 @@ def test_init(random_paths, k):
     assert len(multi.layers) == k+1
 
 
-# @pytest.mark.slow
-# @pytest.mark.parametrize('k', (1, 2))
-# def test_parallel(random_paths, k):
-#     """assert that the parallel calculation is equal to the
-#     sequential"""
-#     p = random_paths(90, 0, 20)
-#     multi_seq = pp.MultiOrderModel(p, max_order=k)
-#
-#     pp.ENABLE_MULTICORE_SUPPORT = True
-#     assert pp.ENABLE_MULTICORE_SUPPORT
-#
-#     multi_parallel = pp.MultiOrderModel(p, max_order=k)
-#
-#     assert multi_parallel.model_size(k) == multi_seq.model_size(k)
-#     for k in multi_parallel.transition_matrices:
-#         assert np.sum(multi_parallel.transition_matrices[k] - multi_seq.transition_matrices[k]) == pytest.approx(0)
+@pytest.mark.parametrize('k', (1, 2, 3))
+def test_parallel(random_paths, k):
+    """assert that the parallel calculation is equal to the
+    sequential"""
+    p = random_paths(90, 0, 20)
+    multi_seq = pp.MultiOrderModel(p, max_order=k)
+    multi_parallel = pp.MultiOrderModel(p, max_order=k, max_workers=2)
+
+    assert multi_parallel.model_size(k) == multi_seq.model_size(k)
+    assert multi_parallel.degrees_of_freedom() == multi_seq.degrees_of_freedom()
+    assert multi_parallel.likelihood(p) == pytest.approx(multi_seq.likelihood(p))
+    for k in multi_parallel.transition_matrices:
+        assert np.sum(multi_parallel.transition_matrices[k] - multi_seq.transition_matrices[k]) == pytest.approx(0)
+        assert list(multi_parallel.layers[k].nodes) == list(multi_seq.layers[k].nodes)
+        assert multi_parallel.layers[k].paths is p
+
+
+def test_parallel_mmap_dir(random_paths, tmpdir):
+    p = random_paths(20, 40, 6)
+    multi = pp.MultiOrderModel(p, max_order=3)
+    multi_d = pp.MultiOrderModel(p, max_order=3, mmap_dir=str(tmpdir), max_workers=2)
+
+    assert isinstance(multi_d.layers[3]._edge_targets, np.memmap)
+    assert multi_d.likelihood(p) == pytest.approx(multi.likelihood(p))
+    assert multi_d.estimate_order() == multi.estimate_order()
 
 
 # TODO: how to properly test this function?
@@ -69,6 +78,25 @@ def test_write_state_file(random_paths, k, tmpdir):
         multi.save_state_file(file_path + '.' + str(i), layer=i)
 
 
+@pytest.mark.parametrize('extension', ('', '.gz', '.bz2'))
+def test_write_state_file_all_layers(random_paths, extension, tmpdir):
+    file_path = str(tmpdir.join("multi_order_state" + extension))
+    p = random_paths(20, 40, 6)
+    multi = pp.MultiOrderModel(p, max_order=3)
+    multi.save_state_file(file_path)
+
+    with pp.utils.open_file(file_path) as f:
+        lines = f.read().splitlines()
+    header = {line.split()[0]: i for i, line in enumerate(lines) if line.startswith('*')}
+    n_states = sum(multi.layers[k].ncount() for k in (1, 2, 3))
+    n_links = sum(multi.transition_matrices[k].nnz for k in (1, 2, 3))
+    assert lines[header['*States']] == '*States %d' % n_states
+    assert lines[header['*Links']] == '*Links %d' % n_links
+    states = [line.split()[0] for line in lines[header['*States'] + 1:header['*Links']]]
+    assert sorted(map(int, states)) == list(range(n_states))
+    assert len(lines) == header['*Links'] + n_links + 1
+
+
 def test_estimate_order_1():
     """Example without second-order correlations"""
     paths = pp.Paths()
@@ -143,3 +171,291 @@ def test_single_path_likelihood(random_paths):
         path_likelihoods.append((lkl, p))
 
     assert max(path_likelihoods)[1] == ('23', '32', '19', '8')
+
+
+def test_matrix_only(random_paths):
+    p = random_paths(20, 40, 6)
+    multi = pp.MultiOrderModel(p, max_order=3)
+    multi_m = pp.MultiOrderModel(p, max_order=3, matrix_only=True)
+
+    assert multi_m.likelihood(p) == pytest.approx(multi.likelihood(p))
+    assert multi_m.degrees_of_freedom() == multi.degrees_of_freedom()
+    assert multi_m.estimate_order() == multi.estimate_order()
+    assert all(layer._pending_view for layer in multi_m.layers.values())
+
+
+def test_pruning(random_paths):
+    p = random_paths(20, 40, 6)
+    multi = pp.MultiOrderModel(p, max_order=3)
+    multi_p = pp.MultiOrderModel(p, max_order=3, min_support=0)
+
+    assert not multi_p.layers[1].is_pruned
+    assert all(multi_p.layers[k].is_pruned for k in (2, 3))
+    assert multi_p.likelihood(p) == pytest.approx(multi.likelihood(p))
+
+    multi_p = pp.MultiOrderModel(p, max_order=3, top_n=1)
+    assert multi_p.likelihood(p) <= 0
+    assert multi_p.estimate_order() in range(4)
+
+
+def test_mmap_dir(random_paths, tmpdir):
+    p = random_paths(20, 40, 6)
+    multi = pp.MultiOrderModel(p, max_order=3)
+    multi_d = pp.MultiOrderModel(p, max_order=3, mmap_dir=str(tmpdir))
+
+    assert sorted(tmpdir.listdir()) == [tmpdir.join('layer_%d' % k) for k in range(4)]
+    assert multi_d.likelihood(p) == pytest.approx(multi.likelihood(p))
+    assert multi_d.degrees_of_freedom() == multi.degrees_of_freedom()
+    assert multi_d.estimate_order() == multi.estimate_order()
+
+
+def test_predict_next():
+    p = pp.Paths()
+    p.add_path('a,b,c', frequency=3)
+    p.add_path('x,b,d', frequency=2)
+    p.add_path('y,e,f,g', frequency=1)
+    multi = pp.MultiOrderModel(p, max_order=2)
+
+    assert multi.predict_next(('a', 'b'), top_k=2) == [('c', 1.0)]
+    assert multi.predict_next(('x', 'b'), top_k=2) == [('d', 1.0)]
+    # back-off to the first-order layer
+    assert multi.predict_next(('e', 'y', 'b'), top_k=2) == [('c', 0.6), ('d', 0.4)]
+    # back-off to the zero-order layer
+    assert multi.predict_next(('c',))[0][0] == 'b'
+    assert multi.predict_next_batch([('a', 'b'), ('b',)]) == [[('c', 1.0)], [('c', 0.6)]]
+
+    multi.add_layers(3)
+    assert multi._prediction_cache is None
+
+
+@pytest.mark.parametrize('pruning', ({}, {'top_n': 1}))
+def test_layer_likelihood(random_paths, pruning):
+    p = random_paths(20, 40, 6)
+    multi = pp.MultiOrderModel(p, max_order=3, **pruning)
+
+    for l in range(4):
+        for consider_longer_paths in (True, False):
+            max_len = max(p.paths) if consider_longer_paths else l
+            expected, n_expected = 0, 0
+            for k in range(l, max_len + 1):
+                for path, weight in p.paths[k].items():
+                    if weight[1] > 0:
+                        expected += multi.path_likelihood(path, weight[1], layer=l)
+                        n_expected += weight[1]
+            L, n = multi.layer_likelihood(p, l, consider_longer_paths)
+            assert L == pytest.approx(expected)
+            assert n == n_expected
+
+    q = pp.Paths()
+    q.add_path(('x', 'y', 'z'))
+    with pytest.raises(pp.utils.PathpyNotImplemented):
+        multi.layer_likelihood(q, 2)
+
+
+def test_estimate_order_layer_terms(random_paths, monkeypatch):
+    p = random_paths(20, 40, 6)
+    multi = pp.MultiOrderModel(p, max_order=3)
+    expected = multi.estimate_order()
+
+    calls = []
+    layer_likelihood = pp.MultiOrderModel._path_log_likelihoods
+
+    def counting(self, X, names, layer, index_maps):
+        calls.append((layer, X.shape[1] - 1))
+        return layer_likelihood(self, X, names, layer, index_maps)
+
+    monkeypatch.setattr(pp.MultiOrderModel, '_path_log_likelihoods', counting)
+    assert multi.estimate_order() == expected
+    # every layer term is computed only once
+    assert len(calls) == len(set(calls))
+    assert multi._layer_terms is None
+
+
+@pytest.mark.parametrize('pruning', ({}, {'top_n': 1}))
+def test_parallel_likelihood(random_paths, pruning):
+    p = random_paths(40, 40, 6)
+    multi = pp.MultiOrderModel(p, max_order=3, **pruning)
+    multi_parallel = pp.MultiOrderModel(p, max_order=3, max_workers=3, **pruning)
+
+    for k in range(4):
+        assert multi_parallel.likelihood(p, max_order=k) == multi.likelihood(p, max_order=k)
+    assert multi_parallel.estimate_order() == multi.estimate_order()
+
+
+@pytest.mark.parametrize('options', ({}, {'matrix_only': True}, {'top_n': 1}))
+@pytest.mark.parametrize('topology', ('same', 'new_links', 'new_nodes'))
+def test_update(random_paths, options, topology):
+    import copy
+    p1 = random_paths(40, 20, 6)
+    if topology == 'same':
+        p2 = copy.deepcopy(p1)
+    else:
+        p2 = random_paths(10, 1, 8 if topology == 'new_nodes' else 6)
+    expected = pp.MultiOrderModel(p1 + p2, max_order=3, **options)
+
+    multi = pp.MultiOrderModel(copy.deepcopy(p1), max_order=3, **options)
+    assert multi._changes_topology(p2) == (topology != 'same')
+    multi.update(p2)
+
+    for k in range(4):
+        assert multi.layers[k].degrees_of_freedom() == expected.layers[k].degrees_of_freedom()
+        T = multi.transition_matrices[k].toarray()
+        T_expected = expected.transition_matrices[k].toarray()
+        node_map = multi.layers[k].node_to_name_map()
+        expected_map = expected.layers[k].node_to_name_map()
+        order = [node_map[v] for v in expected_map]
+        assert T[order][:, order] == pytest.approx(T_expected)
+    assert multi.likelihood(p1 + p2) == pytest.approx(expected.likelihood(p1 + p2))
+    assert multi.predict_next(('0',)) == expected.predict_next(('0',))
+
+
+def test_smoothed_likelihood(random_paths):
+    p = random_paths(40, 20, 6)
+    multi = pp.MultiOrderModel(p, max_order=3)
+    likelihoods = multi._smoothed_likelihoods(p, 1e-12, 6)
+    for k in range(4):
+        assert likelihoods[k] == pytest.approx(multi.likelihood(p, max_order=k))
+
+    # unseen nodes and transitions have a smoothed probability > 0
+    q = pp.Paths()
+    q.add_path(('x', 'y', 'z'))
+    assert np.isfinite(multi._smoothed_likelihoods(q, 0.1, 9)).all()
+
+
+@pytest.mark.parametrize('pruning', ({}, {'top_n': 1}))
+def test_cross_validate(random_paths, pruning):
+    p = random_paths(40, 20, 6)
+    multi = pp.MultiOrderModel(p, max_order=2, **pruning)
+
+    results = multi.cross_validate(folds=4, seed=1)
+    assert sorted(results) == [0, 1, 2]
+    for k in results:
+        assert results[k].shape == (4,)
+        assert (results[k] < 0).all()
+    assert multi.cross_validate(folds=4, seed=1, max_workers=2)[2] == pytest.approx(results[2])
+
+    results = multi.cross_validate(test_size=0.3, seed=1)
+    assert results[1].shape == (1,)
+
+
+@pytest.mark.parametrize('options', ({}, {'matrix_only': True}, {'top_n': 1}, {'mmap_dir': True}))
+def test_save_load(random_paths, options, tmpdir):
+    import pickle
+    p = random_paths(40, 20, 6)
+    if options.get('mmap_dir'):
+        options = {'mmap_dir': str(tmpdir.join('mmap'))}
+    multi = pp.MultiOrderModel(p, max_order=3, **options)
+
+    directories = [str(tmpdir.join('model'))]
+    if 'mmap_dir' in options:
+        # saving a disk-backed model in its own directory keeps the link files
+        directories.append(options['mmap_dir'])
+    for directory in directories:
+        multi.save(directory)
+        loaded = pp.MultiOrderModel.load(directory, paths=p)
+
+        assert loaded.max_order == 3
+        for k in range(4):
+            assert loaded.layers[k]._is_disk_backed()
+            assert loaded.layers[k].node_to_name_map() == multi.layers[k].node_to_name_map()
+            assert (loaded.transition_matrices[k] != multi.transition_matrices[k]).nnz == 0
+            assert loaded.degrees_of_freedom(k) == multi.degrees_of_freedom(k)
+        assert loaded.likelihood() == pytest.approx(multi.likelihood())
+        assert loaded.estimate_order() == multi.estimate_order()
+        assert loaded.predict_next(('0', '1'), top_k=3) == multi.predict_next(('0', '1'), top_k=3)
+
+        unpickled = pickle.loads(pickle.dumps(loaded))
+        assert unpickled.likelihood() == pytest.approx(multi.likelihood())
+
+
+@pytest.mark.parametrize('pruning', ({}, {'top_n': 1}))
+def test_estimate_order_lazy(random_paths, pruning):
+    p = random_paths(40, 20, 6)
+    expected = pp.MultiOrderModel(p, max_order=4, **pruning).estimate_order()
+
+    multi = pp.MultiOrderModel(p, max_order=1, **pruning)
+    assert multi.estimate_order(stop_at_order=4, lazy=True) == expected
+    # layers are not added to the model
+    assert multi.max_order == 1
+
+    multi = pp.MultiOrderModel(p, max_order=2, **pruning)
+    assert multi.estimate_order(stop_at_order=4, lazy=True) == expected
+    assert multi.max_order == 2
+
+
+def test_estimate_order_release_layers(random_paths):
+    p = random_paths(40, 20, 6)
+    multi = pp.MultiOrderModel(p, max_order=4)
+    order = multi.estimate_order(release_layers=True)
+    assert multi.max_order == order
+    assert sorted(multi.transition_matrices) == list(range(order + 1))
+
+
+def test_resampling_test():
+    paths = pp.Paths()
+    paths.add_path('a,c')
+    paths.add_path('b,c')
+    for k in range(10):
+        paths.add_path('a,c,d')
+        paths.add_path('b,c,e')
+    multi = pp.MultiOrderModel(paths, max_order=2)
+    for method in ('bootstrap', 'permutation'):
+        _, p = multi.resampling_test(method=method, samples=40, seed=1)
+        assert p == pytest.approx(1 / 41)
+
+    paths.add_path('a,c,e', frequency=10)
+    paths.add_path('b,c,d', frequency=10)
+    multi = pp.MultiOrderModel(paths, max_order=2)
+    for method in ('bootstrap', 'permutation'):
+        reject, p = multi.resampling_test(method=method, samples=40, seed=1)
+        assert not reject
+        assert p > 0.5
+
+
+@pytest.mark.parametrize('method', ('bootstrap', 'permutation'))
+def test_resampling_test_parallel(random_paths, method):
+    p = random_paths(40, 20, 6)
+    multi = pp.MultiOrderModel(p, max_order=2)
+    expected = multi.resampling_test(0, 2, method=method, samples=10, seed=3)
+    assert multi.resampling_test(0, 2, method=method, samples=10, seed=3,
+                                 max_workers=3) == expected
+
+
+@pytest.mark.parametrize('k0', (0, 1, 2))
+def test_path_sampler(random_paths, k0):
+    from pathpy.classes.multi_order_model import _PathSampler
+    p = random_paths(40, 20, 6)
+    multi = pp.MultiOrderModel(p, max_order=k0 + 1)
+    rng = np.random.default_rng(0)
+
+    # permutations preserve the frequencies of all paths of length k0
+    sample = _PathSampler(multi, k0, 'permutation').sample(rng, k0 + 1)
+    for path, weight in p.paths[k0].items():
+        assert sample.paths[k0][path].sum() == weight.sum()
+
+    # bootstrap samples preserve path lengths and only contain observed transitions
+    sample = _PathSampler(multi, k0, 'bootstrap').sample(rng, k0 + 1)
+    for l in p.paths:
+        assert sum(w[1] for w in sample.paths[l].values()) == \
+            sum(w[1] for w in p.paths[l].values())
+    if k0 > 0:
+        for path in sample.paths[k0]:
+            assert p.paths[k0][path].sum() > 0
+
+
+def test_cross_validate_short_folds():
+    p = pp.Paths()
+    p.add_path('a,c,d', frequency=1)
+    p.add_path('b,c,e', frequency=1)
+    p.add_path('a,b', frequency=20)
+    multi = pp.MultiOrderModel(p, max_order=2)
+
+    missing = 0
+    for seed in range(5):
+        results = multi.cross_validate(folds=5, seed=seed)
+        assert (results[1] < 0).all()
+        # folds without paths of length two in their training data have no model
+        # with order two
+        assert (np.isnan(results[2]) | (results[2] < 0)).all()
+        missing += np.isnan(results[2]).sum()
+    assert missing > 0
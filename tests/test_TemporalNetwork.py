@@ -2,7 +2,7 @@ import pathpy as pp
 import os
 import numpy as np
 import sqlite3
-from pytest import mark
+from pytest import mark, raises
 
 def test_read_temporal_file_int(test_data_directory, ):
     file_path = os.path.join(test_data_directory, 'example_int.tedges')
@@ -138,3 +138,379 @@ def test_write_tikz(temporal_network_object, tmpdir, is_dag, split_dir):
     exit_code = os.system(cmd)
     print(dir_path)
     assert exit_code == 0
+
+
+def test_columnar_index_views(temporal_network_object):
+    t = temporal_network_object
+    tedges = list(t.tedges)
+    assert len(tedges) == t.ecount()
+    assert [e[2] for e in tedges] == sorted(e[2] for e in tedges)
+    assert t.ordered_times == sorted(set(e[2] for e in tedges))
+
+    for ts in t.ordered_times:
+        edges = [e for e in tedges if e[2] == ts]
+        assert list(t.time[ts]) == edges
+        for v in t.nodes:
+            assert t.sources[ts].get(v, []) == [e for e in edges if e[0] == v]
+            assert t.targets[ts].get(v, []) == [e for e in edges if e[1] == v]
+    assert len(t.time[-1]) == 0
+
+    for v in t.nodes:
+        expected = sorted(set(e[2] for e in tedges if e[0] == v))
+        assert t.activities[v] == expected
+        assert t.activities_sets[v] == set(expected)
+
+    assert tedges[0] in t.tedges
+    assert ('x', 'y', 0) not in t.tedges
+
+
+def test_constructor_timestamps():
+    t = pp.TemporalNetwork(tedges=[('a', 'b', 2), ('b', 'c', np.int64(1))])
+    assert list(t.tedges) == [('b', 'c', 1), ('a', 'b', 2)]
+    assert pp.TemporalNetwork(tedges=[]).ecount() == 0
+
+    # float time stamps are rejected rather than truncated
+    with raises(AssertionError):
+        pp.TemporalNetwork(tedges=[('a', 'b', 1.5), ('b', 'c', 2.7)])
+
+
+def test_add_edge_order():
+    t = pp.TemporalNetwork()
+    t.add_edge('a', 'b', 3)
+    t.add_edge('b', 'c', 1)
+    t.add_edge('c', 'a', 3)
+    t.add_edge('a', 'c', '2', directed=False)
+
+    assert t.nodes == ['a', 'b', 'c']
+    assert list(t.tedges) == [('b', 'c', 1), ('a', 'c', 2), ('c', 'a', 2),
+                              ('a', 'b', 3), ('c', 'a', 3)]
+    assert t.ordered_times == [1, 2, 3]
+    assert t.activities['a'] == [2, 3]
+    assert t.observation_length() == 2
+
+
+def test_reverse_time(temporal_network_object):
+    t = temporal_network_object
+    r = t.reverse_time()
+    t_max = max(t.ordered_times)
+    expected = sorted((v, w, 1 + t_max - ts) for v, w, ts in t.tedges)
+    assert sorted(r.tedges) == expected
+    assert r.nodes == t.nodes
+
+
+@mark.parametrize('chunk_size', (1, 3, 100000))
+@mark.parametrize('directed', (True, False))
+def test_read_file_chunks(test_data_directory, chunk_size, directed):
+    file_path = os.path.join(test_data_directory, 'example_int.tedges')
+    t = pp.TemporalNetwork.read_file(file_path, directed=directed, chunk_size=chunk_size)
+
+    with open(file_path) as f:
+        f.readline()
+        tedges = []
+        for line in f:
+            v, w, ts = line.rstrip().split(',')
+            tedges.append((v, w, int(ts)))
+            if not directed:
+                tedges.append((w, v, int(ts)))
+    expected = pp.TemporalNetwork(tedges=tedges)
+    assert list(t.tedges) == list(expected.tedges)
+    assert t.nodes == expected.nodes
+
+    t = pp.TemporalNetwork.read_file(file_path, maxlines=4, chunk_size=chunk_size)
+    assert t.ecount() == 4
+
+
+@mark.parametrize('extension', ('', '.gz', '.bz2', '.xz'))
+def test_read_write_compressed(temporal_network_object, tmpdir, extension):
+    file_path = str(tmpdir.join('tedges.csv' + extension))
+    temporal_network_object.write_file(file_path)
+    t = pp.TemporalNetwork.read_file(file_path, chunk_size=5)
+    assert list(t.tedges) == list(temporal_network_object.tedges)
+
+
+def test_parse_timestamps():
+    from pathpy.classes.temporal_network import _parse_timestamps
+    cache = {}
+    times, valid = _parse_timestamps(['12', '2000-03-04 12:45', 'x', '2000-03-04 12:45'],
+                                     '%Y-%m-%d %H:%M', cache)
+    assert times[0] == 12
+    assert times[1] == times[3] > 0
+    assert list(valid) == [True, True, False, True]
+    assert set(cache) == {'2000-03-04 12:45', 'x'}
+
+
+@mark.parametrize('directed', (True, False))
+def test_add_edges(temporal_network_object, directed):
+    t = temporal_network_object
+    edges = [('x', 'a', 3), ('a', 'b', 1), (1, 'x', 30), ('b', 'a', 3), ('a', 'b', 0)]
+
+    expected = pp.TemporalNetwork(tedges=list(t.tedges))
+    expected.add_edge('y', 'x', 2)
+    for v, w, ts in edges:
+        expected.add_edge(v, w, ts, directed=directed)
+
+    bulk = pp.TemporalNetwork(tedges=list(t.tedges))
+    bulk.add_edge('y', 'x', 2)
+    bulk.add_edges(*zip(*edges), directed=directed)
+
+    assert list(bulk.tedges) == list(expected.tedges)
+    assert bulk.nodes == expected.nodes
+    assert bulk.activities['a'] == expected.activities['a']
+    assert bulk.ordered_times == expected.ordered_times
+
+
+def test_add_edge_incremental():
+    t = pp.TemporalNetwork()
+    np.random.seed(0)
+    times = np.random.randint(0, 50, size=500).tolist()
+    for i, ts in enumerate(times):
+        t.add_edge(str(i % 7), str((i + 1) % 7), ts)
+        if i % 100 == 0:
+            # interleave lookups, which merge the edges added so far
+            assert t.ecount() == i + 1
+    assert [e[2] for e in t.tedges] == sorted(times)
+    assert t.ordered_times == sorted(set(times))
+
+
+@mark.parametrize('window_splits', (None, [5, 12]))
+def test_shuffle_edges_undirected(window_splits):
+    np.random.seed(42)
+    t = pp.TemporalNetwork()
+    for _ in range(200):
+        v, w = np.random.choice(list('abcdefghij'), size=2, replace=False)
+        t.add_edge(str(v), str(w), int(np.random.randint(0, 20)),
+                   directed=np.random.rand() < 0.5)
+    tedges = list(t.tedges)
+
+    shuffled = t.shuffle_edges(window_splits=window_splits)
+    edges = list(shuffled.tedges)
+    assert shuffled.nodes == t.nodes
+    assert len(edges) == len(set(edges)) == len(tedges)
+    assert sorted((v, w) for v, w, _ in edges) == sorted((v, w) for v, w, _ in tedges)
+
+    # undirected edges are shuffled as atomic pairs
+    def pairs(edges):
+        return sum(1 for v, w, ts in edges if (w, v, ts) in edges)
+    assert pairs(set(edges)) >= pairs(set(tedges))
+
+    # time stamps are only exchanged within time windows
+    for lo, hi in ((-1, 5), (5, 12), (12, 20)):
+        if window_splits:
+            assert (sum(1 for *_, ts in edges if lo < ts <= hi) ==
+                    sum(1 for *_, ts in tedges if lo < ts <= hi))
+
+
+def test_shuffled_ensemble(temporal_network_object):
+    t = temporal_network_object
+    networks = t.shuffled_ensemble(4, seed=7)
+    assert len(networks) == 4
+    for shuffled in networks:
+        assert shuffled.ecount() == t.ecount()
+        assert sorted(e[:2] for e in shuffled.tedges) == sorted(e[:2] for e in t.tedges)
+    assert any(list(n.tedges) != list(networks[0].tedges) for n in networks[1:])
+
+    # results only depend on the seed
+    again = t.shuffled_ensemble(4, statistic=lambda n: list(n.tedges), seed=7)
+    assert again == [list(n.tedges) for n in networks]
+
+    counts = t.shuffled_ensemble(3, statistic=lambda n: n.ecount(), reducer=max,
+                                 initial=0, l=4)
+    assert counts == 4
+
+
+def test_shuffled_ensemble_parallel(temporal_network_object):
+    t = temporal_network_object
+
+    def statistic(network):
+        return pp.path_extraction.paths_from_temporal_network_dag(network, delta=2)
+
+    sequential = t.shuffled_ensemble(5, statistic=statistic, reducer=lambda x, y: x + y,
+                                     seed=3)
+    parallel = t.shuffled_ensemble(5, statistic=statistic, reducer=lambda x, y: x + y,
+                                   seed=3, max_workers=2)
+    for k in sequential.paths:
+        assert set(sequential.paths[k]) == set(parallel.paths[k])
+        for p in sequential.paths[k]:
+            assert np.array_equal(sequential.paths[k][p], parallel.paths[k][p])
+
+
+@mark.parametrize('t_start,t_end', ((None, None), (3, 9), (5, 5), (None, 4), (15, None),
+                                    (100, 200)))
+def test_slice(temporal_network_object, t_start, t_end):
+    t = temporal_network_object
+    lo = -np.inf if t_start is None else t_start
+    hi = np.inf if t_end is None else t_end
+    view = t.slice(t_start, t_end)
+
+    assert list(view.tedges) == [e for e in t.tedges if lo <= e[2] < hi]
+    assert view.nodes == t.nodes
+    assert np.shares_memory(view._times, t._times) or view.ecount() == 0
+
+    # adding edges to a view does not change the original network
+    ecount, nodes = t.ecount(), list(t.nodes)
+    view.add_edge('new', 'a', 7)
+    assert t.ecount() == ecount and t.nodes == nodes
+    assert ('new', 'a', 7) in view.tedges
+
+
+def test_slice_consumers(temporal_network_object):
+    t = temporal_network_object
+    view = t.slice(2, 8)
+    n = pp.Network.from_temporal_network(t, min_time=2, max_time=8)
+    assert n.edges == pp.Network.from_temporal_network(view).edges
+    assert sum(e['weight'] for e in n.edges.values()) == view.ecount()
+
+    paths = pp.path_extraction.paths_from_temporal_network_dag(view, delta=1)
+    expected = pp.path_extraction.paths_from_temporal_network_dag(
+        t.filter_edges(lambda v, w, ts: 2 <= ts < 8), delta=1)
+    assert str(paths) == str(expected)
+
+
+def test_lazy_indexes(temporal_network_object):
+    t = temporal_network_object
+    t.add_edge('a', 'b', 1)
+    assert t.index_stats() == {}
+
+    # path extraction only uses the time index
+    pp.path_extraction.paths_from_temporal_network(t, delta=1)
+    assert set(t.index_stats()) == {'time', 'ordered_times'}
+    seconds, nbytes = t.index_stats()['time']
+    assert seconds >= 0 and nbytes > 0
+
+    assert t.activities['a'] == [1, 3, 7]
+    assert set(t.index_stats()) == {'time', 'ordered_times', 'activities'}
+
+    assert t.sources[1]['a'] == [('a', 'b', 1)]
+    assert 'sources' in t.index_stats() and 'targets' not in t.index_stats()
+
+    # indexes are rebuilt after changes
+    t.add_edge('a', 'b', 100)
+    assert t.index_stats() == {}
+    assert t.ordered_times[-1] == 100
+
+
+@mark.parametrize('directed', (True, False))
+@mark.parametrize('window_size,step_size', ((3, 1), (5, 2), (2, 4), (4, 4)))
+def test_rolling_time_window_incremental(temporal_network_object, directed,
+                                         window_size, step_size):
+    t = temporal_network_object
+    t.add_edge('e', 'c', 4)
+    t.add_edge('c', 'e', 4)
+    expected = pp.RollingTimeWindow(t, window_size, step_size, directed=directed,
+                                    return_window=True)
+    incremental = pp.RollingTimeWindow(t, window_size, step_size, directed=directed,
+                                       return_window=True, incremental=True)
+    n_windows = 0
+    for (n1, w1), (n2, w2) in zip(expected, incremental):
+        assert w1 == w2
+        assert dict(n1.edges.items()) == dict(n2.edges.items())
+        assert dict(n1.nodes) == dict(n2.nodes)
+        n_windows += 1
+    assert n_windows > 0
+
+
+@mark.parametrize('max_workers', (None, 2))
+def test_rolling_time_window_map(temporal_network_object, max_workers):
+    t = temporal_network_object
+    r = pp.RollingTimeWindow(t, window_size=4, step_size=2, return_window=True)
+
+    def func(network):
+        return network.ecount(), sorted(network.nodes)
+
+    results = list(r.map(func, max_workers=max_workers))
+    expected = [(func(n), w) for n, w in r]
+    assert results == expected
+    assert len(results) > 1
+
+
+def test_from_sqlite_batches(test_data_directory):
+    file_path = os.path.join(test_data_directory, 'test_tempnets.db')
+    con = sqlite3.connect(file_path)
+    con.row_factory = sqlite3.Row
+    expected = pp.TemporalNetwork.from_sqlite(
+        con.execute('SELECT source, target, time FROM example_int'), directed=False)
+    t = pp.TemporalNetwork.from_sqlite(
+        con.execute('SELECT source, target, time FROM example_int'), directed=False,
+        batch_size=2)
+    assert list(t.tedges) == list(expected.tedges)
+    assert t.ecount() == 14
+
+
+@mark.parametrize('max_workers', (None, 1))
+def test_read_sqlite(temporal_network_object, tmpdir, max_workers):
+    t = temporal_network_object
+    file_path = str(tmpdir.join('tempnets.db'))
+    con = sqlite3.connect(file_path)
+    for table in ('part 1', 'part2'):
+        con.execute('CREATE TABLE "{}" (source TEXT, target TEXT, '
+                    'time INTEGER)'.format(table))
+    con.executemany('INSERT INTO "part 1" VALUES (?, ?, ?)',
+                    [e for e in t.tedges if e[2] < 10])
+    con.executemany('INSERT INTO part2 VALUES (?, ?, ?)',
+                    [e for e in t.tedges if e[2] >= 10])
+    con.commit()
+    con.close()
+
+    tables = ['part 1', 'part2']
+    read = pp.TemporalNetwork.read_sqlite(file_path, tables, max_workers=max_workers)
+    assert sorted(read.tedges) == sorted(t.tedges)
+    assert set(read.nodes) == set(t.nodes)
+
+    read = pp.TemporalNetwork.read_sqlite(file_path, tables, min_time=5, max_time=15,
+                                          nodes=['a', 'c', 'e', 'f'], batch_size=3,
+                                          max_workers=max_workers)
+    expected = [(v, w, ts) for v, w, ts in t.tedges
+                if 5 <= ts < 15 and v in 'acef' and w in 'acef']
+    assert len(expected) > 0
+    assert sorted(read.tedges) == sorted(expected)
+
+
+def test_read_sqlite_integer_nodes(tmpdir):
+    from pathpy.classes.temporal_network import _sqlite_query
+    file_path = str(tmpdir.join('tempnets.db'))
+    con = sqlite3.connect(file_path)
+    con.execute('CREATE TABLE links (source INTEGER, target INTEGER, time INTEGER)')
+    con.execute('CREATE INDEX links_source ON links (source)')
+    con.executemany('INSERT INTO links VALUES (?, ?, ?)',
+                    [(1, 2, 1), (2, 3, 2), (3, 1, 3), (1, 3, 4), (12, 1, 5)])
+    con.commit()
+    # the node filter compares the raw column, so the index can be used
+    con.execute('CREATE TEMP TABLE pathpy_nodes (node PRIMARY KEY)')
+    query, parameters = _sqlite_query('links', None, 10, True)
+    plan = con.execute('EXPLAIN QUERY PLAN ' + query, parameters).fetchall()
+    assert any('USING INDEX links_source' in row[-1] for row in plan)
+    con.close()
+
+    for nodes in ([1, 3], ['1', '3']):
+        read = pp.TemporalNetwork.read_sqlite(file_path, 'links', nodes=nodes)
+        assert sorted(read.tedges) == [('1', '3', 4), ('3', '1', 3)]
+
+    with raises(AssertionError):
+        pp.TemporalNetwork.read_sqlite(file_path, [])
+
+
+def test_shuffled_ensemble_nested(temporal_network_object):
+    t = temporal_network_object
+
+    def statistic(network):
+        # a statistic that generates an ensemble itself
+        return network.shuffled_ensemble(2, statistic=lambda n: n.ecount(), reducer=max)
+
+    assert t.shuffled_ensemble(3, statistic=statistic, seed=1) == [t.ecount()] * 3
+
+    with raises(AssertionError):
+        t.shuffled_ensemble(0, reducer=max)
+
+
+def test_rolling_time_window_map_interleaved():
+    t1 = pp.TemporalNetwork(tedges=[('a', 'b', t) for t in range(5)])
+    t2 = pp.TemporalNetwork(tedges=[('x', 'y', t) for t in range(5)] + [('y', 'z', 2)])
+
+    def func(network):
+        return sorted(network.nodes)
+
+    results = list(zip(pp.RollingTimeWindow(t1, 3, 1).map(func),
+                       pp.RollingTimeWindow(t2, 3, 1).map(func)))
+    assert len(results) == 2
+    assert all(r1 == ['a', 'b'] for r1, _ in results)
+    assert all(r2[:2] == ['x', 'y'] for _, r2 in results)